@@ -1,10 +1,18 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 from database.db_manager import DatabaseManager
+from modules.report_queries import attendance_summary
 from datetime import datetime
 import io
 
+
+@st.cache_resource
+def _ensure_month(_db, db_file, year_month):
+    """الجداول الشهرية مرة واحدة لكل قاعدة بيانات وشهر، وليس في كل إعادة تشغيل."""
+    _db.ensure_monthly_tables(year_month)
+    return True
+
+
 def main(db=None):
     """
     صفحة تقارير الحضور والغياب.
@@ -26,50 +34,13 @@ def main(db=None):
     year_month = f"{year}_{month:02d}"
 
     # التأكد من وجود الجداول الشهرية
-    db.ensure_monthly_tables(year_month)
+    _ensure_month(db, db.db_file, year_month)
 
     # استعلام لجلب بيانات الحضور مع معلومات الوكيل
     @st.cache_data(ttl=600)
     def load_attendance_summary(ym):
         with db.connect() as conn:
-            query = f"""
-                SELECT 
-                    a.citrix_uid,
-                    a.name AS agent_name,
-                    a.team_leader,
-                    a.supervisor,
-                    COUNT(DISTINCT ap.shift_date) AS days_worked,
-                    SUM(ap.staff_time_min) AS total_staff_hours,
-                    SUM(CASE 
-                        WHEN ap.attendance_status IN ('Present', 'Present - Modified') 
-                        THEN 1 ELSE 0 
-                    END) AS present_days,
-                    SUM(CASE 
-                        WHEN ap.attendance_status IN ('Absent', 'Absent - Unjustified') 
-                        THEN 1 ELSE 0 
-                    END) AS absent_days,
-                    SUM(CASE 
-                        WHEN ap.attendance_status IN ('Leave', 'Leave - Approved') 
-                        THEN 1 ELSE 0 
-                    END) AS leave_days
-                FROM attendance_processed_{ym} ap
-                JOIN agents_master a ON ap.citrix_uid = a.citrix_uid
-                GROUP BY a.citrix_uid, a.name, a.team_leader, a.supervisor
-            """
-            df = pd.read_sql_query(query, conn)
-            
-            # تحويل الأعمدة الرقمية إلى أنواع رقمية
-            numeric_cols = ['days_worked', 'total_staff_hours', 'present_days', 'absent_days', 'leave_days']
-            for col in numeric_cols:
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-            
-            # حساب نسبة الحضور
-            total_days = df['present_days'] + df['absent_days'] + df['leave_days']
-            # تجنب القسمة على صفر
-            attendance_pct = (df['present_days'] / total_days.replace(0, np.nan) * 100).round(1)
-            df['attendance_percentage'] = attendance_pct.fillna(0).astype(str) + '%'
-            
-            return df
+            return attendance_summary(conn, ym)
 
     try:
         df_summary = load_attendance_summary(year_month)
@@ -1,15 +1,73 @@
+import time
+
+# Start of this script run; startup and render timings are measured from here
+_run_started = time.perf_counter()
+
 import streamlit as st
-import pandas as pd
 from datetime import datetime
 from database.db_manager import DatabaseManager
+from modules import metrics
+from modules.page_registry import PageRegistry
 
 # -------------------- Page config (must be first Streamlit command) --------------------
 st.set_page_config(page_title="WFM Command Center", layout="wide")
 
 # -------------------- Initialize database --------------------
-db = DatabaseManager(year=2026, db_path="./data")
-db.init_database()
-db.ensure_monthly_tables("2026_02")
+@st.cache_resource
+def get_database(year_month):
+    """
+    Schema + current/next month tables once per process. A new month triggers
+    one more bootstrap and a new year opens that year's database.
+    """
+    db = DatabaseManager(year=int(year_month[:4]), db_path="./data")
+    db.bootstrap()
+    # Prometheus metrics (WFM_METRICS_FILE / WFM_METRICS_PORT), once per process
+    metrics.start_exporter()
+    # ANALYZE after loads, WAL checkpoints, off-hours vacuum (WFM_MAINTENANCE)
+    from modules.maintenance import get_maintenance
+    get_maintenance(db, start=True)
+    return db
+
+
+# Cache misses of load_user in this run (its body only runs on a miss)
+_user_loads = [0]
+
+
+@st.cache_data(ttl=300)
+def load_user(citrix_uid):
+    """user_access row of an active user, cached so reruns skip the lookup."""
+    _user_loads[0] += 1
+    with db.connect() as conn:
+        row = conn.execute(
+            "SELECT * FROM user_access WHERE citrix_uid = ? AND COALESCE(is_active, 1) = 1",
+            (citrix_uid,)
+        ).fetchone()
+    return dict(row) if row else None
+
+
+@st.cache_resource
+def get_page_registry():
+    """
+    Sidebar pages. Only module paths are registered here; each page module is
+    imported the first time the page is opened (see modules/page_registry.py).
+    """
+    registry = PageRegistry()
+    registry.register("Dashboard", "views.dashboard")
+    registry.register("Upload Files", "views.uploads", roles=('ADMIN', 'LEAVES'))
+    registry.register("Swap Manager", "views.swaps", roles=('OPS', 'ADMIN'))
+    registry.register("Approvals", "views.swaps", entry='approvals', roles=('RTM', 'ADMIN'))
+    registry.register("Admin Panel", "views.admin", roles=('ADMIN',), args=('db', 'audit', 'load_user'))
+    registry.register("Audit Trail", "views.audit_trail", roles=('ADMIN',))
+    registry.register("Diagnostics", "views.diagnostics", roles=('ADMIN',))
+    registry.register("Export Data", "views.export")
+    # صفحة التقارير من الملف المنفصل
+    registry.register("Reports", "Reports", args=('db',))
+    return registry
+
+
+db = get_database(datetime.now().strftime('%Y_%m'))
+pages = get_page_registry()
+pages.mark_cold_start(_run_started)
 
 # -------------------- Session state initialization --------------------
 if 'authenticated' not in st.session_state:
@@ -29,19 +87,37 @@ if not st.session_state.authenticated:
         submit = st.form_submit_button("Login", type="primary")
         
         if submit and citrix_uid:
-            with db.connect() as conn:
-                cur = conn.execute("SELECT * FROM user_access WHERE citrix_uid = ?", (citrix_uid,))
-                user = cur.fetchone()
+            load_user.clear()
+            user = load_user(citrix_uid)
             if user:
+                with db.connect() as conn:
+                    conn.execute("UPDATE user_access SET last_login = ? WHERE citrix_uid = ?",
+                                 (datetime.now(), citrix_uid))
+                    conn.commit()
                 st.session_state.authenticated = True
-                st.session_state.user = dict(user)
+                st.session_state.user = user
                 st.session_state.role = user['role']
+                from modules.audit import AuditLogger
+                AuditLogger(db, user=user).log_action(
+                    action='LOGIN', entity_name='user_access', entity_key=citrix_uid)
                 st.rerun()
             else:
                 st.error("User not found")
     st.stop()
 
 # -------------------- Main App (authenticated) --------------------
+# Role changes / deactivation apply within the load_user TTL without a query per rerun
+st.session_state.user = load_user(st.session_state.user['citrix_uid'])
+metrics.cache_lookup('user', _user_loads[0] == 0)
+if st.session_state.user is None:
+    st.session_state.authenticated = False
+    st.session_state.role = None
+    st.rerun()
+st.session_state.role = st.session_state.user['role']
+
+from modules.audit import AuditLogger
+audit = AuditLogger(db, user=st.session_state.user)
+
 st.title("📊 WFM Command Center")
 st.caption(f"Welcome {st.session_state.user['full_name']} - ({st.session_state.role})")
 
@@ -50,207 +126,23 @@ with st.sidebar:
     st.image("https://img.icons8.com/color/96/000000/calendar--v1.png", width=80)
     st.title("Menu")
     
-    menu_options = ["Dashboard"]
-    if st.session_state.role in ['ADMIN', 'LEAVES']:
-        menu_options.append("Upload Files")
-    if st.session_state.role in ['OPS', 'ADMIN']:
-        menu_options.append("Swap Manager")
-    if st.session_state.role in ['RTM', 'ADMIN']:
-        menu_options.append("Approvals")
-    if st.session_state.role == 'ADMIN':
-        menu_options.extend(["Admin Panel", "Audit Trail"])
-    menu_options.extend(["Export Data", "Reports", "Logout"])
+    menu_options = pages.menu(st.session_state.role) + ["Logout"]
     
     selected = st.radio("", menu_options, label_visibility="collapsed")
     
     if selected == "Logout":
+        audit.log_action(action='LOGOUT', entity_name='user_access',
+                         entity_key=st.session_state.user['citrix_uid'])
         st.session_state.authenticated = False
         st.session_state.user = None
         st.session_state.role = None
         st.rerun()
 
-# -------------------- Page content based on selection --------------------
-if selected == "Dashboard":
-    st.subheader("📈 Dashboard")
-    
-    col1, col2, col3, col4 = st.columns(4)
-    with col1:
-        st.metric("Total Agents", "0", "0")
-    with col2:
-        st.metric("Present Today", "0", "0")
-    with col3:
-        st.metric("Absent Today", "0", "0%")
-    with col4:
-        st.metric("Adherence", "0%", "0%")
-    
-    st.info("Here you will see today's statistics and notifications later.")
-
-elif selected == "Upload Files":
-    st.subheader("📤 Upload Files")
-    tab1, tab2, tab3, tab4 = st.tabs(["Headcount", "Roster", "CMS", "Aspect/EIM"])
-    
-    from modules.upload_handlers import UploadHandler
-    from modules.normalization import ShiftNormalizer
-    from modules.audit import AuditLogger
-    
-    normalizer = ShiftNormalizer(db)
-    audit = AuditLogger(db)
-    handler = UploadHandler(db, normalizer, audit)
-    
-    with tab1:
-        st.write("##### Upload Headcount File")
-        uploaded_file = st.file_uploader("Choose HC file", type=['csv', 'xlsx'], key="hc")
-        if uploaded_file is not None:
-            if st.button("Process HC"):
-                with st.spinner("Processing..."):
-                    result = handler.process_headcount(uploaded_file)
-                    if result['success']:
-                        st.success(f"Processed {result['agents_updated']} agents, added {result['new_agents']} new.")
-                    else:
-                        st.error(f"Processing failed: {result['error']}")
-
-    with tab2:
-        st.write("##### Upload Roster File")
-        roster_file = st.file_uploader("Choose Roster file", type=['csv', 'xlsx'], key="roster")
-        if roster_file is not None:
-            try:
-                if roster_file.name.endswith('.csv'):
-                    df = pd.read_csv(roster_file)
-                else:
-                    df = pd.read_excel(roster_file)
-                st.write("Preview:")
-                st.dataframe(df.head())
-                
-                fixed_cols = ['Name', 'Citrix UID']
-                date_cols = [col for col in df.columns if col not in fixed_cols]
-                st.info(f"Detected {len(date_cols)} date columns automatically.")
-                
-                if st.button("Process Roster", key="process_roster"):
-                    if not date_cols:
-                        st.error("No date columns found!")
-                    else:
-                        mapping = {
-                            'name_col': 'Name',
-                            'citrix_col': 'Citrix UID',
-                            'acd_col': None,
-                            'login_col': None,
-                            'date_cols': date_cols
-                        }
-                        year_month = f"{datetime.now().year}_{datetime.now().month:02d}"
-                        roster_file.seek(0)
-                        
-                        with st.spinner("Processing..."):
-                            result = handler.process_roster(roster_file, mapping, year_month)
-                        if result['success']:
-                            st.success(f"Processed {result['rows_processed']} shifts.")
-                            if result['unknown_agents']:
-                                st.warning(f"Unknown agents: {', '.join(result['unknown_agents'][:5])}")
-                        else:
-                            st.error(f"Processing failed: {result['error']}")
-            except Exception as e:
-                st.error(f"Error reading file: {e}")
-
-    with tab3:
-        st.write("##### Upload CMS Report")
-        cms_file = st.file_uploader("Choose CMS file", type=['txt', 'csv'], key="cms")
-        if cms_file and st.button("Process CMS", key="process_cms"):
-            with st.spinner("Processing..."):
-                year_month = datetime.now().strftime('%Y_%m')
-                result = handler.process_cms_productivity(cms_file, year_month)
-                if result['success']:
-                    st.success(f"✅ Processed {result['rows_processed']} rows.")
-                    if result['unknown_agents']:
-                        st.warning(f"Unknown agents: {', '.join(result['unknown_agents'][:5])}")
-                else:
-                    st.error(f"❌ Failed: {result['error']}")
-
-    with tab4:
-        st.write("##### Upload Aspect/EIM Report")
-        aspect_file = st.file_uploader("Choose Aspect/EIM file", type=['txt', 'csv'], key="aspect")
-        if aspect_file and st.button("Process Aspect/EIM", key="process_aspect"):
-            with st.spinner("Processing..."):
-                year_month = datetime.now().strftime('%Y_%m')
-                if 'eim' in aspect_file.name.lower():
-                    result = handler.process_eim(aspect_file, year_month)
-                else:
-                    result = handler.process_aspect(aspect_file, year_month)
-                if result['success']:
-                    st.success(f"✅ Processed {result['rows_processed']} events.")
-                    if result['unknown_agents']:
-                        st.warning(f"Unknown agents: {', '.join(result['unknown_agents'][:5])}")
-                else:
-                    st.error(f"❌ Failed: {result['error']}")
-
-elif selected == "Swap Manager":
-    st.subheader("🔄 Swap Requests")
-    with st.form("swap_request"):
-        st.write("##### New Swap Request")
-        col1, col2 = st.columns(2)
-        with col1:
-            agent_acd = st.text_input("Agent ACD ID")
-            swap_date = st.date_input("Swap Date")
-        with col2:
-            new_shift = st.text_input("New Shift (or leave type)")
-            leave_type = st.selectbox("Leave Type", ["None", "Sick", "Annual", "Half Day Annual", "Casual", "Ops Update"])
-        submitted = st.form_submit_button("Submit Request")
-        if submitted:
-            st.success("Request submitted successfully (demo)")
-
-elif selected == "Approvals":
-    st.subheader("✅ Pending Approvals")
-    st.info("No pending requests at the moment.")
-
-elif selected == "Admin Panel":
-    st.subheader("⚙️ System Settings")
-    tab1, tab2, tab3 = st.tabs(["Users", "Shift Dictionary", "LOB Groups"])
-    
-    with tab1:
-        st.write("##### User Management")
-        with db.connect() as conn:
-            users_df = pd.read_sql_query("SELECT citrix_uid, role, full_name, email, is_active FROM user_access", conn)
-        st.dataframe(users_df, use_container_width=True)
-        
-        with st.expander("Add New User"):
-            new_citrix = st.text_input("Citrix UID")
-            new_name = st.text_input("Full Name")
-            new_role = st.selectbox("Role", ["OPS", "RTM", "ADMIN", "LEAVES"])
-            new_email = st.text_input("Email")
-            if st.button("Add"):
-                with db.connect() as conn:
-                    conn.execute("""
-                        INSERT OR REPLACE INTO user_access (citrix_uid, role, full_name, email, created_at)
-                        VALUES (?, ?, ?, ?, ?)
-                    """, (new_citrix, new_role, new_name, new_email, datetime.now()))
-                    conn.commit()
-                st.success("User added successfully")
-                st.rerun()
-    
-    with tab2:
-        st.write("##### Shift Dictionary")
-        st.info("Here you will manage shift patterns.")
-    with tab3:
-        st.write("##### LOB Groups")
-        st.info("Here you will manage LOB groups.")
-
-elif selected == "Audit Trail":
-    st.subheader("📋 Audit Log")
-    st.info("All system events will be shown here.")
-
-elif selected == "Export Data":
-    st.subheader("📥 Export Data")
-    col1, col2 = st.columns(2)
-    with col1:
-        st.write("##### Export Options")
-        export_type = st.radio("Export Type", ["Roster", "Attendance", "Absenteeism"])
-        start_date = st.date_input("Start Date")
-        end_date = st.date_input("End Date")
-    with col2:
-        st.write("##### Preview")
-        st.info("Preview will be shown here.")
-    if st.button("Export"):
-        st.success("Export completed successfully (demo)")
+    if st.session_state.role == 'ADMIN':
+        with st.expander("⏱ Performance"):
+            st.caption(f"Cold start {pages.cold_start_sec or 0:.2f}s · "
+                       f"first render {pages.first_render_sec or 0:.2f}s")
+            st.dataframe(pages.timings(), hide_index=True)
 
-elif selected == "Reports":
-    # استدعاء صفحة التقارير من الملف المنفصل
-    import Reports
-    Reports.main(db)   # نمرر كائن db للاستخدام
\ No newline at end of file
+# -------------------- Page content based on selection --------------------
+pages.render(selected, run_started=_run_started, db=db, audit=audit, load_user=load_user)
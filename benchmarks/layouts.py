@@ -0,0 +1,228 @@
+# benchmarks/layouts.py
+"""
+Monthly vs unified storage layout.
+
+Loads `months` months of synthetic data through the normal upload path
+(monthly tables), copies them into the fact tables with
+database.migrate_facts, then times the same FactRepository queries on both
+layouts and writes the results as JSON.
+
+    python -m benchmarks.layouts --agents 500 --months 3 --out layout_results.json
+"""
+import argparse
+import calendar
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks.run import RESULTS_VERSION, _git_commit
+from benchmarks.synthetic import generate
+from database.db_manager import DatabaseManager, MONTHLY_TABLES, fact_table
+from database.migrate_facts import migrate
+from database.repository import FactRepository, LAYOUTS
+from modules.attendance_engine import AttendanceEngine
+from modules.audit import AuditLogger
+from modules.job_queue import SpooledUpload
+from modules.normalization import ShiftNormalizer
+from modules.upload_handlers import UploadHandler
+
+
+def _load(db, agents, months, year, seed):
+    """Ingest and calculate `months` months starting in January; returns the year_months."""
+    audit = AuditLogger(db, user={'citrix_uid': 'benchmark'})
+    normalizer = ShiftNormalizer(db)
+    handler = UploadHandler(db, normalizer, audit)
+    engine = AttendanceEngine(db, normalizer, audit)
+    year_months = []
+    for month in range(1, months + 1):
+        year_month = f"{year}_{month:02d}"
+        db.ensure_monthly_tables(year_month)
+        files = generate(agents, 31, year, month, seed + month)
+        if month == 1:
+            handler.process_headcount(SpooledUpload(files['headcount'][1], files['headcount'][0]))
+        handler.process_roster(SpooledUpload(files['roster'][1], files['roster'][0]), None, year_month)
+        handler.process_cms_productivity(SpooledUpload(files['cms'][1], files['cms'][0]), year_month)
+        handler.process_aspect(SpooledUpload(files['aspect'][1], files['aspect'][0]), year_month)
+        handler.process_eim(SpooledUpload(files['eim'][1], files['eim'][0]), year_month)
+        for day in range(calendar.monthrange(year, month)[1]):
+            engine.calculate_for_date(date(year, month, 1) + timedelta(days=day))
+        year_months.append(year_month)
+    audit.flush()
+    return year_months
+
+
+def _queries(repo, conn, year_months, agent):
+    """name -> callable running one representative read on `repo`'s layout."""
+    last = year_months[-1]
+    year, month = map(int, last.split('_'))
+    day = date(year, month, 15)
+    first_day = date(int(year_months[0][:4]), int(year_months[0][5:]), 1)
+    last_day = date(year, month, calendar.monthrange(year, month)[1])
+
+    def day_roster():
+        # AttendanceEngine: live roster of one day
+        return repo.read(conn, 'roster_live', last, 'citrix_uid, scheduled_shift', 'shift_date = ?', (day,))
+
+    def month_summary():
+        # Reports: attendance totals per agent for one month
+        src = repo.source('attendance_processed', last)
+        return conn.execute(f"""
+            SELECT citrix_uid, COUNT(*), SUM(staff_time_min),
+                   SUM(attendance_status = 'Absent')
+            FROM {src.table} WHERE {src.where}
+            GROUP BY citrix_uid
+        """, src.params).fetchall()
+
+    def cms_month_totals():
+        src = repo.source('cms_raw', last)
+        return conn.execute(f"""
+            SELECT citrix_uid, SUM(ans_calls), SUM(handle_time_sec), SUM(staffed_time_sec)
+            FROM {src.table} WHERE {src.where} GROUP BY citrix_uid
+        """, src.params).fetchall()
+
+    def month_summary_keyed():
+        # Same totals grouped on the integer key, names joined for the result rows only
+        src = repo.keyed_source('attendance_processed', last)
+        return conn.execute(f"""
+            SELECT a.citrix_uid, t.days, t.staff_min, t.absent
+            FROM (SELECT agent_key, COUNT(*) AS days, SUM(staff_time_min) AS staff_min,
+                         SUM(attendance_status = 'Absent') AS absent
+                  FROM {src.table} WHERE {src.where} GROUP BY agent_key) t
+            JOIN agents_master a ON a.agent_key = t.agent_key
+        """, src.params).fetchall()
+
+    def agent_history():
+        # One agent across every loaded month
+        return repo.read_range(conn, 'attendance_processed', first_day, last_day,
+                               'shift_date, attendance_status', 'citrix_uid = ?', (agent,))
+
+    def range_status_counts():
+        src = repo.range_source(conn, 'attendance_processed', first_day, last_day)
+        return conn.execute(f"""
+            SELECT attendance_status, COUNT(*) FROM {src.table} WHERE {src.where}
+            GROUP BY attendance_status
+        """, src.params).fetchall()
+
+    def range_sessions_day():
+        # Sessions of one day through the range API (month boundary handling)
+        src = repo.range_source(conn, 'aspect_raw', day, day)
+        return conn.execute(f"SELECT citrix_uid, login_time, logout_time FROM {src.table} "
+                            f"WHERE {src.where}", src.params).fetchall()
+
+    return {
+        'day_roster': day_roster,
+        'month_attendance_summary': month_summary,
+        'month_attendance_summary_keyed': month_summary_keyed,
+        'month_cms_totals': cms_month_totals,
+        'agent_history_range': agent_history,
+        'range_status_counts': range_status_counts,
+        'range_sessions_day': range_sessions_day,
+    }
+
+
+def _table_bytes(conn):
+    """
+    Bytes of the fact tables and of their indexes per layout,
+    {'monthly': {'table': n, 'index': n}, 'unified': {...}}; None without dbstat.
+    """
+    try:
+        rows = conn.execute("""
+            SELECT m.tbl_name, m.type, SUM(s.pgsize) FROM dbstat s
+            JOIN sqlite_master m ON m.name = s.name GROUP BY m.tbl_name, m.type
+        """).fetchall()
+    except sqlite3.OperationalError:
+        return None
+    sizes = {layout: {'table': 0, 'index': 0} for layout in LAYOUTS}
+    for table, kind, size in rows:
+        for family in MONTHLY_TABLES:
+            if table == fact_table(family):
+                sizes['unified'][kind] += size
+            elif table.startswith(family + '_'):
+                sizes['monthly'][kind] += size
+    return sizes
+
+
+def run(agents=500, months=3, year=2026, seed=42, repeat=5, workdir=None):
+    workdir = workdir or tempfile.mkdtemp(prefix='wfm_layout_')
+    try:
+        db = DatabaseManager(year=year, db_path=workdir)
+        db.bootstrap([])
+        started = time.perf_counter()
+        year_months = _load(db, agents, months, year, seed)
+        load_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        copied = migrate(db, year_months)
+        migrate_seconds = time.perf_counter() - started
+
+        results = []
+        with db.connect() as conn:
+            conn.execute("ANALYZE")
+            tables = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+            indexes = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index'").fetchone()[0]
+            agent = conn.execute("SELECT citrix_uid FROM agents_master ORDER BY citrix_uid LIMIT 1").fetchone()[0]
+            for layout in LAYOUTS:
+                repo = FactRepository(db, layout)
+                for name, query in _queries(repo, conn, year_months, agent).items():
+                    timings = []
+                    for _ in range(repeat):
+                        t0 = time.perf_counter()
+                        rows = len(query())
+                        timings.append(time.perf_counter() - t0)
+                    seconds = sorted(timings)[len(timings) // 2]
+                    results.append({"name": name, "layout": layout, "seconds": round(seconds, 5),
+                                    "rows": rows})
+            table_bytes = _table_bytes(conn)
+        db_size = os.path.getsize(db.db_file)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    by_name = {}
+    for r in results:
+        by_name.setdefault(r['name'], {})[r['layout']] = r['seconds']
+    for name, timings in by_name.items():
+        ratio = timings['unified'] / timings['monthly'] if timings['monthly'] else None
+        print(f"{name:<32} monthly {timings['monthly']*1000:8.2f} ms  unified {timings['unified']*1000:8.2f} ms"
+              + (f"  {ratio:5.2f}x" if ratio else ""))
+
+    if table_bytes:
+        for layout, sizes in table_bytes.items():
+            print(f"{layout:<8} tables {sizes['table']:>12,} bytes  indexes {sizes['index']:>12,} bytes")
+
+    return {
+        "version": RESULTS_VERSION,
+        "created_at": datetime.now().isoformat(timespec='seconds'),
+        "git_commit": _git_commit(),
+        "params": {"agents": agents, "months": months, "year": year, "seed": seed, "repeat": repeat},
+        "environment": {"sqlite": sqlite3.sqlite_version},
+        "load_seconds": round(load_seconds, 2),
+        "migrate_seconds": round(migrate_seconds, 3),
+        "rows_migrated": copied,
+        "schema": {"tables": tables, "indexes": indexes},
+        "db_bytes": db_size,
+        "fact_bytes": table_bytes,
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark monthly vs unified storage layouts.")
+    parser.add_argument('--agents', type=int, default=500)
+    parser.add_argument('--months', type=int, default=3)
+    parser.add_argument('--year', type=int, default=2026)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--out', default='layout_results.json')
+    args = parser.parse_args(argv)
+    document = run(args.agents, args.months, args.year, args.seed, args.repeat)
+    with open(args.out, 'w') as f:
+        json.dump(document, f, indent=2, default=str)
+    print(f"\nResults written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
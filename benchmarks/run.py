@@ -0,0 +1,203 @@
+# benchmarks/run.py
+"""
+End-to-end benchmark: ingest synthetic files into a fresh database, run the
+attendance engine for every day and the Reports summary query, and write the
+timings to a JSON file.
+
+    python -m benchmarks.run --agents 500 --days 31 --out bench_results.json
+    python -m benchmarks.run --agents 500 --repeat 3 --out new.json --compare bench_results.json
+
+Every run starts from an empty database in a temporary directory, so two
+results files with the same parameters can be compared between versions.
+"""
+import argparse
+import calendar
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from benchmarks.synthetic import generate
+from database.db_manager import DatabaseManager
+from modules.attendance_engine import AttendanceEngine
+from modules.audit import AuditLogger
+from modules.job_queue import SpooledUpload
+from modules.normalization import ShiftNormalizer
+from modules.report_queries import attendance_summary
+from modules.upload_handlers import UploadHandler
+
+# Results file format; bump when the layout of the JSON changes
+RESULTS_VERSION = 1
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except Exception:
+        return None
+
+
+def _timed(results, name, func, rows_key=None):
+    started = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - started
+    rows = None
+    if isinstance(result, dict):
+        if not result.get('success', True):
+            raise RuntimeError(f"{name} failed: {result.get('error')}")
+        rows = result.get(rows_key) if rows_key else None
+    elif isinstance(result, pd.DataFrame):
+        rows = len(result)
+    results.append({
+        "name": name,
+        "seconds": round(seconds, 4),
+        "rows": rows,
+        "rows_per_sec": round(rows / seconds, 1) if rows and seconds else None,
+    })
+    print(f"{name:<28} {seconds:8.3f}s" + (f"  {rows:>9,} rows" if rows else ""))
+    return result
+
+
+def run(agents=500, days=31, year=2026, month=1, seed=42, workdir=None):
+    """Run every benchmark once; returns the results document."""
+    files = generate(agents, days, year, month, seed)
+    year_month = f"{year}_{month:02d}"
+    workdir = workdir or tempfile.mkdtemp(prefix='wfm_bench_')
+    results = []
+    try:
+        db = DatabaseManager(year=year, db_path=workdir)
+        _timed(results, 'bootstrap', lambda: db.bootstrap([year_month]))
+        audit = AuditLogger(db, user={'citrix_uid': 'benchmark'})
+        normalizer = ShiftNormalizer(db)
+        handler = UploadHandler(db, normalizer, audit)
+
+        def upload(kind):
+            name, data = files[kind]
+            return SpooledUpload(data, name)
+
+        _timed(results, 'process_headcount',
+               lambda: handler.process_headcount(upload('headcount')), 'new_agents')
+        _timed(results, 'process_roster',
+               lambda: handler.process_roster(upload('roster'), None, year_month), 'rows_processed')
+        _timed(results, 'process_cms_productivity',
+               lambda: handler.process_cms_productivity(upload('cms'), year_month), 'rows_processed')
+        _timed(results, 'process_aspect',
+               lambda: handler._process_login_logout(upload('aspect'), year_month, 'aspect_raw'),
+               'rows_processed')
+        _timed(results, 'process_eim',
+               lambda: handler._process_login_logout(upload('eim'), year_month, 'eim_raw'),
+               'rows_processed')
+
+        engine = AttendanceEngine(db, normalizer, audit)
+        n_days = min(days, calendar.monthrange(year, month)[1])
+
+        def calculate_month():
+            processed = 0
+            for i in range(n_days):
+                processed += engine.calculate_for_date(date(year, month, 1) + timedelta(days=i))['processed']
+            return {"success": True, "processed": processed}
+
+        _timed(results, 'calculate_for_date (month)', calculate_month, 'processed')
+
+        def report():
+            with db.connect() as conn:
+                return attendance_summary(conn, year_month)
+
+        _timed(results, 'reports_attendance_summary', report)
+        audit.flush()
+        db_size = os.path.getsize(db.db_file)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "version": RESULTS_VERSION,
+        "created_at": datetime.now().isoformat(timespec='seconds'),
+        "git_commit": _git_commit(),
+        "params": {"agents": agents, "days": days, "year": year, "month": month, "seed": seed},
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "input_bytes": {kind: len(data) for kind, (_, data) in files.items()},
+        "db_bytes": db_size,
+        "results": results,
+    }
+
+
+def median_of(runs):
+    """Single results document with the median seconds of each benchmark over `runs`."""
+    document = dict(runs[0], repeat=len(runs))
+    results = []
+    for i, first in enumerate(runs[0]['results']):
+        seconds = sorted(r['results'][i]['seconds'] for r in runs)[len(runs) // 2]
+        rows = first['rows']
+        results.append(dict(first, seconds=seconds,
+                            rows_per_sec=round(rows / seconds, 1) if rows and seconds else None))
+    document['results'] = results
+    return document
+
+
+def compare(current, baseline, threshold=1.2):
+    """
+    Print current vs baseline seconds per benchmark. Returns the names that
+    got slower than `threshold` × baseline.
+    """
+    if current['params'] != baseline['params']:
+        print(f"warning: params differ {baseline['params']} -> {current['params']}")
+    before = {r['name']: r['seconds'] for r in baseline['results']}
+    slower = []
+    print(f"\n{'benchmark':<28} {'baseline':>9} {'current':>9} {'ratio':>7}")
+    for r in current['results']:
+        old = before.get(r['name'])
+        if not old:
+            print(f"{r['name']:<28} {'-':>9} {r['seconds']:>9.3f}")
+            continue
+        ratio = r['seconds'] / old
+        flag = '  SLOWER' if ratio > threshold else ''
+        print(f"{r['name']:<28} {old:>9.3f} {r['seconds']:>9.3f} {ratio:>6.2f}x{flag}")
+        if ratio > threshold:
+            slower.append(r['name'])
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the WFM end-to-end benchmark.")
+    parser.add_argument('--agents', type=int, default=500)
+    parser.add_argument('--days', type=int, default=31)
+    parser.add_argument('--year', type=int, default=2026)
+    parser.add_argument('--month', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=1, help="runs to take the median of")
+    parser.add_argument('--out', default='bench_results.json', help="results file to write")
+    parser.add_argument('--compare', help="baseline results file to compare against")
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help="slowdown ratio that fails --compare (default 1.2)")
+    args = parser.parse_args(argv)
+
+    runs = [run(args.agents, args.days, args.year, args.month, args.seed) for _ in range(args.repeat)]
+    document = median_of(runs)
+    with open(args.out, 'w') as f:
+        json.dump(document, f, indent=2)
+    print(f"\nResults written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(document, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
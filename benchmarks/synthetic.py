@@ -0,0 +1,169 @@
+# benchmarks/synthetic.py
+"""
+Deterministic synthetic upload files for benchmarks.
+
+generate() builds the same files the app receives — HC (csv), roster in the
+wide layout (one column per date), CMS Agents Productivity Report (tab
+separated, title row first) and Aspect/EIM login/logout reports — for
+`agents` agents over `days` days. The same (agents, days, year, month, seed)
+always produces byte-identical files, so results from two versions of the
+code are comparable.
+
+    python -m benchmarks.synthetic --agents 2000 --days 31 --out ./bench_data
+"""
+import argparse
+import calendar
+import os
+import random
+from datetime import date, datetime, timedelta
+
+FIRST_NAMES = ('Ahmed', 'Mohamed', 'Mahmoud', 'Omar', 'Youssef', 'Mostafa', 'Ali', 'Hassan',
+               'Sara', 'Mariam', 'Nour', 'Aya', 'Salma', 'Hana', 'Yasmin', 'Fatma')
+LAST_NAMES = ('Hassan', 'Ibrahim', 'Ali', 'Mahmoud', 'Abdelrahman', 'Saeed', 'Fathy', 'Khalil',
+              'Mostafa', 'Nabil', 'Kamal', 'Samir', 'Adel', 'Farouk', 'Gamal', 'Helmy')
+SHIFT_STARTS = (7, 8, 9, 10, 11, 12, 14, 16)
+LEAVE_CODES = ('Sick', 'Annual', 'Casual')
+SHIFT_HOURS = 9
+
+
+def _agent(i, rng):
+    return {
+        'citrix': f"C{i:06d}",
+        'acd': str(100000 + i),
+        'name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}",
+        'start': rng.choice(SHIFT_STARTS),
+        'off_offset': rng.randrange(7),
+        'team_leader': f"TL {i // 15:04d}",
+        'supervisor': f"SUP {i // 120:03d}",
+    }
+
+
+def _schedule(agent, day, rng, leave_rate):
+    """Roster cell of one agent-day: 'OFF', a leave code or an 'H:MM' start."""
+    if (day.toordinal() + agent['off_offset']) % 7 in (0, 1):
+        return 'OFF'
+    if rng.random() < leave_rate:
+        return rng.choice(LEAVE_CODES)
+    return f"{agent['start']}:00"
+
+
+def _hc(agents):
+    lines = ["Citrix UID,ACD ID,Name,Premises,Segment,Queue,Language,Batch,Date of Join,"
+             "Team Leaders,Supervisor,Manger,Status"]
+    for a in agents:
+        lines.append(f"{a['citrix']},{a['acd']},{a['name']},Site A,Consumer,Q{int(a['acd']) % 8},"
+                     f"Arabic,B{int(a['acd']) % 40},2024-01-01,{a['team_leader']},{a['supervisor']},"
+                     f"MGR 1,Active")
+    return "\n".join(lines)
+
+
+def _roster(agents, dates, cells):
+    lines = [",".join(["Name", "Citrix UID"] + [d.strftime('%d-%b-%y') for d in dates])]
+    for a in agents:
+        lines.append(",".join([a['name'], a['citrix']] + [cells[a['citrix'], d] for d in dates]))
+    return "\n".join(lines)
+
+
+def _cms(agents, dates, cells, rng, noise):
+    lines = ["Agents Productivity Report",
+             "\t".join(["Date", "Login ID", "Name", "ANS Calls", "Handle Time", "Talk Time",
+                        "Hold Time", "ACW Time", "Avail Time", "Staffed Time"])]
+    for d in dates:
+        for a in agents:
+            if ':' not in cells[a['citrix'], d]:
+                continue
+            login = a['acd'] if rng.random() >= noise else f"9{a['acd']}"
+            day = d.strftime('%d/%m/%Y') if rng.random() >= noise else "32/13/2026"
+            calls = rng.randint(20, 90)
+            talk = calls * rng.randint(150, 300)
+            hold = calls * rng.randint(0, 30)
+            acw = calls * rng.randint(10, 60)
+            staffed = SHIFT_HOURS * 3600 - rng.randint(0, 1800)
+            avail = max(staffed - talk - hold - acw, 0)
+            lines.append("\t".join(str(v) for v in (day, login, a['name'], calls, talk + hold + acw,
+                                                    talk, hold, acw, avail, staffed)))
+    lines.append("\t".join(["", "Totals"] + [""] * 8))
+    return "\n".join(lines)
+
+
+def _login_logout(agents, dates, cells, rng, noise, title):
+    lines = [title, "Agent Name,Login ID,Date,Login Time,Logout Date,Logout Time,Logout Reason"]
+    for d in dates:
+        for a in agents:
+            if ':' not in cells[a['citrix'], d]:
+                continue
+            start = datetime(d.year, d.month, d.day, a['start']) + timedelta(minutes=rng.randint(-10, 20))
+            end = start + timedelta(hours=SHIFT_HOURS, minutes=rng.randint(-30, 15))
+            # Some agents log out for a break and come back: two sessions that day
+            if rng.random() < 0.2:
+                split = start + timedelta(hours=4)
+                sessions = [(start, split), (split + timedelta(minutes=rng.randint(5, 40)), end)]
+            else:
+                sessions = [(start, end)]
+            login = a['acd'] if rng.random() >= noise else f"9{a['acd']}"
+            for login_dt, logout_dt in sessions:
+                lines.append(",".join([
+                    a['name'], login, d.strftime('%d/%m/%Y'), login_dt.strftime('%I:%M%p'),
+                    logout_dt.strftime('%d/%m/%Y'), logout_dt.strftime('%I:%M%p'), "End"
+                ]))
+    return "\n".join(lines)
+
+
+def generate(agents=500, days=31, year=2026, month=1, seed=42, noise=0.002, leave_rate=0.03,
+             eim_share=0.3):
+    """
+    Build the synthetic files in memory.
+    noise is the share of CMS/Aspect/EIM rows with an unknown login or a bad
+    date, so the error paths are exercised too. eim_share is the share of
+    agents that also appear in the EIM report.
+    Returns {kind: (file_name, bytes)} for headcount, roster, cms, aspect, eim.
+    """
+    rng = random.Random(seed)
+    days = min(days, calendar.monthrange(year, month)[1])
+    dates = [date(year, month, 1) + timedelta(days=i) for i in range(days)]
+    roster_agents = [_agent(i, rng) for i in range(agents)]
+    cells = {(a['citrix'], d): _schedule(a, d, rng, leave_rate) for a in roster_agents for d in dates}
+    eim_agents = roster_agents[:int(len(roster_agents) * eim_share)]
+    tag = f"{agents}x{days}_{year}_{month:02d}"
+
+    files = {
+        'headcount': (f"hc_{tag}.csv", _hc(roster_agents)),
+        'roster': (f"roster_{tag}.csv", _roster(roster_agents, dates, cells)),
+        'cms': (f"cms_{tag}.txt", _cms(roster_agents, dates, cells, rng, noise)),
+        'aspect': (f"aspect_{tag}.csv",
+                   _login_logout(roster_agents, dates, cells, rng, noise, "Login Logout Report")),
+        'eim': (f"eim_{tag}.csv",
+                _login_logout(eim_agents, dates, cells, rng, noise, "EIM Login Logout Report")),
+    }
+    return {kind: (name, text.encode('utf-8')) for kind, (name, text) in files.items()}
+
+
+def write(files, out_dir):
+    """Save generate() output to out_dir; returns the written paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for name, data in files.values():
+        path = os.path.join(out_dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic WFM upload files.")
+    parser.add_argument('--agents', type=int, default=500)
+    parser.add_argument('--days', type=int, default=31)
+    parser.add_argument('--year', type=int, default=2026)
+    parser.add_argument('--month', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--noise', type=float, default=0.002)
+    parser.add_argument('--out', default='./bench_data')
+    args = parser.parse_args(argv)
+    files = generate(args.agents, args.days, args.year, args.month, args.seed, args.noise)
+    for path in write(files, args.out):
+        print(f"{path}: {os.path.getsize(path):,} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+# database/cross_year.py
+import os
+import sqlite3
+from datetime import date, datetime
+from contextlib import contextmanager
+
+import pandas as pd
+
+from database.db_manager import MONTHLY_TABLES, MONTHLY_DATE_COLUMNS
+
+# SQLite default limit for ATTACHed databases (SQLITE_MAX_ATTACHED).
+MAX_ATTACHED = 10
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return pd.to_datetime(value).date()
+
+
+def months_between(start_date, end_date):
+    """Return (year, month) pairs covered by [start_date, end_date], inclusive."""
+    year, month = start_date.year, start_date.month
+    months = []
+    while (year, month) <= (end_date.year, end_date.month):
+        months.append((year, month))
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+    return months
+
+
+class CrossYearQuery:
+    """
+    Read-only query façade over the per-year wfm_storage_{year}.db files.
+
+    For a date range it ATTACHes only the yearly databases the range touches
+    and exposes one TEMP view per monthly table family (e.g. `attendance_processed`,
+    `roster_live`) that UNION ALLs the matching `{family}_{ym}` tables. Months
+    outside the window never appear in the view, and only the first and last
+    month carry a date predicate.
+
+        cy = CrossYearQuery(db_path="./data")
+        df = cy.read_sql(
+            "SELECT attendance_status, COUNT(*) AS n FROM attendance_processed GROUP BY 1",
+            date(2025, 12, 29), date(2026, 1, 4))
+    """
+
+    def __init__(self, db_path="data"):
+        self.db_path = db_path
+
+    def _year_file(self, year):
+        return os.path.join(self.db_path, f"wfm_storage_{year}.db")
+
+    @contextmanager
+    def connect(self, start_date, end_date, tables=None):
+        start_date, end_date = _as_date(start_date), _as_date(end_date)
+        if start_date > end_date:
+            raise ValueError("start_date must be on or before end_date")
+        families = list(tables or MONTHLY_TABLES)
+        unknown = [f for f in families if f not in MONTHLY_TABLES]
+        if unknown:
+            raise ValueError(f"Unknown monthly tables: {unknown}")
+
+        years = [y for y in range(start_date.year, end_date.year + 1)
+                 if os.path.exists(self._year_file(y))]
+        if len(years) > MAX_ATTACHED:
+            raise ValueError(f"Range spans {len(years)} yearly databases (max {MAX_ATTACHED})")
+
+        # Open the newest year as main so that permanent tables (agents_master,
+        # lob_groups, ...) resolve to the most recent headcount.
+        if years:
+            main_uri = f"file:{self._year_file(years[-1])}?mode=ro"
+        else:
+            main_uri = "file::memory:"
+        conn = sqlite3.connect(main_uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            schemas = {}
+            for year in years:
+                if year == years[-1]:
+                    schemas[year] = 'main'
+                    continue
+                schema = f"y{year}"
+                conn.execute(f"ATTACH DATABASE ? AS {schema}",
+                             (f"file:{self._year_file(year)}?mode=ro",))
+                schemas[year] = schema
+
+            for family in families:
+                self._create_view(conn, family, schemas, start_date, end_date)
+            yield conn
+        finally:
+            conn.close()
+
+    def _table_columns(self, conn, schema, table):
+        cur = conn.execute(f"PRAGMA {schema}.table_info({table})")
+        return [row['name'] for row in cur.fetchall()]
+
+    def _create_view(self, conn, family, schemas, start_date, end_date):
+        date_col = MONTHLY_DATE_COLUMNS[family]
+        months = months_between(start_date, end_date)
+        branches = []
+        for year, month in months:
+            schema = schemas.get(year)
+            if schema is None:
+                continue
+            ym = f"{year}_{month:02d}"
+            columns = self._table_columns(conn, schema, f"{family}_{ym}")
+            if columns:
+                branches.append((schema, ym, year, month, columns))
+
+        if not branches:
+            # Nothing stored for this window: expose an empty table with the
+            # standard layout so queries still compile.
+            conn.execute(f"CREATE TEMP TABLE _{family}_empty ({MONTHLY_TABLES[family]})")
+            conn.execute(f"CREATE TEMP VIEW {family} AS "
+                         f"SELECT *, NULL AS year_month FROM temp._{family}_empty")
+            return
+
+        # Tables created before a column was added may be narrower; only
+        # expose the columns every branch has.
+        common = [c for c in branches[0][4] if all(c in b[4] for b in branches)]
+        col_list = ', '.join(common)
+        selects = []
+        for schema, ym, year, month, _ in branches:
+            sql = f"SELECT {col_list}, '{ym}' AS year_month FROM {schema}.{family}_{ym}"
+            conds = []
+            if (year, month) == (start_date.year, start_date.month) and start_date.day > 1:
+                conds.append(f"{date_col} >= '{start_date.isoformat()}'")
+            if (year, month) == (end_date.year, end_date.month):
+                conds.append(f"{date_col} <= '{end_date.isoformat()}'")
+            if conds:
+                sql += " WHERE " + " AND ".join(conds)
+            selects.append(sql)
+        conn.execute(f"CREATE TEMP VIEW {family} AS " + "\nUNION ALL\n".join(selects))
+
+    def read_sql(self, sql, start_date, end_date, params=(), tables=None):
+        """Run `sql` against the range views and return a DataFrame."""
+        with self.connect(start_date, end_date, tables=tables) as conn:
+            return pd.read_sql_query(sql, conn, params=params)
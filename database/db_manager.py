@@ -1,9 +1,214 @@
 # database/db_manager.py
+import csv
 import sqlite3
 import os
 from datetime import datetime
 from contextlib import contextmanager
 
+from database import instrumentation
+from database.statements import CACHED_STATEMENTS, check_year_month
+
+# Month-specific table families. Each one is created as {family}_{year_month}
+# by ensure_monthly_tables and shares the column layout below.
+MONTHLY_TABLES = {
+    # Roster original
+    'roster_original': """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        citrix_uid TEXT NOT NULL,
+        acd_id TEXT,
+        shift_date DATE NOT NULL,
+        scheduled_shift TEXT,
+        normalized_shift TEXT,
+        shift_source TEXT DEFAULT 'Planner',
+        source_file TEXT,
+        uploaded_at TIMESTAMP,
+        FOREIGN KEY (citrix_uid) REFERENCES agents_master(citrix_uid)
+    """,
+    # Roster live
+    'roster_live': """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        citrix_uid TEXT NOT NULL,
+        acd_id TEXT,
+        shift_date DATE NOT NULL,
+        scheduled_shift TEXT,
+        normalized_shift TEXT,
+        shift_source TEXT,
+        modified_by TEXT,
+        modified_at TIMESTAMP,
+        approved_by TEXT,
+        approved_at TIMESTAMP,
+        FOREIGN KEY (citrix_uid) REFERENCES agents_master(citrix_uid)
+    """,
+    # CMS raw data
+    'cms_raw': """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        report_date DATE NOT NULL,
+        agent_name TEXT,
+        login_id TEXT,
+        citrix_uid TEXT,
+        acd_id TEXT,
+        ans_calls INTEGER DEFAULT 0,
+        handle_time_sec INTEGER DEFAULT 0,
+        avail_time_sec INTEGER DEFAULT 0,
+        staffed_time_sec INTEGER DEFAULT 0,
+        talk_time_sec INTEGER DEFAULT 0,
+        hold_time_sec INTEGER DEFAULT 0,
+        acw_time_sec INTEGER DEFAULT 0,
+        upload_batch TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (citrix_uid) REFERENCES agents_master(citrix_uid)
+    """,
+    # Aspect raw data
+    'aspect_raw': """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        agent_name TEXT,
+        login_id TEXT,
+        citrix_uid TEXT,
+        acd_id TEXT,
+        event_date DATE NOT NULL,
+        login_time DATETIME,
+        logout_time DATETIME,
+        logout_reason TEXT,
+        session_duration_sec INTEGER,
+        upload_batch TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (citrix_uid) REFERENCES agents_master(citrix_uid)
+    """,
+    # EIM raw data (same structure as aspect)
+    'eim_raw': """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        agent_name TEXT,
+        login_id TEXT,
+        citrix_uid TEXT,
+        acd_id TEXT,
+        event_date DATE NOT NULL,
+        login_time DATETIME,
+        logout_time DATETIME,
+        logout_reason TEXT,
+        session_duration_sec INTEGER,
+        upload_batch TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (citrix_uid) REFERENCES agents_master(citrix_uid)
+    """,
+    # Attendance processed
+    'attendance_processed': """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        citrix_uid TEXT NOT NULL,
+        acd_id TEXT,
+        shift_date DATE NOT NULL,
+        original_shift TEXT,
+        updated_shift TEXT,
+        staff_time_sec INTEGER DEFAULT 0,
+        staff_time_min REAL,
+        staff_time_validation TEXT,
+        attendance_status TEXT,
+        absenteeism_reason TEXT,
+        final_shift TEXT,
+        hc_status TEXT,
+        data_source TEXT,
+        confidence_score INTEGER,
+        notes TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (citrix_uid) REFERENCES agents_master(citrix_uid)
+    """,
+}
+
+# Indexes created alongside each monthly table (column tuples).
+MONTHLY_INDEXES = {
+    'roster_live': [('shift_date', 'citrix_uid'), ('citrix_uid', 'shift_date')],
+    'cms_raw': [('upload_batch',), ('citrix_uid', 'report_date')],
+    'aspect_raw': [('upload_batch',), ('citrix_uid', 'event_date')],
+    'eim_raw': [('upload_batch',), ('citrix_uid', 'event_date')],
+    'attendance_processed': [('shift_date', 'citrix_uid')],
+}
+
+# Date column used to filter each monthly table family.
+MONTHLY_DATE_COLUMNS = {
+    'roster_original': 'shift_date',
+    'roster_live': 'shift_date',
+    'cms_raw': 'report_date',
+    'aspect_raw': 'event_date',
+    'eim_raw': 'event_date',
+    'attendance_processed': 'shift_date',
+}
+
+# Unified layout (see database/repository.py): one fact_{family} table per
+# family for every month, partitioned by month_key = YYYYMM. (month_key, date)
+# indexes serve month/day filters, (month_key, agent_key, ...) ones the
+# per-agent monthly totals; trailing columns cover those reads without a
+# table lookup. (agent_key, date) serves agent history across months.
+FACT_INDEXES = {
+    'roster_original': [('month_key', 'shift_date', 'agent_key', 'scheduled_shift'),
+                        ('agent_key', 'shift_date')],
+    'roster_live': [('month_key', 'shift_date', 'agent_key', 'scheduled_shift', 'normalized_shift'),
+                    ('agent_key', 'shift_date')],
+    'cms_raw': [('month_key', 'report_date', 'agent_key', 'staffed_time_sec', 'ans_calls', 'handle_time_sec'),
+                ('month_key', 'agent_key', 'ans_calls', 'handle_time_sec', 'staffed_time_sec'),
+                ('agent_key', 'report_date'), ('upload_batch',)],
+    'aspect_raw': [('month_key', 'event_date', 'agent_key', 'login_time', 'logout_time'),
+                   ('agent_key', 'event_date'), ('upload_batch',)],
+    'eim_raw': [('month_key', 'event_date', 'agent_key', 'login_time', 'logout_time'),
+                ('agent_key', 'event_date'), ('upload_batch',)],
+    'attendance_processed': [('month_key', 'shift_date', 'agent_key'),
+                             ('month_key', 'agent_key', 'shift_date', 'attendance_status', 'staff_time_min'),
+                             ('agent_key', 'shift_date')],
+}
+
+
+# Agent identity columns of the monthly tables -> agents_master column. Fact
+# tables store the integer agents_master.agent_key instead; the
+# v_fact_{family} views join these back from the dimension.
+AGENT_COLUMNS = {
+    'citrix_uid': 'citrix_uid',
+    'acd_id': 'acd_id',
+    'agent_name': 'name',
+    'login_id': 'login_id',
+}
+
+
+def fact_table(family):
+    """Unified-layout table of a monthly family."""
+    return f"fact_{family}"
+
+
+def fact_view(family):
+    """String-keyed view over fact_table(family), column-compatible with the monthly table."""
+    return f"v_fact_{family}"
+
+
+def _column_lines(family):
+    return [line.strip().rstrip(',') for line in MONTHLY_TABLES[family].strip().splitlines() if line.strip()]
+
+
+def fact_columns(family):
+    """Column DDL of fact_table(family): agent_key in place of the agent identity columns."""
+    lines = ['month_key INTEGER NOT NULL']
+    for line in _column_lines(family):
+        name = line.split()[0]
+        if name == 'FOREIGN':
+            lines.append("FOREIGN KEY (agent_key) REFERENCES agents_master(agent_key)")
+        elif name not in AGENT_COLUMNS:
+            lines.append(line)
+            if name == 'id':
+                lines.append('agent_key INTEGER NOT NULL')
+    return ",\n".join(lines)
+
+
+def month_key(year_month):
+    """'2026_01' -> 202601."""
+    year, month = year_month.split('_')
+    return int(year) * 100 + int(month)
+
+
+# Default shift_dictionary patterns, loaded by init_database (existing patterns are kept)
+SHIFT_DICT_SEED = os.getenv('WFM_SHIFT_DICT_SEED', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets', 'shift_dict_default.csv'))
+
+# Bump whenever init_database creates or alters permanent tables/indexes, so
+# bootstrap() re-runs it once on databases stamped with an older version.
+SCHEMA_VERSION = 7
+
+
 class DatabaseManager:
     def __init__(self, year=None, db_path="data"):
         self.db_path = db_path
@@ -11,9 +216,15 @@ class DatabaseManager:
         os.makedirs(self.db_path, exist_ok=True)
         self.conn = None
 
+    @property
+    def db_file(self):
+        return os.path.join(self.db_path, f"wfm_storage_{self.year}.db")
+
     def get_connection(self):
-        db_file = os.path.join(self.db_path, f"wfm_storage_{self.year}.db")
-        conn = sqlite3.connect(db_file, check_same_thread=False)
+        # Statement timing only when switched on (WFM_DB_INSTRUMENT / Diagnostics page)
+        factory = instrumentation.InstrumentedConnection if instrumentation.ENABLED else sqlite3.Connection
+        conn = sqlite3.connect(self.db_file, check_same_thread=False, timeout=30, factory=factory,
+                               cached_statements=CACHED_STATEMENTS)
         conn.execute("PRAGMA foreign_keys = ON")
         conn.row_factory = sqlite3.Row
         return conn
@@ -26,10 +237,53 @@ class DatabaseManager:
         finally:
             conn.close()
 
+    def schema_version(self):
+        """Version stamped by the last bootstrap (0 for a new or pre-versioning database)."""
+        with self.connect() as conn:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+            ).fetchone()
+            if not exists:
+                return 0
+            row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+            return row[0] or 0
+
+    def bootstrap(self, year_months=None):
+        """
+        One-time start-up: run init_database only when the stored schema version
+        is older than SCHEMA_VERSION, then ensure the monthly tables of
+        year_months (default: the current and next month of this database's year).
+        """
+        if self.schema_version() < SCHEMA_VERSION:
+            self.init_database()
+            with self.connect() as conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version INTEGER PRIMARY KEY,
+                        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+                conn.execute("INSERT OR IGNORE INTO schema_version (version) VALUES (?)", (SCHEMA_VERSION,))
+                conn.commit()
+
+        if year_months is None:
+            now = datetime.now()
+            following = datetime(now.year + now.month // 12, now.month % 12 + 1, 1)
+            year_months = [d.strftime('%Y_%m') for d in (now, following) if d.year == self.year]
+        for year_month in year_months:
+            self.ensure_monthly_tables(year_month)
+        return year_months
+
     def init_database(self):
         """Create all permanent tables if they don't exist."""
         with self.connect() as conn:
             cursor = conn.cursor()
+            # Free pages can be returned with PRAGMA incremental_vacuum (see
+            # modules/maintenance.py). Only takes effect on a new file; existing
+            # ones are converted by the maintenance job's one-time VACUUM
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            # WAL lets the upload workers write while pages keep reading
+            cursor.execute("PRAGMA journal_mode = WAL")
 
             # Agents master
             cursor.execute("""
@@ -55,6 +309,41 @@ class DatabaseManager:
                     updated_at TIMESTAMP
                 )
             """)
+            # Integer surrogate key referenced by the fact tables. Added after
+            # release, so it is a plain column: backfilled here, assigned by the
+            # trigger to every new agent and kept by the HC upsert
+            self.add_column_if_missing(cursor, 'agents_master', 'agent_key', 'INTEGER')
+            last_key = cursor.execute("SELECT COALESCE(MAX(agent_key), 0) FROM agents_master").fetchone()[0]
+            cursor.execute("""
+                UPDATE agents_master SET agent_key = ? + (
+                    SELECT COUNT(*) FROM agents_master a WHERE a.rowid <= agents_master.rowid
+                )
+                WHERE agent_key IS NULL
+            """, (last_key,))
+            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_agents_master_agent_key ON agents_master (agent_key)")
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_agents_master_agent_key
+                AFTER INSERT ON agents_master WHEN NEW.agent_key IS NULL
+                BEGIN
+                    UPDATE agents_master
+                    SET agent_key = (SELECT COALESCE(MAX(agent_key), 0) + 1 FROM agents_master)
+                    WHERE citrix_uid = NEW.citrix_uid;
+                END
+            """)
+
+            # Confirmed name spellings of agents (modules/identity.py), keyed by name_key()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS agent_aliases (
+                    alias_key TEXT PRIMARY KEY,
+                    alias TEXT NOT NULL,
+                    citrix_uid TEXT NOT NULL,
+                    source TEXT,
+                    confirmed_by TEXT,
+                    confirmed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (citrix_uid) REFERENCES agents_master(citrix_uid)
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_agent_aliases_agent ON agent_aliases (citrix_uid)")
 
             # Shift dictionary
             cursor.execute("""
@@ -68,6 +357,7 @@ class DatabaseManager:
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
+            self.load_shift_seed(cursor)
 
             # User access
             cursor.execute("""
@@ -100,6 +390,11 @@ class DatabaseManager:
                 )
             """)
 
+            # Audit Trail viewer filters and keyset pagination (rowid is the tie-breaker)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_log_timestamp ON audit_log (timestamp)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_log_user ON audit_log (user_citrix, timestamp)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_log_entity ON audit_log (entity_name, entity_key)")
+
             # Error log
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS error_log (
@@ -119,6 +414,20 @@ class DatabaseManager:
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
+            # Added after release: existing databases get it via ALTER TABLE
+            self.add_column_if_missing(cursor, 'error_log', 'upload_batch', 'TEXT')
+            # Unknown-agent rows as they would have been inserted (JSON), loaded by IdentityResolver.confirm
+            self.add_column_if_missing(cursor, 'error_log', 'payload', 'TEXT')
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_error_log_batch
+                ON error_log (upload_batch, error_type)
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_error_log_created ON error_log (created_at)")
+            # Unknown-agent names waiting for an alias (IdentityResolver.unresolved_names / confirm)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_error_log_unresolved
+                ON error_log (resolved, error_type, agent_name)
+            """)
 
             # LOB groups
             cursor.execute("""
@@ -155,6 +464,10 @@ class DatabaseManager:
                     FOREIGN KEY (agent_b_citrix) REFERENCES agents_master(citrix_uid)
                 )
             """)
+            # Pending queue and per-agent duplicate / conflict checks
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_shift_swaps_status ON shift_swaps (status, shift_date)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_shift_swaps_agent_a ON shift_swaps (agent_a_citrix, shift_date)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_shift_swaps_agent_b ON shift_swaps (agent_b_citrix, shift_date)")
 
             # CMS productivity aggregated data
             cursor.execute("""
@@ -186,141 +499,240 @@ class DatabaseManager:
                 )
             """)
 
-            conn.commit()
-
-    def ensure_monthly_tables(self, year_month):
-        """Create month-specific tables for a given year_month (e.g., '2025_01')."""
-        with self.connect() as conn:
-            cursor = conn.cursor()
+            # Daily KPIs (one row per date, maintained by AttendanceEngine)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS daily_kpi (
+                    kpi_date DATE PRIMARY KEY,
+                    total_agents INTEGER DEFAULT 0,
+                    scheduled INTEGER DEFAULT 0,
+                    present INTEGER DEFAULT 0,
+                    absent INTEGER DEFAULT 0,
+                    scheduled_off INTEGER DEFAULT 0,
+                    staff_time_sec INTEGER DEFAULT 0,
+                    adherence_pct REAL,
+                    updated_at TIMESTAMP
+                )
+            """)
 
-            # Roster original
-            cursor.execute(f"""
-                CREATE TABLE IF NOT EXISTS roster_original_{year_month} (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+            # Intraday running session totals (folded per upload batch)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS intraday_sessions (
+                    snapshot_date DATE NOT NULL,
                     citrix_uid TEXT NOT NULL,
-                    acd_id TEXT,
-                    shift_date DATE NOT NULL,
-                    scheduled_shift TEXT,
-                    normalized_shift TEXT,
-                    shift_source TEXT DEFAULT 'Planner',
-                    source_file TEXT,
-                    uploaded_at TIMESTAMP,
-                    FOREIGN KEY (citrix_uid) REFERENCES agents_master(citrix_uid)
+                    first_login DATETIME,
+                    last_login DATETIME,
+                    last_logout DATETIME,
+                    session_count INTEGER DEFAULT 0,
+                    total_session_sec INTEGER DEFAULT 0,
+                    updated_at TIMESTAMP,
+                    PRIMARY KEY (snapshot_date, citrix_uid)
                 )
             """)
 
-            # Roster live
-            cursor.execute(f"""
-                CREATE TABLE IF NOT EXISTS roster_live_{year_month} (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+            # Intraday adherence snapshot (one row per agent seen today)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS intraday_adherence (
+                    snapshot_date DATE NOT NULL,
                     citrix_uid TEXT NOT NULL,
-                    acd_id TEXT,
-                    shift_date DATE NOT NULL,
                     scheduled_shift TEXT,
-                    normalized_shift TEXT,
-                    shift_source TEXT,
-                    modified_by TEXT,
-                    modified_at TIMESTAMP,
-                    approved_by TEXT,
-                    approved_at TIMESTAMP,
-                    FOREIGN KEY (citrix_uid) REFERENCES agents_master(citrix_uid)
+                    scheduled_start DATETIME,
+                    first_login DATETIME,
+                    is_logged_in BOOLEAN DEFAULT 0,
+                    late_min REAL,
+                    staff_time_sec INTEGER DEFAULT 0,
+                    adherence_status TEXT,
+                    updated_at TIMESTAMP,
+                    PRIMARY KEY (snapshot_date, citrix_uid)
                 )
             """)
 
-            # CMS raw data
-            cursor.execute(f"""
-                CREATE TABLE IF NOT EXISTS cms_raw_{year_month} (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    report_date DATE NOT NULL,
-                    agent_name TEXT,
-                    login_id TEXT,
-                    citrix_uid TEXT,
-                    acd_id TEXT,
-                    ans_calls INTEGER DEFAULT 0,
-                    handle_time_sec INTEGER DEFAULT 0,
-                    avail_time_sec INTEGER DEFAULT 0,
-                    staffed_time_sec INTEGER DEFAULT 0,
-                    talk_time_sec INTEGER DEFAULT 0,
-                    hold_time_sec INTEGER DEFAULT 0,
-                    acw_time_sec INTEGER DEFAULT 0,
-                    upload_batch TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (citrix_uid) REFERENCES agents_master(citrix_uid)
+            # Upload batches already folded into the intraday tables
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS intraday_batches (
+                    upload_batch TEXT PRIMARY KEY,
+                    snapshot_date DATE NOT NULL,
+                    source_table TEXT,
+                    rows_folded INTEGER DEFAULT 0,
+                    folded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
 
-            # Aspect raw data
-            cursor.execute(f"""
-                CREATE TABLE IF NOT EXISTS aspect_raw_{year_month} (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    agent_name TEXT,
-                    login_id TEXT,
-                    citrix_uid TEXT,
-                    acd_id TEXT,
-                    event_date DATE NOT NULL,
-                    login_time DATETIME,
-                    logout_time DATETIME,
-                    logout_reason TEXT,
-                    session_duration_sec INTEGER,
-                    upload_batch TEXT,
+            # Interval staffing curves (scheduled vs logged-in per LOB)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS interval_staffing (
+                    interval_date DATE NOT NULL,
+                    lob_name TEXT NOT NULL,
+                    interval_minutes INTEGER NOT NULL,
+                    interval_index INTEGER NOT NULL,
+                    interval_start TEXT,
+                    scheduled REAL DEFAULT 0,
+                    logged_in REAL DEFAULT 0,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (citrix_uid) REFERENCES agents_master(citrix_uid)
+                    PRIMARY KEY (interval_date, lob_name, interval_minutes, interval_index)
                 )
             """)
 
-            # EIM raw data (same structure as aspect)
-            cursor.execute(f"""
-                CREATE TABLE IF NOT EXISTS eim_raw_{year_month} (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    agent_name TEXT,
-                    login_id TEXT,
-                    citrix_uid TEXT,
-                    acd_id TEXT,
-                    event_date DATE NOT NULL,
-                    login_time DATETIME,
-                    logout_time DATETIME,
-                    logout_reason TEXT,
-                    session_duration_sec INTEGER,
-                    upload_batch TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (citrix_uid) REFERENCES agents_master(citrix_uid)
+            # Upload ledger (one row per CMS / Aspect / EIM file)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS upload_ledger (
+                    batch_id TEXT PRIMARY KEY,
+                    content_hash TEXT NOT NULL,
+                    source_type TEXT NOT NULL,
+                    target_table TEXT,
+                    year_month TEXT,
+                    file_name TEXT,
+                    file_size INTEGER,
+                    row_count INTEGER DEFAULT 0,
+                    agent_count INTEGER DEFAULT 0,
+                    min_date DATE,
+                    max_date DATE,
+                    status TEXT DEFAULT 'Processing',
+                    started_at TIMESTAMP,
+                    finished_at TIMESTAMP,
+                    duration_sec REAL,
+                    uploaded_by TEXT,
+                    notes TEXT
                 )
             """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_upload_ledger_hash
+                ON upload_ledger (content_hash, source_type)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_upload_ledger_range
+                ON upload_ledger (target_table, min_date, max_date)
+            """)
 
-            # Attendance processed
-            cursor.execute(f"""
-                CREATE TABLE IF NOT EXISTS attendance_processed_{year_month} (
+            # Background upload jobs
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS upload_jobs (
+                    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_type TEXT NOT NULL,
+                    file_name TEXT,
+                    file_path TEXT,
+                    params TEXT,
+                    status TEXT DEFAULT 'Queued',
+                    rows_done INTEGER DEFAULT 0,
+                    rows_total INTEGER,
+                    result TEXT,
+                    error TEXT,
+                    submitted_by TEXT,
+                    submitted_at TIMESTAMP,
+                    started_at TIMESTAMP,
+                    finished_at TIMESTAMP
+                )
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_upload_jobs_status
+                ON upload_jobs (status, job_id)
+            """)
+
+            # Maintenance runs (ANALYZE, checkpoints, vacuum) by modules/maintenance.py
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS maintenance_log (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    citrix_uid TEXT NOT NULL,
-                    acd_id TEXT,
-                    shift_date DATE NOT NULL,
-                    original_shift TEXT,
-                    updated_shift TEXT,
-                    staff_time_sec INTEGER DEFAULT 0,
-                    staff_time_min REAL,
-                    staff_time_validation TEXT,
-                    attendance_status TEXT,
-                    absenteeism_reason TEXT,
-                    final_shift TEXT,
-                    hc_status TEXT,
-                    data_source TEXT,
-                    confidence_score INTEGER,
-                    notes TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (citrix_uid) REFERENCES agents_master(citrix_uid)
+                    task TEXT NOT NULL,
+                    started_at TIMESTAMP NOT NULL,
+                    duration_ms REAL,
+                    detail TEXT,
+                    error TEXT
                 )
             """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_maintenance_log_task ON maintenance_log (task, started_at)")
+
+            # Unified fact tables (alternative layout, filled by database/migrate_facts.py)
+            for family in MONTHLY_TABLES:
+                self._create_fact_table(cursor, family)
+
+            conn.commit()
+
+    @staticmethod
+    def _create_fact_table(cursor, family):
+        """
+        fact_{family}, its indexes and its v_fact_{family} view. A table of
+        schema version 2 (text agent columns) is rebuilt with agent_key.
+        """
+        table = fact_table(family)
+        existing = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})")]
+        cursor.execute(f"DROP VIEW IF EXISTS {fact_view(family)}")
+        legacy = bool(existing) and 'agent_key' not in existing
+        if legacy:
+            cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_v2")
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} ({fact_columns(family)})")
+        if legacy:
+            columns = [c for c in existing if c not in AGENT_COLUMNS and c != 'id']
+            cursor.execute(f"""
+                INSERT INTO {table} (agent_key, {', '.join(columns)})
+                SELECT a.agent_key, {', '.join('f.' + c for c in columns)}
+                FROM {table}_v2 f JOIN agents_master a ON a.citrix_uid = f.citrix_uid
+                ORDER BY f.id
+            """)
+            cursor.execute(f"DROP TABLE {table}_v2")
+        for cols in FACT_INDEXES.get(family, []):
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_{'_'.join(cols)} ON {table} ({', '.join(cols)})"
+            )
 
+        # Columns (and order) of the monthly table, after month_key / agent_key
+        selected = []
+        for line in _column_lines(family):
+            name = line.split()[0]
+            if name != 'FOREIGN':
+                selected.append(f"a.{AGENT_COLUMNS[name]} AS {name}" if name in AGENT_COLUMNS else f"f.{name}")
+        cursor.execute(f"""
+            CREATE VIEW {fact_view(family)} AS
+            SELECT f.month_key, f.agent_key, {', '.join(selected)}
+            FROM {table} f JOIN agents_master a ON a.agent_key = f.agent_key
+        """)
+
+    @staticmethod
+    def load_shift_seed(cursor, path=SHIFT_DICT_SEED):
+        """
+        INSERT OR IGNORE the raw_pattern,normalized_shift,shift_type rows of the
+        seed CSV, so patterns edited or deactivated by admins are left alone.
+        """
+        if not path or not os.path.exists(path):
+            return 0
+        with open(path, newline='', encoding='utf-8-sig') as fh:
+            rows = [(r['raw_pattern'].strip(), r['normalized_shift'].strip(), (r.get('shift_type') or '').strip() or None)
+                    for r in csv.DictReader(fh) if (r.get('raw_pattern') or '').strip() and r.get('normalized_shift')]
+        cursor.executemany("""
+            INSERT OR IGNORE INTO shift_dictionary (raw_pattern, normalized_shift, shift_type, created_by)
+            VALUES (?, ?, ?, 'seed')
+        """, rows)
+        return len(rows)
+
+    @staticmethod
+    def add_column_if_missing(cursor, table, column, ddl):
+        """ALTER TABLE ... ADD COLUMN unless the column already exists."""
+        existing = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})")]
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+    def ensure_monthly_tables(self, year_month):
+        """Create month-specific tables for a given year_month (e.g., '2025_01')."""
+        check_year_month(year_month)
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            for family, columns in MONTHLY_TABLES.items():
+                cursor.execute(f"CREATE TABLE IF NOT EXISTS {family}_{year_month} ({columns})")
+                for cols in MONTHLY_INDEXES.get(family, []):
+                    cursor.execute(
+                        f"CREATE INDEX IF NOT EXISTS idx_{family}_{year_month}_{'_'.join(cols)} "
+                        f"ON {family}_{year_month} ({', '.join(cols)})"
+                    )
             conn.commit()
 
     def log_error(self, error_type, source_file, source_type, raw_data,
-                  agent_name=None, login_id=None, acd_id=None, shift_date=None):
+                  agent_name=None, login_id=None, acd_id=None, shift_date=None,
+                  upload_batch=None):
+        """Single error row. For many rows use modules.error_sink.ErrorSink."""
         with self.connect() as conn:
             conn.execute("""
                 INSERT INTO error_log
                 (error_type, source_file, source_type, raw_data, agent_name,
-                 login_id, acd_id, shift_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                 login_id, acd_id, shift_date, upload_batch)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (error_type, source_file, source_type, raw_data,
-                  agent_name, login_id, acd_id, shift_date))
+                  agent_name, login_id, acd_id, shift_date, upload_batch))
             conn.commit()
\ No newline at end of file
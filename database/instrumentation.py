@@ -0,0 +1,257 @@
+# database/instrumentation.py
+"""
+Query and stage timing.
+
+When instrumentation is enabled, DatabaseManager opens connections with
+InstrumentedConnection: every statement run through it (conn.execute,
+cursors, pandas.read_sql_query) is timed and counted per normalized SQL
+text, and statements slower than SLOW_MS get their EXPLAIN QUERY PLAN
+captured. StageTimer measures the coarse stages of uploads and of the
+attendance engine and is always on (one perf_counter per stage).
+
+Everything lands in the process-wide STATS object read by the Diagnostics
+page; stages and slow statements are also written as JSON lines to the
+`wfm.perf` logger (WFM_PERF_LOG=<file> sends them to a file).
+"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+logger = logging.getLogger('wfm.perf')
+
+ENABLED = os.getenv('WFM_DB_INSTRUMENT', '0') == '1'
+# Statements slower than this are kept (and explained) as slow statements
+SLOW_MS = float(os.getenv('WFM_SLOW_QUERY_MS', '200'))
+EXPLAIN_SLOW = os.getenv('WFM_EXPLAIN_SLOW', '1') == '1'
+# Slow statements / stage runs kept in memory
+SLOW_KEEP = 50
+RECENT_STAGES = 200
+# Callables (stage, ms, rows) notified of every stage lap, e.g. modules/metrics.py
+stage_listeners = []
+
+_WHITESPACE = re.compile(r'\s+')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_MONTH_SUFFIX = re.compile(r'_\d{4}_\d{2}\b')
+_NO_EXPLAIN = ('EXPLAIN', 'PRAGMA', 'BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE',
+               'ATTACH', 'DETACH', 'CREATE', 'DROP', 'ALTER', 'VACUUM', 'ANALYZE')
+
+
+def normalize_sql(sql):
+    """Statement key: whitespace collapsed, IN (?, ?, ...) and month suffixes folded."""
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    sql = _PLACEHOLDER_LIST.sub('(?, ...)', sql)
+    return _MONTH_SUFFIX.sub('_{ym}', sql)
+
+
+def log_event(event, **fields):
+    """One structured (JSON) line on the wfm.perf logger."""
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(dict(event=event, at=datetime.now().isoformat(timespec='milliseconds'),
+                                    **fields), default=str, ensure_ascii=False))
+
+
+class PerfStats:
+    """Thread-safe counters shared by every connection and stage timer in the process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.statements = {}   # sql -> {calls, ms, max_ms, rows}
+            self.stages = {}       # stage -> {calls, ms, max_ms, rows}
+            self.slow = deque(maxlen=SLOW_KEEP)
+            self.recent_stages = deque(maxlen=RECENT_STAGES)
+            self.since = datetime.now()
+
+    @staticmethod
+    def _add(table, key, ms, rows, calls=1):
+        entry = table.get(key)
+        if entry is None:
+            entry = table[key] = {'calls': 0, 'ms': 0.0, 'max_ms': 0.0, 'rows': 0}
+        entry['calls'] += calls
+        entry['ms'] += ms
+        entry['max_ms'] = max(entry['max_ms'], ms)
+        entry['rows'] += rows or 0
+
+    def record_statement(self, sql, ms, rows=0, calls=1):
+        with self._lock:
+            self._add(self.statements, sql, ms, rows, calls)
+
+    def record_slow(self, sql, ms, plan):
+        with self._lock:
+            self.slow.append({'at': datetime.now(), 'sql': sql, 'ms': round(ms, 1), 'plan': plan})
+        log_event('slow_query', sql=sql, ms=round(ms, 1), plan=plan)
+
+    def record_stage(self, stage, ms, rows=None, **fields):
+        with self._lock:
+            self._add(self.stages, stage, ms, rows)
+            self.recent_stages.append(dict(at=datetime.now(), stage=stage, ms=round(ms, 1),
+                                           rows=rows, **fields))
+        log_event('stage', stage=stage, ms=round(ms, 1), rows=rows, **fields)
+        for listener in stage_listeners:
+            listener(stage, ms, rows)
+
+    @staticmethod
+    def _rows(table, key_name):
+        rows = []
+        for key, entry in table.items():
+            rows.append({key_name: key, 'calls': entry['calls'], 'total_ms': round(entry['ms'], 1),
+                         'avg_ms': round(entry['ms'] / entry['calls'], 2) if entry['calls'] else 0,
+                         'max_ms': round(entry['max_ms'], 1), 'rows': entry['rows']})
+        return sorted(rows, key=lambda r: r['total_ms'], reverse=True)
+
+    def statement_rows(self):
+        with self._lock:
+            return self._rows(self.statements, 'sql')
+
+    def stage_rows(self):
+        with self._lock:
+            return self._rows(self.stages, 'stage')
+
+    def slow_statements(self):
+        with self._lock:
+            return list(self.slow)[::-1]
+
+
+STATS = PerfStats()
+
+
+def set_enabled(enabled, slow_ms=None, explain_slow=None):
+    """Switch statement instrumentation for connections opened from now on."""
+    global ENABLED, SLOW_MS, EXPLAIN_SLOW
+    ENABLED = bool(enabled)
+    if slow_ms is not None:
+        SLOW_MS = float(slow_ms)
+    if explain_slow is not None:
+        EXPLAIN_SLOW = bool(explain_slow)
+
+
+def _explain(connection, sql, parameters):
+    if sql.lstrip()[:10].upper().startswith(_NO_EXPLAIN):
+        return None
+    try:
+        # Plain cursor: the EXPLAIN itself is not recorded
+        rows = sqlite3.Cursor(connection).execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+        return [row[-1] for row in rows]
+    except sqlite3.Error:
+        return None
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that records execute/executemany time and row counts into STATS."""
+
+    _key = None
+
+    def _finish(self, sql, started, calls=1, parameters=None):
+        ms = (time.perf_counter() - started) * 1000
+        self._key = normalize_sql(sql)
+        STATS.record_statement(self._key, ms, max(self.rowcount, 0), calls)
+        if ms >= SLOW_MS:
+            plan = _explain(self.connection, sql, parameters) if EXPLAIN_SLOW and parameters is not None else None
+            STATS.record_slow(self._key, ms, plan)
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        self._finish(sql, started, parameters=parameters)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        if not isinstance(seq_of_parameters, (list, tuple)):
+            seq_of_parameters = list(seq_of_parameters)
+        started = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        self._finish(sql, started, calls=len(seq_of_parameters))
+        return self
+
+    def executescript(self, sql_script):
+        started = time.perf_counter()
+        super().executescript(sql_script)
+        self._finish(sql_script, started)
+        return self
+
+    def _fetched(self, rows, started):
+        # Time spent stepping through a SELECT is added to its statement
+        if self._key is not None:
+            STATS.record_statement(self._key, (time.perf_counter() - started) * 1000, rows, calls=0)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(row is not None, started)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(len(rows), started)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(len(rows), started)
+        return rows
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose shortcut methods and cursors all go through InstrumentedCursor."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+class StageTimer:
+    """
+    Times consecutive stages of one operation:
+
+        timer = StageTimer('upload.cms', file=file.name)
+        ...parse...
+        timer.lap('parse', rows=len(df))
+        ...insert...
+        timer.lap('insert', rows=len(records))
+
+    Each lap records the time since the previous lap as `<prefix>.<stage>`.
+    """
+
+    def __init__(self, prefix, **fields):
+        self.prefix = prefix
+        self.fields = fields
+        self._last = time.perf_counter()
+
+    def lap(self, stage, rows=None):
+        now = time.perf_counter()
+        ms = (now - self._last) * 1000
+        self._last = now
+        STATS.record_stage(f"{self.prefix}.{stage}", ms, rows, **self.fields)
+        return ms
+
+    def skip(self):
+        """Restart the clock without recording (time that belongs to no stage)."""
+        self._last = time.perf_counter()
+
+
+_log_file = os.getenv('WFM_PERF_LOG')
+if _log_file and not logger.handlers:
+    _handler = logging.FileHandler(_log_file)
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
@@ -0,0 +1,97 @@
+# database/migrate_facts.py
+"""
+Copy per-month tables into the unified fact tables.
+
+    python -m database.migrate_facts --year 2026 --db-path ./data
+    python -m database.migrate_facts --year 2026 --months 2026_01 2026_02
+
+Each (family, month) is copied in its own transaction: the month_key
+partition of fact_{family} is cleared and refilled from {family}_{YYYY_MM},
+so the tool can be re-run after more uploads. Agent columns are replaced by
+agents_master.agent_key; a row whose citrix_uid is not in agents_master
+fails the copy of its month. Monthly tables are left in
+place; the app keeps using them until it is switched to the unified layout.
+"""
+import argparse
+import re
+
+from database.db_manager import AGENT_COLUMNS, DatabaseManager, MONTHLY_TABLES, fact_table, month_key
+
+_MONTH_TABLE = re.compile(r'^(?P<family>[a-z_]+)_(?P<ym>\d{4}_\d{2})$')
+
+
+def monthly_tables(conn):
+    """{year_month: [family, ...]} of the per-month tables in the database."""
+    found = {}
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'"):
+        match = _MONTH_TABLE.match(name)
+        if match and match['family'] in MONTHLY_TABLES:
+            found.setdefault(match['ym'], []).append(match['family'])
+    return dict(sorted(found.items()))
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def migrate(db, year_months=None, analyze=True):
+    """
+    Copy monthly tables of year_months (default: all found) into the fact
+    tables. Returns {year_month: {family: rows}}; raises if a copied
+    partition does not match its source row count.
+    """
+    db.bootstrap([])
+    copied = {}
+    with db.connect() as conn:
+        available = monthly_tables(conn)
+        for year_month in year_months or list(available):
+            key = month_key(year_month)
+            copied[year_month] = {}
+            for family in available.get(year_month, []):
+                source, target = f"{family}_{year_month}", fact_table(family)
+                # id is not copied: ids of different months collide
+                target_cols = set(_columns(conn, target))
+                columns = [c for c in _columns(conn, source)
+                           if c != 'id' and c not in AGENT_COLUMNS and c in target_cols]
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute(f"DELETE FROM {target} WHERE month_key = ?", (key,))
+                    conn.execute(f"""
+                        INSERT INTO {target} (month_key, agent_key, {', '.join(columns)})
+                        SELECT ?, a.agent_key, {', '.join('t.' + c for c in columns)}
+                        FROM {source} t JOIN agents_master a ON a.citrix_uid = t.citrix_uid
+                        ORDER BY t.id
+                    """, (key,))
+                    expected = conn.execute(f"SELECT COUNT(*) FROM {source}").fetchone()[0]
+                    actual = conn.execute(f"SELECT COUNT(*) FROM {target} WHERE month_key = ?",
+                                          (key,)).fetchone()[0]
+                    if expected != actual:
+                        raise RuntimeError(f"{target} month {key}: {actual} rows, expected {expected} "
+                                           f"(rows without an agents_master citrix_uid)")
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                copied[year_month][family] = actual
+        if analyze:
+            for family in MONTHLY_TABLES:
+                conn.execute(f"ANALYZE {fact_table(family)}")
+            conn.commit()
+    return copied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Copy monthly tables into the unified fact tables.")
+    parser.add_argument('--year', type=int, required=True)
+    parser.add_argument('--db-path', default='./data')
+    parser.add_argument('--months', nargs='*', help="YYYY_MM months to copy (default: all)")
+    parser.add_argument('--no-analyze', action='store_true')
+    args = parser.parse_args(argv)
+
+    db = DatabaseManager(year=args.year, db_path=args.db_path)
+    for year_month, families in migrate(db, args.months, analyze=not args.no_analyze).items():
+        print(year_month + ": " + ", ".join(f"{family} {rows}" for family, rows in families.items()))
+
+
+if __name__ == '__main__':
+    main()
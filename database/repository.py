@@ -0,0 +1,181 @@
+# database/repository.py
+import os
+
+import pandas as pd
+
+from database.statements import check_year_month
+from database.db_manager import (
+    AGENT_COLUMNS, MONTHLY_TABLES, MONTHLY_DATE_COLUMNS, fact_table, fact_view, month_key
+)
+
+LAYOUTS = ('monthly', 'unified')
+DEFAULT_LAYOUT = os.getenv('WFM_STORAGE_LAYOUT', 'monthly')
+
+
+class Source:
+    """
+    FROM / WHERE fragment of one family for a month or a date range.
+
+        src = repo.source('roster_live', '2026_01')
+        conn.execute(f"SELECT citrix_uid FROM {src.table} r WHERE {src.where} AND r.shift_date = ?",
+                     (*src.params, day))
+    """
+
+    def __init__(self, table, where='1 = 1', params=()):
+        self.table = table
+        self.where = where
+        self.params = tuple(params)
+
+
+class FactRepository:
+    """
+    Access to the monthly fact families (roster_original, roster_live,
+    cms_raw, aspect_raw, eim_raw, attendance_processed) independent of the
+    storage layout:
+
+    - 'monthly': one `{family}_{YYYY_MM}` table per month (ensure_monthly_tables)
+    - 'unified': one `fact_{family}` table partitioned by month_key = YYYYMM,
+      holding the integer agent_key instead of citrix_uid / acd_id / names
+
+    Callers build SQL on source() / range_source() instead of formatting
+    table names, so the same query runs on either layout; on the unified
+    layout they read the v_fact_{family} view, which joins the agent columns
+    back from agents_master. keyed_source() exposes agent_key on both
+    layouts for aggregates that should group on the integer key and only
+    join names for the final rows.
+    """
+
+    def __init__(self, db, layout=None):
+        layout = layout or DEFAULT_LAYOUT
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown storage layout '{layout}'")
+        self.db = db
+        self.layout = layout
+
+    @staticmethod
+    def _check(family, year_month=None):
+        if family not in MONTHLY_TABLES:
+            raise ValueError(f"Unknown fact family '{family}'")
+        if year_month is not None:
+            check_year_month(year_month)
+
+    def source(self, family, year_month):
+        """Rows of one month."""
+        self._check(family, year_month)
+        if self.layout == 'monthly':
+            return Source(f"{family}_{year_month}")
+        return Source(fact_view(family), "month_key = ?", (month_key(year_month),))
+
+    def keyed_source(self, family, year_month):
+        """Rows of one month with an agent_key column (the bare fact table on the unified layout)."""
+        self._check(family, year_month)
+        if self.layout == 'monthly':
+            return Source(f"(SELECT a.agent_key, t.* FROM {family}_{year_month} t "
+                          f"JOIN agents_master a ON a.citrix_uid = t.citrix_uid)")
+        return Source(fact_table(family), "month_key = ?", (month_key(year_month),))
+
+    @staticmethod
+    def agent_keys(conn):
+        """citrix_uid -> agent_key of every agent."""
+        return dict(conn.execute("SELECT citrix_uid, agent_key FROM agents_master").fetchall())
+
+    def _monthly_tables(self, conn, family, start_key, end_key):
+        rows = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ?",
+            (f"{family}_[0-9][0-9][0-9][0-9]_[0-9][0-9]",)
+        ).fetchall()
+        tables = []
+        for (name,) in rows:
+            key = month_key(name[len(family) + 1:])
+            if start_key <= key <= end_key:
+                tables.append((key, name))
+        return [name for _, name in sorted(tables)]
+
+    def range_source(self, conn, family, start_date, end_date):
+        """
+        Rows dated in [start_date, end_date] across months. Monthly layout
+        UNION ALLs the month tables in range (the planner sees each one
+        separately); unified layout reads the month_key partitions in range of
+        one table.
+        """
+        self._check(family)
+        start_date, end_date = pd.Timestamp(start_date).date(), pd.Timestamp(end_date).date()
+        start_key = start_date.year * 100 + start_date.month
+        end_key = end_date.year * 100 + end_date.month
+        date_col = MONTHLY_DATE_COLUMNS[family]
+        if self.layout == 'unified':
+            # month_key IN (...) rather than BETWEEN: an equality per partition lets
+            # the (month_key, date) index seek on the date column as well
+            keys = [y * 100 + m for y in range(start_date.year, end_date.year + 1) for m in range(1, 13)
+                    if start_key <= y * 100 + m <= end_key]
+            return Source(fact_view(family),
+                          f"month_key IN ({', '.join('?' for _ in keys)}) AND {date_col} BETWEEN ? AND ?",
+                          (*keys, start_date, end_date))
+        tables = self._monthly_tables(conn, family, start_key, end_key)
+        if not tables:
+            # Empty result with the family's columns
+            return Source(f"(SELECT * FROM {fact_view(family)} WHERE 0)")
+        union = " UNION ALL ".join(f"SELECT * FROM {t}" for t in tables)
+        return Source(f"({union})", f"{date_col} BETWEEN ? AND ?", (start_date, end_date))
+
+    # ---------- Convenience wrappers ----------
+    def read(self, conn, family, year_month, columns='*', where=None, params=(), order_by=None):
+        """DataFrame of one month, optionally filtered by `where` (with `params`)."""
+        src = self.source(family, year_month)
+        sql = f"SELECT {columns} FROM {src.table} WHERE {src.where}"
+        if where:
+            sql += f" AND ({where})"
+        if order_by:
+            sql += f" ORDER BY {order_by}"
+        return pd.read_sql_query(sql, conn, params=(*src.params, *params))
+
+    def read_range(self, conn, family, start_date, end_date, columns='*', where=None, params=()):
+        """DataFrame of [start_date, end_date] across months."""
+        src = self.range_source(conn, family, start_date, end_date)
+        sql = f"SELECT {columns} FROM {src.table} WHERE {src.where}"
+        if where:
+            sql += f" AND ({where})"
+        return pd.read_sql_query(sql, conn, params=(*src.params, *params))
+
+    def insert(self, conn, family, year_month, columns, rows):
+        """
+        executemany of `rows` (tuples in `columns` order) into one month; returns
+        the row count. Rows are keyed by citrix_uid as in the monthly tables; the
+        unified layout stores its agent_key and drops the other agent columns.
+        """
+        self._check(family, year_month)
+        columns = list(columns)
+        if self.layout == 'monthly':
+            table, values = f"{family}_{year_month}", rows
+        else:
+            key = month_key(year_month)
+            keys = self.agent_keys(conn)
+            uid = columns.index('citrix_uid')
+            kept = [i for i, c in enumerate(columns) if c not in AGENT_COLUMNS]
+            values = []
+            for row in rows:
+                if row[uid] not in keys:
+                    raise ValueError(f"Unknown agent '{row[uid]}'")
+                values.append((key, keys[row[uid]], *(row[i] for i in kept)))
+            table, columns = fact_table(family), ['month_key', 'agent_key'] + [columns[i] for i in kept]
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+            values
+        )
+        return len(rows)
+
+    def delete(self, conn, family, year_month, where=None, params=()):
+        """Delete rows of one month (all of them when `where` is None); returns the row count."""
+        self._check(family, year_month)
+        if self.layout == 'monthly':
+            table, condition, base = f"{family}_{year_month}", "1 = 1", ()
+        else:
+            table, condition, base = fact_table(family), "month_key = ?", (month_key(year_month),)
+            if where:
+                # `where` may name the agent columns, which only the view has
+                where = f"id IN (SELECT id FROM {fact_view(family)} WHERE month_key = ? AND ({where}))"
+                params = (*base, *params)
+        sql = f"DELETE FROM {table} WHERE {condition}"
+        if where:
+            sql += f" AND ({where})"
+        return conn.execute(sql, (*base, *params)).rowcount
@@ -0,0 +1,218 @@
+# database/statements.py
+"""
+SQL text of the statements that run against the per-month tables.
+
+Month tables are named {family}_{YYYY_MM}, so their SQL cannot use a bound
+parameter for the table. Handlers and the engine used to format the text on
+every call (the HC upsert once per row). sql(name, year_month) renders a
+template from STATEMENTS once per (name, year_month, identifiers) and
+returns the same string object afterwards:
+
+    conn.executemany(sql('cms_raw.insert', year_month), records)
+
+year_month must match YYYY_MM with a real month and extra identifiers
+(TEMP table names) must be plain SQL identifiers, so nothing from a request
+ends up in the text unchecked. Because the text is identical from call to
+call, sqlite3's per-connection statement cache (CACHED_STATEMENTS, passed
+by DatabaseManager.get_connection) reuses the prepared statement instead of
+compiling it again within a connection.
+"""
+import functools
+import os
+import re
+
+# Prepared statements kept per connection by sqlite3 (its default is 128)
+CACHED_STATEMENTS = int(os.getenv('WFM_SQLITE_STATEMENT_CACHE', '256'))
+
+_YEAR_MONTH = re.compile(r'^(19|20)\d{2}_(0[1-9]|1[0-2])$')
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+_AGENTS_FILTER = "AND citrix_uid IN (SELECT citrix_uid FROM {agents})"
+
+STATEMENTS = {
+    # ---------- Upload handlers ----------
+    'agents.acd_conflict': """
+        SELECT citrix_uid FROM agents_master WHERE acd_id = ? AND citrix_uid != ?
+    """,
+    'agents.upsert': """
+        INSERT INTO agents_master (citrix_uid, acd_id, name, premises, segment, queue, language,
+                                   batch, date_of_join, certified_date, go_live_date,
+                                   team_leader, supervisor, manager, status)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(citrix_uid) DO UPDATE SET
+            acd_id = excluded.acd_id,
+            name = excluded.name,
+            premises = excluded.premises,
+            segment = excluded.segment,
+            queue = excluded.queue,
+            language = excluded.language,
+            batch = excluded.batch,
+            date_of_join = excluded.date_of_join,
+            certified_date = excluded.certified_date,
+            go_live_date = excluded.go_live_date,
+            team_leader = excluded.team_leader,
+            supervisor = excluded.supervisor,
+            manager = excluded.manager,
+            status = excluded.status,
+            updated_at = CURRENT_TIMESTAMP
+    """,
+    'roster_original.insert': """
+        INSERT INTO roster_original_{ym}
+        (citrix_uid, acd_id, shift_date, scheduled_shift, normalized_shift, source_file)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """,
+    # roster_live has no source_file column
+    'roster_live.insert': """
+        INSERT INTO roster_live_{ym}
+        (citrix_uid, acd_id, shift_date, scheduled_shift, normalized_shift, shift_source)
+        VALUES (?, ?, ?, ?, ?, 'Planner')
+    """,
+    'cms_raw.insert': """
+        INSERT INTO cms_raw_{ym}
+        (report_date, agent_name, login_id, citrix_uid, acd_id,
+         ans_calls, handle_time_sec, avail_time_sec, staffed_time_sec,
+         talk_time_sec, hold_time_sec, acw_time_sec, upload_batch)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+    'aspect_raw.insert': """
+        INSERT INTO aspect_raw_{ym}
+        (agent_name, login_id, citrix_uid, acd_id, event_date,
+         login_time, logout_time, logout_reason, session_duration_sec, upload_batch)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+    'eim_raw.insert': """
+        INSERT INTO eim_raw_{ym}
+        (agent_name, login_id, citrix_uid, acd_id, event_date,
+         login_time, logout_time, logout_reason, session_duration_sec, upload_batch)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+
+    # ---------- Attendance engine (".agents": limited to the citrix_uids of a TEMP table) ----------
+    'engine.roster_day': """
+        SELECT r.citrix_uid, r.acd_id, r.scheduled_shift as updated_shift,
+               a.name, a.queue, a.status as hc_status
+        FROM roster_live_{ym} r
+        LEFT JOIN agents_master a ON r.citrix_uid = a.citrix_uid
+        WHERE r.shift_date = ?
+    """,
+    'engine.roster_day.agents': """
+        SELECT r.citrix_uid, r.acd_id, r.scheduled_shift as updated_shift,
+               a.name, a.queue, a.status as hc_status
+        FROM roster_live_{ym} r
+        LEFT JOIN agents_master a ON r.citrix_uid = a.citrix_uid
+        WHERE r.shift_date = ? AND r.citrix_uid IN (SELECT citrix_uid FROM {agents})
+    """,
+    'engine.cms_day': """
+        SELECT citrix_uid, staffed_time_sec, ans_calls, handle_time_sec
+        FROM cms_raw_{ym}
+        WHERE report_date = ?
+    """,
+    'engine.cms_day.agents': """
+        SELECT citrix_uid, staffed_time_sec, ans_calls, handle_time_sec
+        FROM cms_raw_{ym}
+        WHERE report_date = ? """ + _AGENTS_FILTER,
+    'attendance.delete_day': """
+        DELETE FROM attendance_processed_{ym} WHERE shift_date = ?
+    """,
+    'attendance.delete_day.agents': """
+        DELETE FROM attendance_processed_{ym} WHERE shift_date = ? """ + _AGENTS_FILTER,
+    'attendance.insert': """
+        INSERT INTO attendance_processed_{ym}
+        (citrix_uid, acd_id, shift_date, original_shift, updated_shift,
+         staff_time_sec, staff_time_min, staff_time_validation,
+         attendance_status, final_shift, absenteeism_reason,
+         hc_status, data_source, confidence_score, notes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+    'sessions.eim_raw': """
+        SELECT citrix_uid, login_time, logout_time, session_duration_sec
+        FROM eim_raw_{ym}
+        WHERE citrix_uid IS NOT NULL
+    """,
+    'sessions.eim_raw.agents': """
+        SELECT citrix_uid, login_time, logout_time, session_duration_sec
+        FROM eim_raw_{ym}
+        WHERE citrix_uid IS NOT NULL """ + _AGENTS_FILTER,
+    'sessions.eim_raw.day': """
+        SELECT citrix_uid, login_time, logout_time, session_duration_sec
+        FROM eim_raw_{ym}
+        WHERE citrix_uid IS NOT NULL AND event_date = ?
+    """,
+    'sessions.eim_raw.day.agents': """
+        SELECT citrix_uid, login_time, logout_time, session_duration_sec
+        FROM eim_raw_{ym}
+        WHERE citrix_uid IS NOT NULL AND event_date = ? """ + _AGENTS_FILTER,
+    'sessions.aspect_raw': """
+        SELECT citrix_uid, login_time, logout_time, session_duration_sec
+        FROM aspect_raw_{ym}
+        WHERE citrix_uid IS NOT NULL
+    """,
+    'sessions.aspect_raw.agents': """
+        SELECT citrix_uid, login_time, logout_time, session_duration_sec
+        FROM aspect_raw_{ym}
+        WHERE citrix_uid IS NOT NULL """ + _AGENTS_FILTER,
+    'sessions.aspect_raw.day': """
+        SELECT citrix_uid, login_time, logout_time, session_duration_sec
+        FROM aspect_raw_{ym}
+        WHERE citrix_uid IS NOT NULL AND event_date = ?
+    """,
+    'sessions.aspect_raw.day.agents': """
+        SELECT citrix_uid, login_time, logout_time, session_duration_sec
+        FROM aspect_raw_{ym}
+        WHERE citrix_uid IS NOT NULL AND event_date = ? """ + _AGENTS_FILTER,
+
+    # ---------- Shift learning (modules/shift_learning.py) ----------
+    'roster_live.unknown_shifts': """
+        SELECT scheduled_shift AS raw_shift, COUNT(*) AS rows, COUNT(DISTINCT citrix_uid) AS agents
+        FROM roster_live_{ym}
+        WHERE normalized_shift = 'UNKNOWN'
+        GROUP BY scheduled_shift
+    """,
+    'roster_live.relearn': """
+        UPDATE roster_live_{ym} SET normalized_shift = ?
+        WHERE normalized_shift = 'UNKNOWN' AND scheduled_shift = ?
+    """,
+    'roster_original.relearn': """
+        UPDATE roster_original_{ym} SET normalized_shift = ?
+        WHERE normalized_shift = 'UNKNOWN' AND scheduled_shift = ?
+    """,
+}
+
+
+def check_year_month(year_month):
+    """Return year_month if it is a valid YYYY_MM month, else raise ValueError."""
+    if not isinstance(year_month, str) or not _YEAR_MONTH.match(year_month):
+        raise ValueError(f"Invalid year_month {year_month!r}")
+    return year_month
+
+
+def check_identifier(name):
+    """Return name if it is a plain SQL identifier, else raise ValueError."""
+    if not isinstance(name, str) or not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid SQL identifier {name!r}")
+    return name
+
+
+@functools.lru_cache(maxsize=1024)
+def _render(name, year_month, identifiers):
+    return STATEMENTS[name].format(ym=year_month, **dict(identifiers)).strip()
+
+
+def sql(name, year_month=None, **identifiers):
+    """
+    Text of statement `name` for year_month, with {identifier} placeholders
+    (e.g. agents='_calc_agents') filled in. Raises KeyError for an unknown
+    statement and ValueError for an invalid month or identifier.
+    """
+    if name not in STATEMENTS:
+        raise KeyError(f"Unknown statement '{name}'")
+    if year_month is not None:
+        check_year_month(year_month)
+    for value in identifiers.values():
+        check_identifier(value)
+    return _render(name, year_month, tuple(sorted(identifiers.items())))
+
+
+def cache_info():
+    """functools cache statistics of the rendered statements (hits, misses, currsize)."""
+    return _render.cache_info()
@@ -1,149 +1,252 @@
 # modules/attendance_engine.py
+import time
 import pandas as pd
 from datetime import datetime, timedelta
+from modules.session_merge import SessionMerger
+from modules.frames import load_frame
+from database.instrumentation import StageTimer
+from database.statements import sql
+from modules import metrics
+from modules.maintenance import note_bulk_load
+
+# Statuses counted as "present" / "absent" in the daily KPIs.
+PRESENT_STATUSES = ('Full Shift', 'Half Day', 'Overtime', 'Partial')
+ABSENT_STATUSES = ('Absent',)
 
 class AttendanceEngine:
     def __init__(self, db, normalizer, audit):
         self.db = db
         self.normalizer = normalizer
         self.audit = audit
+        self.merger = SessionMerger(db)
 
     def calculate_for_date(self, calc_date):
         year_month = f"{calc_date.year}_{calc_date.month:02d}"
         with self.db.connect() as conn:
-            # Get live roster for that date
-            roster_df = pd.read_sql_query(f"""
-                SELECT r.citrix_uid, r.acd_id, r.scheduled_shift as updated_shift,
-                       a.name, a.queue, a.status as hc_status
-                FROM roster_live_{year_month} r
-                LEFT JOIN agents_master a ON r.citrix_uid = a.citrix_uid
-                WHERE r.shift_date = ?
-            """, conn, params=(calc_date,))
-
-            # Get CMS data (if available)
-            cms_df = pd.read_sql_query(f"""
-                SELECT citrix_uid, staffed_time_sec, ans_calls, handle_time_sec
-                FROM cms_raw_{year_month}
-                WHERE report_date = ?
-            """, conn, params=(calc_date,))
-
-            # Get Aspect/EIM sessions (aggregated)
-            aspect_df = pd.read_sql_query(f"""
-                SELECT citrix_uid, SUM(session_duration_sec) as total_staff_sec
-                FROM aspect_raw_{year_month}
-                WHERE event_date = ?
-                GROUP BY citrix_uid
-            """, conn, params=(calc_date,))
-
-            eim_df = pd.read_sql_query(f"""
-                SELECT citrix_uid, SUM(session_duration_sec) as total_staff_sec
-                FROM eim_raw_{year_month}
-                WHERE event_date = ?
-                GROUP BY citrix_uid
-            """, conn, params=(calc_date,))
-
-            # Combine staff time from best source
-            # Priority: EIM > Aspect > CMS
-            staff_time = {}
-            for _, row in eim_df.iterrows():
-                staff_time[row['citrix_uid']] = row['total_staff_sec']
-            for _, row in aspect_df.iterrows():
-                if row['citrix_uid'] not in staff_time:
-                    staff_time[row['citrix_uid']] = row['total_staff_sec']
-            for _, row in cms_df.iterrows():
-                if row['citrix_uid'] not in staff_time:
-                    staff_time[row['citrix_uid']] = row['staffed_time_sec']
-
-            # Process each agent
-            attendance_records = []
-            for _, roster_row in roster_df.iterrows():
-                citrix = roster_row['citrix_uid']
-                scheduled = roster_row['updated_shift']
-                staff_sec = staff_time.get(citrix, 0)
-                staff_min = staff_sec / 60.0
-
-                # Determine attendance status
-                if scheduled == "OFF":
-                    status = "Scheduled Off"
-                    final = "OFF"
-                    reason = ""
-                elif staff_sec == 0:
-                    status = "Absent"
-                    final = "Absent"
-                    reason = "No Show"
-                else:
-                    # Parse scheduled duration (simplified)
-                    # In reality you'd have shift start/end times, but we'll use a heuristic
-                    if ":" in scheduled:
-                        try:
-                            # assume 9h shift if not OFF
-                            worked_hours = staff_sec / 3600.0
-                            if worked_hours >= 9 - 0.5:  # 30 min tolerance
-                                status = "Full Shift"
-                                final = "Full Shift"
-                                reason = "OK"
-                            elif 4 <= worked_hours < 4.5:
-                                status = "Half Day"
-                                final = "Half Day Annual"
-                                reason = "Left Early (4h)"
-                            elif worked_hours >= 10:
-                                status = "Overtime"
-                                final = "Overtime"
-                                reason = ">10h"
-                            elif worked_hours < 4.5:
-                                status = "Absent"
-                                final = "Absent"
-                                reason = "<4.5h"
-                            else:
-                                status = "Partial"
-                                final = "Partial"
-                                reason = "Other"
-                        except:
-                            status = "Unknown"
-                            final = scheduled
-                            reason = "Shift parse error"
-                    else:
+            started = time.perf_counter()
+            processed = self._calculate(conn, calc_date, year_month)
+            timer = StageTimer('engine', date=calc_date)
+            self._refresh_daily_kpi(conn, calc_date, year_month)
+            conn.commit()
+            timer.lap('kpi')
+            note_bulk_load(self.db, f"attendance_processed_{year_month}", processed)
+            metrics.record_attendance('full', processed, time.perf_counter() - started)
+            return {"success": True, "processed": processed}
+
+    def recalculate_agents(self, pairs):
+        """
+        Recompute attendance for specific (citrix_uid, shift_date) pairs only,
+        e.g. after approved swaps. Dates that were never calculated are skipped
+        (calculate_for_date will pick them up). daily_kpi is adjusted by the
+        difference between the old and new rows of those agents, so the cost
+        does not depend on how many agents the site has.
+        """
+        by_date = {}
+        for citrix, shift_date in pairs:
+            by_date.setdefault(pd.to_datetime(shift_date).date(), set()).add(citrix)
+
+        started = time.perf_counter()
+        processed = 0
+        skipped_dates = []
+        with self.db.connect() as conn:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS _calc_agents (citrix_uid TEXT PRIMARY KEY)")
+            for calc_date, agents in sorted(by_date.items()):
+                year_month = f"{calc_date.year}_{calc_date.month:02d}"
+                calculated = conn.execute(
+                    "SELECT 1 FROM daily_kpi WHERE kpi_date = ?", (calc_date,)
+                ).fetchone()
+                if not calculated:
+                    skipped_dates.append(calc_date)
+                    continue
+                conn.execute("DELETE FROM _calc_agents")
+                conn.executemany("INSERT INTO _calc_agents (citrix_uid) VALUES (?)",
+                                 [(c,) for c in agents])
+                before = self._kpi_stats(conn, calc_date, year_month, '_calc_agents')
+                processed += self._calculate(conn, calc_date, year_month, '_calc_agents')
+                after = self._kpi_stats(conn, calc_date, year_month, '_calc_agents')
+                self._apply_kpi_delta(conn, calc_date, before, after)
+            conn.commit()
+        metrics.record_attendance('incremental', processed, time.perf_counter() - started)
+        return {"success": True, "processed": processed, "skipped_dates": skipped_dates}
+
+    def _calculate(self, conn, calc_date, year_month, agents_table=None):
+        """
+        Rebuild attendance_processed rows for calc_date, for every rostered agent
+        or only the agents listed in the TEMP table `agents_table`.
+        Runs on the caller's connection; returns the number of rows written.
+        """
+        # Statement variants limited to the agents of the TEMP table
+        variant, tables = ('.agents', {'agents': agents_table}) if agents_table else ('', {})
+        timer = StageTimer('engine', date=calc_date, agents=agents_table or 'all')
+        # Get live roster for that date
+        roster_df = load_frame(conn, sql('engine.roster_day' + variant, year_month, **tables), (calc_date,))
+
+        # Get CMS data (if available)
+        cms_df = load_frame(conn, sql('engine.cms_day' + variant, year_month, **tables), (calc_date,))
+        timer.lap('load', rows=len(roster_df) + len(cms_df))
+
+        # Get Aspect/EIM sessions; overlapping and duplicated sessions
+        # are merged so worked time is counted once per agent
+        sessions = self.merger.load_sessions(conn, year_month, calc_date, agents_table)
+        eim_df = sessions[sessions['source'] == 'EIM']
+        aspect_df = sessions[sessions['source'] == 'Aspect']
+
+        # Combine staff time from best source
+        # Priority: EIM/Aspect (merged) > CMS
+        staff_time = self.merger.worked_time(sessions).to_dict()
+        for _, row in cms_df.iterrows():
+            if row['citrix_uid'] not in staff_time:
+                staff_time[row['citrix_uid']] = row['staffed_time_sec']
+        timer.lap('sessions', rows=len(sessions))
+
+        # Process each agent
+        attendance_records = []
+        for _, roster_row in roster_df.iterrows():
+            citrix = roster_row['citrix_uid']
+            scheduled = roster_row['updated_shift']
+            staff_sec = staff_time.get(citrix, 0)
+            staff_min = staff_sec / 60.0
+
+            # Determine attendance status
+            if scheduled == "OFF":
+                status = "Scheduled Off"
+                final = "OFF"
+                reason = ""
+            elif staff_sec == 0:
+                status = "Absent"
+                final = "Absent"
+                reason = "No Show"
+            else:
+                # Parse scheduled duration (simplified)
+                # In reality you'd have shift start/end times, but we'll use a heuristic
+                if ":" in scheduled:
+                    try:
+                        # assume 9h shift if not OFF
+                        worked_hours = staff_sec / 3600.0
+                        if worked_hours >= 9 - 0.5:  # 30 min tolerance
+                            status = "Full Shift"
+                            final = "Full Shift"
+                            reason = "OK"
+                        elif 4 <= worked_hours < 4.5:
+                            status = "Half Day"
+                            final = "Half Day Annual"
+                            reason = "Left Early (4h)"
+                        elif worked_hours >= 10:
+                            status = "Overtime"
+                            final = "Overtime"
+                            reason = ">10h"
+                        elif worked_hours < 4.5:
+                            status = "Absent"
+                            final = "Absent"
+                            reason = "<4.5h"
+                        else:
+                            status = "Partial"
+                            final = "Partial"
+                            reason = "Other"
+                    except:
                         status = "Unknown"
                         final = scheduled
-                        reason = "Non‑time shift"
-
-                # Determine data source used
-                if citrix in eim_df['citrix_uid'].values:
-                    source = 'EIM'
-                elif citrix in aspect_df['citrix_uid'].values:
-                    source = 'Aspect'
-                elif citrix in cms_df['citrix_uid'].values:
-                    source = 'CMS'
+                        reason = "Shift parse error"
                 else:
-                    source = 'None'
-
-                attendance_records.append((
-                    citrix,
-                    roster_row.get('acd_id'),
-                    calc_date,
-                    roster_row.get('scheduled_shift'),  # original? need original from roster_original
-                    scheduled,
-                    staff_sec,
-                    staff_min,
-                    status,
-                    final,
-                    reason,
-                    roster_row.get('hc_status'),
-                    source,
-                    100 if source != 'None' else 0,
-                    ''
-                ))
-
-            # Clear previous records for this date
-            conn.execute(f"DELETE FROM attendance_processed_{year_month} WHERE shift_date=?", (calc_date,))
-            # Insert new
-            conn.executemany(f"""
-                INSERT INTO attendance_processed_{year_month}
-                (citrix_uid, acd_id, shift_date, original_shift, updated_shift,
-                 staff_time_sec, staff_time_min, staff_time_validation,
-                 attendance_status, final_shift, absenteeism_reason,
-                 hc_status, data_source, confidence_score, notes)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, attendance_records)
-            conn.commit()
-            return {"success": True, "processed": len(attendance_records)}
\ No newline at end of file
+                    status = "Unknown"
+                    final = scheduled
+                    reason = "Non‑time shift"
+
+            # Determine data source used
+            if citrix in eim_df['citrix_uid'].values:
+                source = 'EIM'
+            elif citrix in aspect_df['citrix_uid'].values:
+                source = 'Aspect'
+            elif citrix in cms_df['citrix_uid'].values:
+                source = 'CMS'
+            else:
+                source = 'None'
+
+            attendance_records.append((
+                citrix,
+                roster_row.get('acd_id'),
+                calc_date,
+                roster_row.get('scheduled_shift'),  # original? need original from roster_original
+                scheduled,
+                staff_sec,
+                staff_min,
+                None,  # staff_time_validation
+                status,
+                final,
+                reason,
+                roster_row.get('hc_status'),
+                source,
+                100 if source != 'None' else 0,
+                ''
+            ))
+        timer.lap('classify', rows=len(attendance_records))
+
+        # Clear previous records for this date
+        conn.execute(sql('attendance.delete_day' + variant, year_month, **tables), (calc_date,))
+        # Insert new
+        conn.executemany(sql('attendance.insert', year_month), attendance_records)
+        timer.lap('write', rows=len(attendance_records))
+        return len(attendance_records)
+
+    def _kpi_stats(self, conn, calc_date, year_month, agents_table=None):
+        """Status counts and staff time of calc_date (optionally for a TEMP table of agents)."""
+        present = ','.join('?' for _ in PRESENT_STATUSES)
+        absent = ','.join('?' for _ in ABSENT_STATUSES)
+        agent_filter = f"AND citrix_uid IN (SELECT citrix_uid FROM {agents_table})" if agents_table else ""
+        return conn.execute(f"""
+            SELECT
+                COUNT(*) AS total,
+                SUM(CASE WHEN attendance_status = 'Scheduled Off' THEN 1 ELSE 0 END) AS scheduled_off,
+                SUM(CASE WHEN attendance_status IN ({present}) THEN 1 ELSE 0 END) AS present,
+                SUM(CASE WHEN attendance_status IN ({absent}) THEN 1 ELSE 0 END) AS absent,
+                SUM(staff_time_sec) AS staff_time_sec
+            FROM attendance_processed_{year_month}
+            WHERE shift_date = ? {agent_filter}
+        """, (*PRESENT_STATUSES, *ABSENT_STATUSES, calc_date)).fetchone()
+
+    def _apply_kpi_delta(self, conn, calc_date, before, after):
+        """Shift the daily_kpi row of calc_date by (after - before) and recompute adherence."""
+        def delta(key):
+            return (after[key] or 0) - (before[key] or 0)
+        conn.execute("""
+            UPDATE daily_kpi SET
+                scheduled = scheduled + ?,
+                present = present + ?,
+                absent = absent + ?,
+                scheduled_off = scheduled_off + ?,
+                staff_time_sec = staff_time_sec + ?,
+                adherence_pct = CASE WHEN scheduled + ? > 0
+                                     THEN ROUND((present + ?) * 100.0 / (scheduled + ?), 1) END,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE kpi_date = ?
+        """, (delta('total') - delta('scheduled_off'), delta('present'), delta('absent'),
+              delta('scheduled_off'), delta('staff_time_sec'),
+              delta('total') - delta('scheduled_off'), delta('present'),
+              delta('total') - delta('scheduled_off'), calc_date))
+
+    def _refresh_daily_kpi(self, conn, calc_date, year_month):
+        """Recompute the daily_kpi row for calc_date from its attendance rows."""
+        row = self._kpi_stats(conn, calc_date, year_month)
+        total_agents = conn.execute(
+            "SELECT COUNT(*) FROM agents_master WHERE status = 'Active'"
+        ).fetchone()[0]
+
+        scheduled = (row['total'] or 0) - (row['scheduled_off'] or 0)
+        present_count = row['present'] or 0
+        adherence = round(present_count * 100.0 / scheduled, 1) if scheduled else None
+        conn.execute("""
+            INSERT INTO daily_kpi
+            (kpi_date, total_agents, scheduled, present, absent, scheduled_off,
+             staff_time_sec, adherence_pct, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(kpi_date) DO UPDATE SET
+                total_agents = excluded.total_agents,
+                scheduled = excluded.scheduled,
+                present = excluded.present,
+                absent = excluded.absent,
+                scheduled_off = excluded.scheduled_off,
+                staff_time_sec = excluded.staff_time_sec,
+                adherence_pct = excluded.adherence_pct,
+                updated_at = excluded.updated_at
+        """, (calc_date, total_agents, scheduled, present_count, row['absent'] or 0,
+              row['scheduled_off'] or 0, row['staff_time_sec'] or 0, adherence))
@@ -1,7 +1,169 @@
 # modules/audit.py
+import atexit
+import json
+import logging
+import queue
+import threading
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+
+def _utcnow():
+    """Naive UTC time: the same clock as SQLite CURRENT_TIMESTAMP (error_log.created_at)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+# Records waiting for the writer; beyond this the full-queue policy applies
+QUEUE_SIZE = 10000
+# Max rows per INSERT transaction
+BATCH_SIZE = 500
+# Seconds the writer waits for more records before committing a partial batch
+FLUSH_INTERVAL_SEC = 1.0
+# Full-queue policy: 'block' waits up to BLOCK_TIMEOUT_SEC then drops, 'drop' drops at once
+FULL_POLICY = 'block'
+BLOCK_TIMEOUT_SEC = 0.2
+
+_STOP = object()
+
+
+class _AuditWriter:
+    """
+    Background thread that drains the audit queue of one database file and
+    inserts records with executemany, up to BATCH_SIZE per transaction.
+    Dropped records (full queue) are reported as one AUDIT_DROPPED row so the
+    trail shows the gap.
+    """
+
+    def __init__(self, db, queue_size=QUEUE_SIZE):
+        self.db = db
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, record):
+        try:
+            if FULL_POLICY == 'block':
+                self.queue.put(record, timeout=BLOCK_TIMEOUT_SEC)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            logger.warning("Audit queue full, dropped %s on %s", record[2], record[3])
+
+    def _take_dropped(self):
+        with self._lock:
+            dropped, self.dropped = self.dropped, 0
+        return dropped
+
+    def _write(self, records):
+        dropped = self._take_dropped()
+        if dropped:
+            records = records + [('system', None, 'AUDIT_DROPPED', 'audit_log', None, None,
+                            json.dumps({"dropped": dropped}), None, None, _utcnow())]
+        try:
+            with self.db.connect() as conn:
+                conn.executemany("""
+                    INSERT INTO audit_log
+                    (user_citrix, user_name, action, entity_name, entity_key,
+                     old_value, new_value, ip_address, session_id, timestamp)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, records)
+                conn.commit()
+        except Exception:
+            logger.exception("Audit write failed, %d records lost", len(records))
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                self.queue.task_done()
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < BATCH_SIZE:
+                try:
+                    item = self.queue.get(timeout=FLUSH_INTERVAL_SEC if len(batch) == 1 else 0)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            for _ in range(len(batch) + stop):
+                self.queue.task_done()
+            if stop:
+                return
+
+    def flush(self):
+        """Block until every queued record is written."""
+        self.queue.join()
+
+    def stop(self, timeout=5.0):
+        self.queue.put(_STOP)
+        self._thread.join(timeout)
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def _get_writer(db):
+    with _writers_lock:
+        writer = _writers.get(db.db_file)
+        if writer is None:
+            writer = _AuditWriter(db)
+            _writers[db.db_file] = writer
+        return writer
+
+
+@atexit.register
+def shutdown_writers():
+    """Drain every audit queue before the interpreter exits."""
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.stop()
+
+
+def _to_text(value):
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, default=str, ensure_ascii=False)
+
+
 class AuditLogger:
-    def __init__(self, db):
+    """
+    Asynchronous audit trail. log_action only enqueues; a shared background
+    writer per database file batch-inserts into audit_log, so user actions
+    never wait on the audit commit.
+    """
+
+    def __init__(self, db, user=None, session_id=None):
         self.db = db
-    def log_action(self, **kwargs):
-        # نسخة مبسطة
-        pass
\ No newline at end of file
+        self.user = user or {}
+        self.session_id = session_id
+        self._writer = _get_writer(db)
+
+    def log_action(self, action, entity_name, entity_key=None, old_value=None, new_value=None,
+                   user_citrix=None, user_name=None, ip_address=None, **kwargs):
+        """Queue one audit record; old_value/new_value may be dicts (stored as JSON)."""
+        self._writer.put((
+            user_citrix or self.user.get('citrix_uid') or 'system',
+            user_name or self.user.get('full_name'),
+            action,
+            entity_name,
+            None if entity_key is None else str(entity_key),
+            _to_text(old_value),
+            _to_text(new_value),
+            ip_address,
+            kwargs.get('session_id', self.session_id),
+            _utcnow()
+        ))
+
+    def flush(self):
+        self._writer.flush()
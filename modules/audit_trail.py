@@ -0,0 +1,160 @@
+# modules/audit_trail.py
+import os
+from datetime import datetime, timezone
+
+import pandas as pd
+
+# Log tables the viewer can page through: time column and filterable columns
+LOG_TABLES = {
+    'audit_log': {
+        'time_col': 'timestamp',
+        'filters': ('user_citrix', 'action', 'entity_name', 'entity_key'),
+    },
+    'error_log': {
+        'time_col': 'created_at',
+        'filters': ('error_type', 'source_type', 'upload_batch', 'login_id'),
+    },
+}
+
+# Rows moved per archive transaction, so the live table is never locked for long
+ARCHIVE_CHUNK = 5000
+
+
+class AuditTrail:
+    """
+    Keyset-paginated reader for audit_log / error_log and the retention job
+    that moves old rows into `{db_path}/wfm_archive_{year}.db`.
+
+    Pages are ordered newest first by (time, id); the cursor of a page is the
+    (time, id) of its last row and the next page asks for rows strictly
+    before it, so every page is an index range scan regardless of depth.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    @property
+    def archive_file(self):
+        return os.path.join(self.db.db_path, f"wfm_archive_{self.db.year}.db")
+
+    def page(self, table='audit_log', start=None, end=None, cursor=None, limit=50, **filters):
+        """
+        One page of `table`, newest first.
+        start/end bound the time column (end exclusive); filters are equality
+        matches on LOG_TABLES[table]['filters']. Returns (df, next_cursor);
+        next_cursor is None on the last page.
+        """
+        spec = LOG_TABLES[table]
+        time_col = spec['time_col']
+        where, params = [], []
+        for col, value in filters.items():
+            if col not in spec['filters']:
+                raise ValueError(f"Unknown filter '{col}' for {table}")
+            if value not in (None, ''):
+                where.append(f"{col} = ?")
+                params.append(value)
+        if start is not None:
+            where.append(f"{time_col} >= ?")
+            params.append(str(start))
+        if end is not None:
+            where.append(f"{time_col} < ?")
+            params.append(str(end))
+        if cursor is not None:
+            where.append(f"({time_col}, id) < (?, ?)")
+            params.extend(cursor)
+
+        sql = f"SELECT * FROM {table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {time_col} DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self.db.connect() as conn:
+            df = pd.read_sql_query(sql, conn, params=params)
+        if len(df) <= limit:
+            return df, None
+        df = df.iloc[:limit]
+        last = df.iloc[-1]
+        return df, (last[time_col], int(last['id']))
+
+    def distinct_values(self, table, column, limit=200):
+        """Filter choices for the viewer (read from the column index)."""
+        if column not in LOG_TABLES[table]['filters']:
+            raise ValueError(f"Unknown filter '{column}' for {table}")
+        with self.db.connect() as conn:
+            rows = conn.execute(
+                f"SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL "
+                f"ORDER BY {column} LIMIT ?", (limit,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    # ---------- Retention ----------
+    def archive(self, months=6, now=None, tables=None):
+        """
+        Move rows older than `months` months from each log table into the
+        archive database. Copy and delete run in the same transaction per
+        chunk, so a row is always in exactly one of the two databases.
+        Returns {table: rows_moved}. Log times are UTC, so `now` is too.
+        """
+        now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+        cutoff = (pd.Timestamp(now) - pd.DateOffset(months=months)).strftime('%Y-%m-%d %H:%M:%S')
+        moved = {}
+        with self.db.connect() as conn:
+            conn.execute("ATTACH DATABASE ? AS archive", (self.archive_file,))
+            try:
+                for table in tables or LOG_TABLES:
+                    time_col = LOG_TABLES[table]['time_col']
+                    # Same columns as the live table (no constraints needed in the archive);
+                    # columns added to the live table later are added to the archive too
+                    live = conn.execute(f"PRAGMA main.table_info({table})").fetchall()
+                    conn.execute(f"CREATE TABLE IF NOT EXISTS archive.{table} "
+                                 f"({', '.join(f'{c[1]} {c[2]}' for c in live)})")
+                    archived = {c[1] for c in conn.execute(f"PRAGMA archive.table_info({table})")}
+                    for c in live:
+                        if c[1] not in archived:
+                            conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN {c[1]} {c[2]}")
+                    columns = ', '.join(c[1] for c in live)
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS archive.idx_{table}_{time_col} "
+                                 f"ON {table} ({time_col})")
+                    conn.commit()
+                    moved[table] = 0
+                    while True:
+                        ids = [row[0] for row in conn.execute(
+                            f"SELECT id FROM main.{table} WHERE {time_col} < ? ORDER BY id LIMIT ?",
+                            (cutoff, ARCHIVE_CHUNK))]
+                        if not ids:
+                            break
+                        lo, hi = ids[0], ids[-1]
+                        conn.execute(f"""
+                            INSERT INTO archive.{table} ({columns}) SELECT {columns} FROM main.{table}
+                            WHERE id BETWEEN ? AND ? AND {time_col} < ?
+                        """, (lo, hi, cutoff))
+                        cur = conn.execute(f"""
+                            DELETE FROM main.{table}
+                            WHERE id BETWEEN ? AND ? AND {time_col} < ?
+                        """, (lo, hi, cutoff))
+                        conn.commit()
+                        moved[table] += cur.rowcount
+            finally:
+                conn.execute("DETACH DATABASE archive")
+        return moved
+
+    def archive_counts(self):
+        """Row counts per log table in the live and archive databases."""
+        counts = {}
+        with self.db.connect() as conn:
+            for table in LOG_TABLES:
+                counts[table] = {'live': conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0],
+                                 'archived': 0}
+        if os.path.exists(self.archive_file):
+            with self.db.connect() as conn:
+                conn.execute("ATTACH DATABASE ? AS archive", (self.archive_file,))
+                for table in LOG_TABLES:
+                    exists = conn.execute(
+                        "SELECT 1 FROM archive.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+                    ).fetchone()
+                    if exists:
+                        counts[table]['archived'] = conn.execute(
+                            f"SELECT COUNT(*) FROM archive.{table}").fetchone()[0]
+                conn.execute("DETACH DATABASE archive")
+        return counts
@@ -0,0 +1,231 @@
+# modules/batch_ingest.py
+import io
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from modules.upload_handlers import (
+    UploadHandler, read_upload, parse_headcount, parse_roster, parse_cms, parse_login_logout
+)
+from modules.upload_ledger import UploadLedger
+
+# Write order: agents must exist before rosters, rosters before activity data.
+SOURCE_ORDER = ('headcount', 'roster', 'cms', 'aspect', 'eim')
+SOURCE_TYPES = {'cms': 'CMS', 'aspect': 'Aspect', 'eim': 'EIM'}
+DATE_COLUMNS = {'roster': 'shift_date', 'cms': 'report_date', 'aspect': 'event_date', 'eim': 'event_date'}
+
+
+def _classify_columns(name, columns):
+    columns = [str(c).strip() for c in columns]
+    lower = [c.lower() for c in columns]
+    if 'Citrix UID' in columns and 'ACD ID' in columns:
+        return 'headcount'
+    if 'Name' in columns and 'Citrix UID' in columns and len(columns) > 2:
+        return 'roster'
+    if 'login id' in lower and 'ans calls' in lower:
+        return 'cms'
+    if 'agent name' in lower and 'date' in lower:
+        return 'eim' if 'eim' in name.lower() else 'aspect'
+    return None
+
+
+def classify_upload(name, data):
+    """
+    Source type of an uploaded file from its header rows:
+    headcount, roster, cms, aspect, eim, or None when unknown.
+    """
+    if not (name.endswith('.csv') or name.endswith('.txt')):
+        df = pd.read_excel(io.BytesIO(data), nrows=0)
+        kind = _classify_columns(name, df.columns)
+        if kind is None:
+            # CMS exports start with a title row before the header
+            kind = _classify_columns(name, pd.read_excel(io.BytesIO(data), skiprows=1, nrows=0).columns)
+        return kind
+
+    lines = data[:65536].decode('utf-8', errors='ignore').splitlines()
+    for line in lines[:20]:
+        sep = '\t' if '\t' in line else ','
+        kind = _classify_columns(name, line.split(sep))
+        if kind:
+            return kind
+    return None
+
+
+def _parse_file(kind, name, data, roster_mapping=None):
+    """Runs in a worker process: classify (if needed) and parse one file."""
+    try:
+        kind = kind or classify_upload(name, data)
+        if kind is None:
+            return kind, {"success": False, "error": "Could not detect the file type."}
+        if kind == 'headcount':
+            return kind, parse_headcount(name, data)
+        if kind == 'roster':
+            return kind, parse_roster(name, data, roster_mapping)
+        if kind == 'cms':
+            return kind, parse_cms(name, data)
+        return kind, parse_login_logout(name, data)
+    except Exception as e:
+        return kind, {"success": False, "error": str(e)}
+
+
+class BatchIngestor:
+    """
+    Ingest many uploaded files in one go.
+
+    Each file is classified (headcount / roster / cms / aspect / eim) and
+    parsed in a process pool; parsed frames then go through a single
+    UploadHandler writer in SOURCE_ORDER, so only one connection ever
+    writes to SQLite. Writing a type starts as soon as every file of that
+    type (and every file whose type was still unknown) has been parsed.
+    Activity files that are already in the upload ledger are rejected
+    before they are parsed.
+    """
+
+    def __init__(self, db, normalizer, audit, max_workers=None):
+        self.db = db
+        self.handler = UploadHandler(db, normalizer, audit)
+        self.ledger = UploadLedger(db)
+        self.max_workers = max_workers if max_workers is not None else min(4, os.cpu_count() or 1)
+
+    def _year_month(self, kind, parsed, year_month):
+        """Explicit year_month, or the month of the earliest date in the parsed rows."""
+        if year_month or kind == 'headcount':
+            return year_month, None
+        dates = pd.to_datetime(parsed['df'][DATE_COLUMNS[kind]], errors='coerce').dropna()
+        if dates.empty:
+            return None, "No valid dates to infer the month from."
+        first = dates.min()
+        if first.year != self.db.year:
+            return None, f"File dates are in {first.year}, database is {self.db.year}."
+        warning = None
+        if dates.max().strftime('%Y_%m') != first.strftime('%Y_%m'):
+            warning = f"File spans several months; all rows stored in {first:%Y_%m}."
+        return first.strftime('%Y_%m'), warning
+
+    def _write(self, kind, parsed, file, content_hash, year_month):
+        year_month, warning = self._year_month(kind, parsed, year_month)
+        if kind != 'headcount':
+            if year_month is None:
+                return {"success": False, "error": warning}
+
+        if kind == 'headcount':
+            result = self.handler.write_headcount(parsed)
+        elif kind == 'roster':
+            result = self.handler.write_roster(parsed, file.name, year_month)
+        else:
+            # Re-checked here so identical files within the same batch are caught
+            duplicate = self.ledger.find_duplicate(content_hash, SOURCE_TYPES[kind])
+            if duplicate:
+                return {"success": False,
+                        "error": f"Identical file already uploaded as batch {duplicate['batch_id']}",
+                        "duplicate_of": duplicate['batch_id']}
+            if kind == 'cms':
+                result = self.handler.write_cms(parsed, file, year_month, content_hash)
+            else:
+                result = self.handler.write_login_logout(parsed, file, year_month, f"{kind}_raw",
+                                                         content_hash)
+                if result.get('success'):
+                    from modules.intraday import IntradayTracker
+                    IntradayTracker(self.db).fold_batch(year_month, f"{kind}_raw", result['upload_batch'])
+
+        if year_month:
+            result['year_month'] = year_month
+        if warning:
+            result['warnings'] = (result.get('warnings') or []) + [warning]
+        return result
+
+    def ingest(self, files, year_month=None, roster_mapping=None, progress=None):
+        """
+        Process a list of uploaded files. year_month=None infers the month of
+        each dated file. Returns {"success", "files": [per-file result]}; each
+        file result carries file_name and source_type.
+        """
+        results = {}
+        pending = []  # (index, kind, file, data, content_hash)
+        for i, file in enumerate(files):
+            data = read_upload(file)
+            content_hash = self.ledger.hash_file(file)
+            try:
+                kind = classify_upload(file.name, data) if file.name.endswith(('.csv', '.txt')) else None
+            except Exception:
+                kind = None
+            if kind in SOURCE_TYPES:
+                duplicate = self.ledger.find_duplicate(content_hash, SOURCE_TYPES[kind])
+                if duplicate:
+                    results[i] = {"success": False, "source_type": kind,
+                                  "error": f"Identical file already uploaded as batch {duplicate['batch_id']}",
+                                  "duplicate_of": duplicate['batch_id']}
+                    continue
+            pending.append((i, kind, file, data, content_hash))
+
+        done = [len(results)]
+
+        def report():
+            done[0] += 1
+            if progress:
+                progress(done[0], len(files))
+
+        if self.max_workers > 1 and len(pending) > 1:
+            # spawn: the app process runs threads (Streamlit, job queue) that fork would copy
+            executor = ProcessPoolExecutor(max_workers=min(self.max_workers, len(pending)),
+                                           mp_context=multiprocessing.get_context('spawn'))
+            futures = {executor.submit(_parse_file, kind, file.name, data, roster_mapping): i
+                       for i, kind, file, data, _ in pending}
+        else:
+            executor, futures = None, {}
+
+        try:
+            by_index = {p[0]: p for p in pending}
+            parsed_by_kind = {kind: [] for kind in SOURCE_ORDER}
+            unresolved = {p[0] for p in pending}
+
+            def collect(i, kind, parsed):
+                unresolved.discard(i)
+                if kind is None or not parsed.get('success'):
+                    results[i] = dict(parsed, source_type=kind)
+                    report()
+                else:
+                    parsed_by_kind[kind].append((i, parsed))
+
+            if executor is None:
+                for i, kind, file, data, _ in pending:
+                    collect(i, *_parse_file(kind, file.name, data, roster_mapping))
+
+            for kind in SOURCE_ORDER:
+                # Wait for this type and for files whose type is only known after parsing
+                waiting = [f for f, i in futures.items()
+                           if i in unresolved and by_index[i][1] in (kind, None)]
+                for future in as_completed(waiting):
+                    collect(futures[future], *future.result())
+
+                for i, parsed in sorted(parsed_by_kind[kind], key=lambda item: item[0]):
+                    _, _, file, _, content_hash = by_index[i]
+                    try:
+                        result = self._write(kind, parsed, file, content_hash, year_month)
+                    except Exception as e:
+                        result = {"success": False, "error": str(e)}
+                    result['source_type'] = kind
+                    results[i] = result
+                    report()
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+
+        file_results = []
+        for i, file in enumerate(files):
+            result = results.get(i, {"success": False, "error": "Not processed"})
+            file_results.append(dict(result, file_name=file.name))
+
+        # Interval curves once per month that received Aspect/EIM sessions
+        session_months = {r.get('year_month') for r in file_results
+                          if r['success'] and r.get('source_type') in ('aspect', 'eim')} - {None}
+        if session_months:
+            from modules.interval_engine import IntervalEngine
+            for ym in sorted(session_months):
+                IntervalEngine(self.db).compute_month(ym)
+        return {
+            "success": all(r['success'] for r in file_results),
+            "files": file_results
+        }
@@ -0,0 +1,93 @@
+# modules/dashboard.py
+import os
+import sqlite3
+from datetime import date, timedelta
+
+from database.db_manager import DatabaseManager
+
+
+class DashboardMetrics:
+    """
+    Landing-page metrics read from the daily_kpi table.
+
+    Today, yesterday and the same weekday last week are primary-key lookups;
+    dates that fall in another year are read from that year's database.
+    """
+
+    def __init__(self, db: DatabaseManager):
+        self.db = db
+
+    def _load(self, days):
+        by_year = {}
+        for d in days:
+            by_year.setdefault(d.year, []).append(d)
+
+        rows = {}
+        for year, year_days in by_year.items():
+            db = self.db if year == self.db.year else DatabaseManager(year=year, db_path=self.db.db_path)
+            if not os.path.exists(db.db_file):
+                continue
+            placeholders = ','.join('?' for _ in year_days)
+            try:
+                with db.connect() as conn:
+                    cur = conn.execute(
+                        f"SELECT * FROM daily_kpi WHERE kpi_date IN ({placeholders})", year_days
+                    )
+                    for row in cur.fetchall():
+                        rows[row['kpi_date']] = dict(row)
+            except sqlite3.OperationalError:
+                # Older yearly database without the daily_kpi table
+                continue
+        return rows
+
+    def get_snapshot(self, today=None):
+        """Return {'today', 'yesterday', 'last_week'} KPI rows (None when missing)."""
+        today = today or date.today()
+        days = {
+            'today': today,
+            'yesterday': today - timedelta(days=1),
+            'last_week': today - timedelta(days=7),
+        }
+        rows = self._load(list(days.values()))
+        return {key: rows.get(d.isoformat()) for key, d in days.items()}
+
+    def get_cards(self, today=None):
+        """Build the four dashboard cards with deltas vs yesterday and last week."""
+        snap = self.get_snapshot(today)
+        cur = snap['today'] or {}
+
+        def value(row, field):
+            if not row or row.get(field) is None:
+                return None
+            return row[field]
+
+        def delta(field, ref, pct=False):
+            a, b = value(cur, field), value(ref, field)
+            if a is None or b is None:
+                return None
+            diff = a - b
+            return f"{diff:+.1f}%" if pct else f"{diff:+,}"
+
+        cards = []
+        for label, field, pct, delta_color in (
+            ("Total Agents", 'total_agents', False, 'normal'),
+            ("Present Today", 'present', False, 'normal'),
+            ("Absent Today", 'absent', False, 'inverse'),
+            ("Adherence", 'adherence_pct', True, 'normal'),
+        ):
+            val = value(cur, field)
+            if val is None:
+                display = "—"
+            elif pct:
+                display = f"{val:.1f}%"
+            else:
+                display = f"{val:,}"
+            week = delta(field, snap['last_week'], pct)
+            cards.append({
+                'label': label,
+                'value': display,
+                'delta': delta(field, snap['yesterday'], pct),
+                'delta_color': delta_color,
+                'help': f"vs yesterday; vs same weekday last week: {week}" if week else "vs yesterday",
+            })
+        return cards
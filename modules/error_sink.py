@@ -0,0 +1,97 @@
+# modules/error_sink.py
+import json
+from collections import Counter
+
+import pandas as pd
+
+# Buffered rows before an automatic flush
+FLUSH_EVERY = 1000
+
+
+def _json_value(value):
+    """numpy scalars as Python values, NaT as null, dates / timestamps as text."""
+    if pd.isna(value):
+        return None
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+class ErrorSink:
+    """
+    Buffered row-level error writer for one upload.
+
+    Handlers call add() for every bad row; rows are kept in memory and
+    written to `error_log` with executemany, FLUSH_EVERY rows at a time,
+    so a file with thousands of bad rows costs a few statements instead
+    of one transaction per row. When a connection is passed, flushes run
+    on it and commit together with the uploaded data.
+    """
+
+    def __init__(self, db, source_file, source_type, upload_batch=None, conn=None,
+                 flush_every=FLUSH_EVERY):
+        self.db = db
+        self.source_file = source_file
+        self.source_type = source_type
+        self.upload_batch = upload_batch
+        self.conn = conn
+        self.flush_every = flush_every
+        self.counts = Counter()
+        self._buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        return False
+
+    def add(self, error_type, raw_data=None, agent_name=None, login_id=None,
+            acd_id=None, shift_date=None, payload=None):
+        """payload: JSON-serializable data needed to load the row later (see IdentityResolver.confirm)."""
+        self._buffer.append((
+            error_type, self.source_file, self.source_type,
+            None if raw_data is None else str(raw_data)[:500],
+            agent_name, login_id, acd_id, shift_date, self.upload_batch,
+            None if payload is None else json.dumps(payload, default=_json_value)
+        ))
+        self.counts[error_type] += 1
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """Write buffered rows; commits only when the sink owns the connection."""
+        if not self._buffer:
+            return 0
+        rows, self._buffer = self._buffer, []
+        sql = """
+            INSERT INTO error_log
+            (error_type, source_file, source_type, raw_data, agent_name,
+             login_id, acd_id, shift_date, upload_batch, payload)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """
+        if self.conn is not None:
+            self.conn.executemany(sql, rows)
+        else:
+            with self.db.connect() as conn:
+                conn.executemany(sql, rows)
+                conn.commit()
+        return len(rows)
+
+    def summary(self):
+        """{error_type: count} of everything added to this sink."""
+        return dict(self.counts)
+
+    @staticmethod
+    def batch_summary(db, upload_batch):
+        """Stored error counts per type for one upload batch."""
+        with db.connect() as conn:
+            return pd.read_sql_query("""
+                SELECT error_type, COUNT(*) AS error_count,
+                       COUNT(DISTINCT login_id) AS logins
+                FROM error_log
+                WHERE upload_batch = ?
+                GROUP BY error_type
+                ORDER BY error_count DESC
+            """, conn, params=(upload_batch,))
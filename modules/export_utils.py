@@ -0,0 +1,62 @@
+# modules/export_utils.py
+import io
+
+import pandas as pd
+
+from database.cross_year import CrossYearQuery
+from modules.frames import BASE_SHIFTS, load_frame, shift_vocabulary
+
+# Export type -> (monthly table families, query over the CrossYearQuery views)
+EXPORTS = {
+    'Roster': (['roster_live'], """
+        SELECT r.shift_date, r.citrix_uid, a.name AS agent_name, a.team_leader, a.supervisor,
+               r.scheduled_shift, r.normalized_shift, r.shift_source
+        FROM roster_live r
+        LEFT JOIN agents_master a ON a.citrix_uid = r.citrix_uid
+        ORDER BY r.shift_date, r.citrix_uid
+    """),
+    'Attendance': (['attendance_processed'], """
+        SELECT ap.shift_date, ap.citrix_uid, a.name AS agent_name, a.team_leader, a.supervisor,
+               ap.original_shift, ap.updated_shift, ap.final_shift, ap.attendance_status,
+               ap.absenteeism_reason, ap.staff_time_sec, ap.data_source
+        FROM attendance_processed ap
+        LEFT JOIN agents_master a ON a.citrix_uid = ap.citrix_uid
+        ORDER BY ap.shift_date, ap.citrix_uid
+    """),
+    'Absenteeism': (['attendance_processed'], """
+        SELECT ap.shift_date, ap.citrix_uid, a.name AS agent_name, a.team_leader, a.supervisor,
+               ap.updated_shift, ap.attendance_status, ap.absenteeism_reason, ap.staff_time_sec
+        FROM attendance_processed ap
+        LEFT JOIN agents_master a ON a.citrix_uid = ap.citrix_uid
+        WHERE ap.attendance_status LIKE 'Absent%'
+        ORDER BY ap.shift_date, ap.citrix_uid
+    """),
+}
+
+
+def export_frame(db, export_type, start_date, end_date):
+    """Typed rows of `export_type` between start_date and end_date (may span years)."""
+    tables, sql = EXPORTS[export_type]
+    with CrossYearQuery(db.db_path).connect(start_date, end_date, tables=tables) as conn:
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if 'agents_master' not in tables:
+            # No yearly database in range
+            return pd.DataFrame()
+        shifts = shift_vocabulary(conn) if 'shift_dictionary' in tables else BASE_SHIFTS
+        return load_frame(conn, sql, shifts=shifts)
+
+
+def to_excel_bytes(df, sheet_name='Export'):
+    """xlsx bytes of df; date32 / categorical columns are written as plain values."""
+    df = df.copy()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+        elif isinstance(df[col].dtype, pd.ArrowDtype):
+            df[col] = pd.to_datetime(df[col].astype(str), errors='coerce').dt.date
+        elif pd.api.types.is_datetime64_dtype(df[col].dtype):
+            df[col] = df[col].dt.date
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False, sheet_name=sheet_name)
+    return output.getvalue()
@@ -0,0 +1,85 @@
+# modules/frames.py
+"""
+Typed DataFrame loading for roster / attendance / CMS rows.
+
+read_sql_query returns object columns of Python strings and dates; month
+frames repeat the same shift codes, statuses and team names 100k+ times.
+load_frame() converts known columns after reading:
+
+- statuses and shifts: categoricals on a fixed vocabulary (unknown values
+  are appended, never dropped), so codes are stable across frames
+- other repeated labels (team_leader, queue, ...): plain categoricals
+- seconds and counts: int32
+- dates: date32 (pyarrow) when pyarrow is installed, else datetime64[s]
+
+Shared by AttendanceEngine, the Reports queries and modules/export_utils.
+"""
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional: date32 columns fall back to datetime64[s]
+    pa = None
+
+# Values AttendanceEngine writes, then the ones used by imported / manual rows
+ATTENDANCE_STATUSES = (
+    'Full Shift', 'Half Day', 'Overtime', 'Partial', 'Absent', 'Scheduled Off', 'Unknown',
+    'Present', 'Present - Modified', 'Absent - Unjustified', 'Leave', 'Leave - Approved',
+)
+BASE_SHIFTS = ('OFF', 'UNKNOWN')
+
+STATUS_COLUMNS = ('attendance_status', 'adherence_status')
+SHIFT_COLUMNS = ('scheduled_shift', 'normalized_shift', 'original_shift', 'updated_shift', 'final_shift')
+LABEL_COLUMNS = (
+    'name', 'agent_name', 'team_leader', 'supervisor', 'manager', 'queue', 'segment', 'premises',
+    'language', 'hc_status', 'status', 'data_source', 'absenteeism_reason', 'shift_source',
+    'staff_time_validation', 'logout_reason',
+)
+INT_COLUMNS = (
+    'staff_time_sec', 'staffed_time_sec', 'handle_time_sec', 'avail_time_sec', 'talk_time_sec',
+    'hold_time_sec', 'acw_time_sec', 'session_duration_sec', 'ans_calls', 'confidence_score',
+    'days_worked', 'present_days', 'absent_days', 'leave_days',
+)
+DATE_COLUMNS = ('shift_date', 'report_date', 'event_date', 'kpi_date')
+
+DATE_DTYPE = pd.ArrowDtype(pa.date32()) if pa is not None else 'datetime64[s]'
+
+
+def vocabulary_dtype(values, vocabulary):
+    """CategoricalDtype of `vocabulary` followed by any other values present, sorted."""
+    known = set(vocabulary)
+    extra = sorted({v for v in pd.unique(values) if isinstance(v, str) and v not in known})
+    return pd.CategoricalDtype(list(vocabulary) + extra)
+
+
+def shift_vocabulary(conn):
+    """Normalized shifts of the active shift_dictionary entries, after OFF / UNKNOWN."""
+    rows = conn.execute("""
+        SELECT DISTINCT normalized_shift FROM shift_dictionary
+        WHERE is_active = 1 AND normalized_shift IS NOT NULL
+        ORDER BY normalized_shift
+    """).fetchall()
+    return BASE_SHIFTS + tuple(r[0] for r in rows if r[0] not in BASE_SHIFTS)
+
+
+def apply_types(df, shifts=BASE_SHIFTS):
+    """Convert the known columns of df in place (see module docstring); returns df."""
+    for col in df.columns:
+        if col in STATUS_COLUMNS:
+            df[col] = df[col].astype(vocabulary_dtype(df[col], ATTENDANCE_STATUSES))
+        elif col in SHIFT_COLUMNS:
+            df[col] = df[col].astype(vocabulary_dtype(df[col], shifts))
+        elif col in LABEL_COLUMNS:
+            df[col] = df[col].astype('category')
+        elif col in INT_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype('int32')
+        elif col in DATE_COLUMNS:
+            df[col] = pd.to_datetime(df[col], errors='coerce').astype('datetime64[s]')
+            if pa is not None:
+                df[col] = df[col].astype(DATE_DTYPE)
+    return df
+
+
+def load_frame(conn, sql, params=(), shifts=BASE_SHIFTS):
+    """pd.read_sql_query followed by apply_types."""
+    return apply_types(pd.read_sql_query(sql, conn, params=params), shifts)
@@ -0,0 +1,400 @@
+# modules/identity.py
+"""
+Agent identity resolution by name for roster / CMS / Aspect / EIM rows that
+no ID column matched.
+
+Two normalizations of a name:
+
+- name_key(): casefolded, accents and Arabic diacritics removed, Arabic
+  letter variants unified, punctuation and extra spaces dropped, tokens
+  sorted. Names with the same key are the same spelling ("SAYED  Ahmed" =
+  "ahmed sayed"), so a key owned by exactly one agent resolves directly.
+- skeleton(): name_key() transliterated to Latin and folded (doubled
+  letters, o/u and e/i vowels, el-/al- article, abdel/abdul), so
+  "محمد السيد", "Mohamed El Sayed" and "Muhammad Elsayed" end up close.
+  Its padded character trigrams feed a precomputed inverted index;
+  candidates are ranked by the Dice coefficient of their trigram sets.
+
+A candidate confirmed by a user is stored in agent_aliases and from then
+on resolves like an exact name. Confirming also loads the rows logged under
+that name: handlers keep each unknown row in error_log.payload, so they are
+inserted directly instead of re-uploading a file the ledger would reject as
+a duplicate (CMS / Aspect / EIM) or load twice (roster). NameIndex is built once per process and
+rebuilt when agents_master or agent_aliases change.
+"""
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from database.statements import sql
+from modules.intraday import IntradayTracker
+from modules.maintenance import note_bulk_load
+from modules.upload_ledger import UploadLedger
+
+# Minimum Dice score of a suggested candidate
+MIN_SCORE = float(os.getenv('WFM_NAME_MATCH_MIN_SCORE', '0.5'))
+# Candidates returned per unknown name
+MAX_CANDIDATES = int(os.getenv('WFM_NAME_MATCH_CANDIDATES', '5'))
+
+# error_log types whose agent_name an alias can resolve
+UNKNOWN_ERROR_TYPES = ('UNKNOWN_AGENT', 'UNKNOWN_LOGIN')
+# Positions of citrix_uid / acd_id in the logged payload row of each family
+PAYLOAD_ID_COLUMNS = {'roster': (0, 1), 'cms_raw': (3, 4), 'aspect_raw': (2, 3), 'eim_raw': (2, 3)}
+
+# حروف عربية متعددة الأشكال -> شكل واحد
+_ARABIC_UNIFY = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+    'ـ': None,  # tatweel
+})
+_ARABIC_TO_LATIN = str.maketrans({
+    'ا': 'a', 'ب': 'b', 'ت': 't', 'ث': 'th', 'ج': 'g', 'ح': 'h', 'خ': 'kh',
+    'د': 'd', 'ذ': 'z', 'ر': 'r', 'ز': 'z', 'س': 's', 'ش': 'sh', 'ص': 's',
+    'ض': 'd', 'ط': 't', 'ظ': 'z', 'ع': 'a', 'غ': 'gh', 'ف': 'f', 'ق': 'k',
+    'ك': 'k', 'ل': 'l', 'م': 'm', 'ن': 'n', 'ه': 'h', 'و': 'w', 'ي': 'y',
+    'ء': None,
+})
+_VOWELS = re.compile(r'[aiuwy]')
+_DOUBLED = re.compile(r'(\w)\1+')
+# Applied in order to a transliterated, lower-case token string
+_FOLDS = (
+    (re.compile(r'\b(?:el|al|il)\s+(?=\w)'), 'al'),   # "el sayed" -> "alsayed"
+    (re.compile(r'\b(?:el|il)(?=\w{3})'), 'al'),       # "elsayed" -> "alsayed"
+    (re.compile(r'\babd(?:el|ul|al|ol)?\s*(?:al)?'), 'abdal'),   # also "عبد الرحمن"
+    (re.compile(r'ph'), 'f'),
+    (re.compile(r'(?:ck|c|q)'), 'k'),
+    (re.compile(r'j'), 'g'),
+    (re.compile(r'dh'), 'z'),
+    (re.compile(r'(?:ou|oo|o|w(?![aeiou]))'), 'u'),
+    (re.compile(r'(?:ee|ei|ey|e|y(?![aeiou]))'), 'i'),
+    (re.compile(r'h\b'), ''),                           # "fatmah" / "فاطمه"
+    (_DOUBLED, r'\1'),                                  # "mohammed" -> "mohamed"
+)
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def _clean(name):
+    """NFKC, casefold, no accents / Arabic diacritics, unified Arabic letters."""
+    text = unicodedata.normalize('NFKD', str(name)).casefold()
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = unicodedata.normalize('NFKC', text).translate(_ARABIC_UNIFY)
+    return _NON_WORD.sub(' ', text).strip()
+
+
+def name_key(name):
+    """Exact-match key of a name: case, spacing, accents and token order ignored."""
+    if name is None or (isinstance(name, float) and math.isnan(name)):
+        return ''
+    return ' '.join(sorted(_clean(name).split()))
+
+
+def skeleton(name):
+    """Latin, vowel-folded form of a name used for trigram matching."""
+    text = ' '.join(_clean(name).translate(_ARABIC_TO_LATIN).split())
+    for pattern, repl in _FOLDS:
+        text = pattern.sub(repl, text)
+    return ' '.join(sorted(text.split()))
+
+
+def name_grams(name):
+    """
+    Trigrams of skeleton(name) plus, upper-cased, those of its consonants
+    only: Arabic spelling omits short vowels ("محمد" -> "mhmd"), so Latin
+    and Arabic spellings mostly meet on the consonant trigrams.
+    """
+    text = skeleton(name)
+    consonants = _DOUBLED.sub(r'\1', _VOWELS.sub('', text))
+    return trigrams(text) | {g.upper() for g in trigrams(consonants)}
+
+
+def trigrams(text):
+    """Padded character trigrams of every token: 'ali' -> {' al', 'ali', 'li '}."""
+    grams = set()
+    for token in text.split():
+        padded = f" {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NameIndex:
+    """
+    In-memory index over agents_master names and agent_aliases.
+    `keys` maps name_key -> citrix_uids, `grams` maps trigram -> int32 array
+    of entry ids (one entry per name or alias).
+    """
+
+    def __init__(self, agents, aliases=()):
+        """agents: (citrix_uid, acd_id, name) rows; aliases: (alias, citrix_uid) rows."""
+        self.agents = {}
+        self.keys = defaultdict(set)
+        self.alias_keys = {}
+        self.entry_uids = []
+        self.grams = defaultdict(list)
+        self._sizes = []
+        for citrix_uid, acd_id, name in agents:
+            self.agents[citrix_uid] = {'citrix_uid': citrix_uid, 'acd_id': acd_id, 'name': name}
+            if name:
+                self._add(citrix_uid, name)
+        for alias, citrix_uid in aliases:
+            if citrix_uid in self.agents:
+                self.alias_keys[name_key(alias)] = citrix_uid
+                self._add(citrix_uid, alias)
+        self.grams = {gram: np.array(ids, dtype=np.int32) for gram, ids in self.grams.items()}
+        self.entry_sizes = np.array(self._sizes, dtype=np.float64)
+
+    def _add(self, citrix_uid, name):
+        key = name_key(name)
+        if not key:
+            return
+        self.keys[key].add(citrix_uid)
+        grams = name_grams(name)
+        entry_id = len(self.entry_uids)
+        self.entry_uids.append(citrix_uid)
+        for gram in grams:
+            self.grams[gram].append(entry_id)
+        self._sizes.append(len(grams))
+
+    def __len__(self):
+        return len(self.agents)
+
+    def lookup(self, name):
+        """
+        {citrix_uid, acd_id, name} of the agent `name` denotes without
+        guessing: a confirmed alias, or a name_key owned by one agent only.
+        """
+        key = name_key(name)
+        if not key:
+            return None
+        citrix_uid = self.alias_keys.get(key)
+        if citrix_uid is None:
+            owners = self.keys.get(key)
+            if not owners or len(owners) > 1:
+                return None
+            citrix_uid = next(iter(owners))
+        return self.agents[citrix_uid]
+
+    def candidates(self, name, limit=MAX_CANDIDATES, min_score=MIN_SCORE):
+        """Agents ranked by trigram similarity to `name`, best first."""
+        query = name_grams(name) if name_key(name) else set()
+        postings = [self.grams[g] for g in query if g in self.grams]
+        if not postings:
+            return []
+        # Shared trigrams of every entry in one pass over the posting arrays
+        shared = np.bincount(np.concatenate(postings), minlength=len(self.entry_sizes))
+        scores = 2 * shared / (len(query) + self.entry_sizes)
+        hits = np.flatnonzero(scores >= min_score)
+        # Several entries (name + aliases) may belong to one agent
+        hits = hits[np.argsort(-scores[hits], kind='stable')]
+        ranked = {}
+        for entry_id in hits:
+            citrix_uid = self.entry_uids[entry_id]
+            if citrix_uid not in ranked:
+                ranked[citrix_uid] = float(scores[entry_id])
+                if len(ranked) == limit:
+                    break
+        return [dict(self.agents[uid], score=round(score, 3)) for uid, score in ranked.items()]
+
+    def resolve_many(self, names, limit=MAX_CANDIDATES, min_score=MIN_SCORE):
+        """
+        Distinct name -> {"match": lookup() or None, "candidates": [...]}
+        for all unknown names of a file at once.
+        """
+        resolved = {}
+        for name in dict.fromkeys(n for n in names if name_key(n)):
+            match = self.lookup(name)
+            resolved[name] = {
+                "match": match,
+                "candidates": [] if match else self.candidates(name, limit, min_score),
+            }
+        return resolved
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+class IdentityResolver:
+    """Name index of one database plus the agent_aliases it learns from confirmations."""
+
+    def __init__(self, db):
+        self.db = db
+
+    @staticmethod
+    def _signature(conn):
+        agents = conn.execute("SELECT COUNT(*), MAX(updated_at), MAX(created_at) FROM agents_master").fetchone()
+        aliases = conn.execute("SELECT COUNT(*), MAX(confirmed_at) FROM agent_aliases").fetchone()
+        return tuple(agents) + tuple(aliases)
+
+    def index(self, conn=None):
+        """Process-wide NameIndex, rebuilt when agents_master / agent_aliases changed."""
+        if conn is None:
+            with self.db.connect() as conn:
+                return self.index(conn)
+        signature = self._signature(conn)
+        with _indexes_lock:
+            cached = _indexes.get(self.db.db_file)
+            if cached and cached[0] == signature:
+                return cached[1]
+        index = NameIndex(
+            conn.execute("SELECT citrix_uid, acd_id, name FROM agents_master").fetchall(),
+            conn.execute("SELECT alias, citrix_uid FROM agent_aliases").fetchall(),
+        )
+        with _indexes_lock:
+            _indexes[self.db.db_file] = (signature, index)
+        return index
+
+    def invalidate(self):
+        with _indexes_lock:
+            _indexes.pop(self.db.db_file, None)
+
+    def resolve_many(self, names, limit=MAX_CANDIDATES):
+        return self.index().resolve_many(names, limit)
+
+    def confirm(self, alias, citrix_uid, confirmed_by=None, source='manual'):
+        """
+        Store `alias` as a name of `citrix_uid` and load the rows logged under
+        that name (same name_key) as that agent. Only loaded errors are marked
+        resolved; errors logged without a payload (before it was stored, or
+        of a rolled back batch) stay open.
+        """
+        key = name_key(alias)
+        if not key:
+            return {"success": False, "error": "Empty alias"}
+        with self.db.connect() as conn:
+            agent = conn.execute("SELECT name, acd_id FROM agents_master WHERE citrix_uid = ?",
+                                 (citrix_uid,)).fetchone()
+            if not agent:
+                return {"success": False, "error": f"Unknown agent {citrix_uid}"}
+            previous = conn.execute("SELECT citrix_uid FROM agent_aliases WHERE alias_key = ?", (key,)).fetchone()
+            conn.execute("""
+                INSERT INTO agent_aliases (alias_key, alias, citrix_uid, source, confirmed_by, confirmed_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(alias_key) DO UPDATE SET
+                    alias = excluded.alias,
+                    citrix_uid = excluded.citrix_uid,
+                    source = excluded.source,
+                    confirmed_by = excluded.confirmed_by,
+                    confirmed_at = excluded.confirmed_at
+            """, (key, str(alias).strip(), citrix_uid, source, confirmed_by))
+            loaded = self._load_logged_rows(conn, key, citrix_uid, agent, confirmed_by)
+            conn.commit()
+        for table, rows in loaded['tables'].items():
+            note_bulk_load(self.db, table, rows)
+        self.invalidate()
+        return {"success": True, "alias_key": key, "citrix_uid": citrix_uid,
+                "replaced": previous['citrix_uid'] if previous and previous['citrix_uid'] != citrix_uid else None,
+                "errors_resolved": loaded['resolved'],
+                "errors_left": loaded['left']}
+
+    @staticmethod
+    def _logged_names(conn, key):
+        """Unresolved unknown-agent names in error_log whose name_key is key."""
+        placeholders = ', '.join('?' * len(UNKNOWN_ERROR_TYPES))
+        rows = conn.execute(f"""
+            SELECT DISTINCT agent_name FROM error_log
+            WHERE resolved = 0 AND error_type IN ({placeholders}) AND agent_name IS NOT NULL
+        """, UNKNOWN_ERROR_TYPES).fetchall()
+        return [r[0] for r in rows if name_key(r[0]) == key]
+
+    def _load_logged_rows(self, conn, key, citrix_uid, agent, confirmed_by):
+        """
+        Insert the payload rows logged under key as citrix_uid, on the caller's
+        connection: ledger counts of their batches and the intraday snapshot
+        of Aspect/EIM batches already folded are refreshed in the same
+        transaction.
+        """
+        names = self._logged_names(conn, key)
+        result = {"tables": {}, "resolved": 0, "left": 0}
+        if not names:
+            return result
+        types = ', '.join('?' * len(UNKNOWN_ERROR_TYPES))
+        in_names = ', '.join('?' * len(names))
+        logged = conn.execute(f"""
+            SELECT e.id, e.payload, e.upload_batch, l.status
+            FROM error_log e
+            LEFT JOIN upload_ledger l ON l.batch_id = e.upload_batch
+            WHERE e.resolved = 0 AND e.error_type IN ({types}) AND e.agent_name IN ({in_names})
+        """, (*UNKNOWN_ERROR_TYPES, *names)).fetchall()
+
+        grouped = defaultdict(list)     # (family, year_month) -> rows
+        loaded_ids, batches = [], set()
+        for entry in logged:
+            if entry['payload'] is None or entry['status'] == 'RolledBack':
+                result['left'] += 1
+                continue
+            payload = json.loads(entry['payload'])
+            row = payload['row']
+            uid_pos, acd_pos = PAYLOAD_ID_COLUMNS[payload['family']]
+            row[uid_pos] = citrix_uid
+            row[acd_pos] = row[acd_pos] or agent['acd_id']
+            grouped[(payload['family'], payload['year_month'])].append(row)
+            loaded_ids.append(entry['id'])
+            if entry['upload_batch']:
+                batches.add((payload['family'], payload['year_month'], entry['upload_batch']))
+
+        for (family, year_month), rows in grouped.items():
+            if family == 'roster':
+                conn.executemany(sql('roster_original.insert', year_month), rows)
+                # roster_live has no source_file column
+                conn.executemany(sql('roster_live.insert', year_month), [r[:5] for r in rows])
+                for table in ('roster_original', 'roster_live'):
+                    result['tables'][f"{table}_{year_month}"] = len(rows)
+            else:
+                conn.executemany(sql(f'{family}.insert', year_month), rows)
+                result['tables'][f"{family}_{year_month}"] = len(rows)
+
+        ledger, tracker = UploadLedger(self.db), IntradayTracker(self.db)
+        for family, year_month, batch_id in batches:
+            ledger.refresh_counts(conn, batch_id)
+            if family in ('aspect_raw', 'eim_raw'):
+                for (snapshot_date,) in conn.execute(
+                        "SELECT snapshot_date FROM intraday_batches WHERE upload_batch = ?", (batch_id,)).fetchall():
+                    tracker.refold_agents(conn, year_month, snapshot_date, [citrix_uid])
+
+        conn.executemany("""
+            UPDATE error_log
+            SET resolved = 1, resolved_by = ?, resolved_at = CURRENT_TIMESTAMP, notes = ?
+            WHERE id = ?
+        """, [(confirmed_by, f"Loaded as {citrix_uid} ({agent['name']})", error_id) for error_id in loaded_ids])
+        result['resolved'] = len(loaded_ids)
+        return result
+
+    def remove_alias(self, alias_key):
+        with self.db.connect() as conn:
+            deleted = conn.execute("DELETE FROM agent_aliases WHERE alias_key = ?", (alias_key,)).rowcount
+            conn.commit()
+        self.invalidate()
+        return {"success": bool(deleted)}
+
+    def get_aliases(self):
+        with self.db.connect() as conn:
+            return pd.read_sql_query("""
+                SELECT al.alias, al.citrix_uid, a.name, al.source, al.confirmed_by, al.confirmed_at, al.alias_key
+                FROM agent_aliases al
+                LEFT JOIN agents_master a ON a.citrix_uid = al.citrix_uid
+                ORDER BY al.confirmed_at DESC
+            """, conn)
+
+    def unresolved_names(self, limit=500):
+        """Unresolved unknown-agent names in error_log, most frequent first."""
+        placeholders = ', '.join('?' * len(UNKNOWN_ERROR_TYPES))
+        with self.db.connect() as conn:
+            return pd.read_sql_query(f"""
+                SELECT agent_name, COUNT(*) AS rows,
+                       SUM(payload IS NOT NULL) AS loadable,
+                       GROUP_CONCAT(DISTINCT source_type) AS sources,
+                       MAX(created_at) AS last_seen
+                FROM error_log
+                WHERE resolved = 0 AND error_type IN ({placeholders})
+                  AND agent_name IS NOT NULL AND TRIM(agent_name) != ''
+                GROUP BY agent_name
+                ORDER BY rows DESC
+                LIMIT ?
+            """, conn, params=(*UNKNOWN_ERROR_TYPES, limit))
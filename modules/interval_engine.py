@@ -0,0 +1,231 @@
+# modules/interval_engine.py
+import argparse
+import calendar
+import os
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from database.db_manager import DatabaseManager
+from database.migrate_facts import monthly_tables
+from modules.session_merge import SessionMerger, merge_intervals
+
+# Scheduled shift length used to turn a start time into a shift window
+# (same 9h assumption as AttendanceEngine).
+SHIFT_MINUTES = 9 * 60
+MINUTES_PER_DAY = 24 * 60
+
+
+class IntervalEngine:
+    """
+    Scheduled vs. logged-in headcount per 15/30-minute interval and LOB.
+
+    Shifts (roster_live) and sessions (aspect_raw/eim_raw) are laid on a
+    per-minute timeline for the whole month using difference arrays: +1 at
+    each start minute, -1 at each end minute, then a cumulative sum gives
+    the headcount for every minute. Averaging the minutes of an interval
+    gives the (fractional) headcount for that interval. Shifts and sessions
+    of the previous month's last day (from the previous year's database in
+    January) are loaded too, so overnight shifts cover the first hours of
+    day 1; shifts that cross midnight on the last day of the month spill into
+    a one-day overflow that is dropped.
+
+    Curves are recomputed after every Aspect/EIM upload, or with
+        python -m modules.interval_engine --year-month 2026_01 --db-path ./data
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    # ---------- Helpers ----------
+    def _lob_map(self, conn):
+        """queue name -> lob_name from the active lob_groups rows."""
+        lob_map = {}
+        cur = conn.execute("SELECT lob_name, queue_names FROM lob_groups WHERE is_active = 1")
+        for row in cur:
+            for queue in str(row['queue_names'] or '').replace(';', ',').split(','):
+                if queue.strip():
+                    lob_map[queue.strip()] = row['lob_name']
+        return lob_map
+
+    def _load_agents(self, conn):
+        agents = pd.read_sql_query("SELECT citrix_uid, queue FROM agents_master", conn)
+        lob_map = self._lob_map(conn)
+        agents['lob_name'] = agents['queue'].map(lob_map).fillna(agents['queue']).fillna('Unassigned')
+        return agents.set_index('citrix_uid')['lob_name']
+
+    @staticmethod
+    def _load_roster(conn, year_month, shift_date=None):
+        sql = f"""
+            SELECT citrix_uid, shift_date, normalized_shift
+            FROM roster_live_{year_month}
+            WHERE normalized_shift GLOB '[0-9][0-9]:[0-9][0-9]'
+        """
+        if shift_date is None:
+            return pd.read_sql_query(sql, conn)
+        return pd.read_sql_query(sql + " AND shift_date = ?", conn, params=(shift_date.isoformat(),))
+
+    def _load_previous_day(self, year, month):
+        """(roster, sessions) of the day before the month, empty when its tables do not exist."""
+        last = date(year, month, 1) - timedelta(days=1)
+        year_month = f"{last.year}_{last.month:02d}"
+        db = self.db if last.year == self.db.year else DatabaseManager(year=last.year, db_path=self.db.db_path)
+        roster, sessions = None, None
+        if os.path.exists(db.db_file):
+            with db.connect() as conn:
+                families = monthly_tables(conn).get(year_month, [])
+                if 'roster_live' in families:
+                    roster = self._load_roster(conn, year_month, last)
+                if 'aspect_raw' in families and 'eim_raw' in families:
+                    sessions = SessionMerger(db).load_sessions(conn, year_month, last)
+        return roster, sessions
+
+    def _load_sessions(self, conn, year_month, previous=None):
+        """Aspect + EIM sessions (plus `previous` rows) with overlaps merged per agent."""
+        sessions = SessionMerger(self.db).load_sessions(conn, year_month)
+        if previous is not None and len(previous):
+            sessions = pd.concat([previous, sessions], ignore_index=True)
+        timed, _ = SessionMerger.split_timed(sessions)
+        return merge_intervals(timed)
+
+    @staticmethod
+    def _coverage(lob_codes, starts, ends, n_lobs, n_minutes):
+        """Per-minute headcount matrix (n_lobs x n_minutes) from [start, end) minute windows."""
+        starts = np.clip(starts, 0, n_minutes)
+        ends = np.clip(ends, 0, n_minutes)
+        keep = ends > starts
+        lob_codes, starts, ends = lob_codes[keep], starts[keep], ends[keep]
+        width = n_minutes + 1
+        size = n_lobs * width
+        diff = (np.bincount(lob_codes * width + starts, minlength=size)
+                - np.bincount(lob_codes * width + ends, minlength=size))
+        return np.cumsum(diff.reshape(n_lobs, width), axis=1)[:, :n_minutes]
+
+    # ---------- Computation ----------
+    def compute_month(self, year_month, interval_minutes=15, store=True):
+        """Compute interval curves for every day of year_month and (optionally) store them."""
+        if MINUTES_PER_DAY % interval_minutes:
+            raise ValueError("interval_minutes must divide a day evenly")
+        year, month = int(year_month[:4]), int(year_month[5:7])
+        n_days = calendar.monthrange(year, month)[1]
+        month_start = pd.Timestamp(year, month, 1)
+        n_minutes = (n_days + 1) * MINUTES_PER_DAY
+
+        previous_roster, previous_sessions = self._load_previous_day(year, month)
+        with self.db.connect() as conn:
+            agent_lob = self._load_agents(conn)
+            roster = self._load_roster(conn, year_month)
+            sessions = self._load_sessions(conn, year_month, previous_sessions)
+        if previous_roster is not None and len(previous_roster):
+            # shift_day -1: the part after midnight lands on day 1, the rest is clipped
+            roster = pd.concat([previous_roster, roster], ignore_index=True)
+
+        lobs = pd.Index(sorted(set(agent_lob.unique()) | {'Unassigned'}))
+        n_lobs = len(lobs)
+
+        def lob_codes(citrix):
+            codes = lobs.get_indexer(citrix.map(agent_lob).fillna('Unassigned'))
+            return codes.astype(np.int64)
+
+        # Scheduled: start minute from shift_date + normalized "HH:MM"
+        shift_day = (pd.to_datetime(roster['shift_date']) - month_start).dt.days.to_numpy()
+        hhmm = roster['normalized_shift'].str.split(':', expand=True)
+        if len(roster):
+            start_min = (shift_day * MINUTES_PER_DAY
+                         + hhmm[0].astype(int).to_numpy() * 60
+                         + hhmm[1].astype(int).to_numpy())
+        else:
+            start_min = np.zeros(0, dtype=np.int64)
+        scheduled = self._coverage(lob_codes(roster['citrix_uid']), start_min.astype(np.int64),
+                                   (start_min + SHIFT_MINUTES).astype(np.int64), n_lobs, n_minutes)
+
+        # Logged in: session minutes relative to the month start
+        login = pd.to_datetime(sessions['login_time'], errors='coerce')
+        logout = pd.to_datetime(sessions['logout_time'], errors='coerce')
+        valid = login.notna() & logout.notna()
+        login_min = ((login[valid] - month_start).dt.total_seconds() / 60).round().to_numpy(np.int64)
+        logout_min = ((logout[valid] - month_start).dt.total_seconds() / 60).round().to_numpy(np.int64)
+        logged_in = self._coverage(lob_codes(sessions.loc[valid, 'citrix_uid']),
+                                   login_min, logout_min, n_lobs, n_minutes)
+
+        # Average minutes into intervals, dropping the overflow day
+        ipd = MINUTES_PER_DAY // interval_minutes
+        month_minutes = n_days * MINUTES_PER_DAY
+        shape = (n_lobs, n_days, ipd, interval_minutes)
+        sched_iv = scheduled[:, :month_minutes].reshape(shape).mean(axis=3)
+        login_iv = logged_in[:, :month_minutes].reshape(shape).mean(axis=3)
+
+        lob_idx, day_idx, iv_idx = np.meshgrid(
+            np.arange(n_lobs), np.arange(n_days), np.arange(ipd), indexing='ij')
+        starts = [f"{(i * interval_minutes) // 60:02d}:{(i * interval_minutes) % 60:02d}"
+                  for i in range(ipd)]
+        result = pd.DataFrame({
+            'interval_date': [date(year, month, d + 1).isoformat() for d in day_idx.ravel()],
+            'lob_name': lobs[lob_idx.ravel()],
+            'interval_minutes': interval_minutes,
+            'interval_index': iv_idx.ravel(),
+            'interval_start': np.array(starts)[iv_idx.ravel()],
+            'scheduled': sched_iv.ravel().round(2),
+            'logged_in': login_iv.ravel().round(2),
+        })
+        # Empty intervals are not stored; readers treat missing rows as zero
+        result = result[(result['scheduled'] > 0) | (result['logged_in'] > 0)].reset_index(drop=True)
+
+        if store:
+            self._store(result, year, month, n_days, interval_minutes)
+        return result
+
+    def _store(self, result, year, month, n_days, interval_minutes):
+        with self.db.connect() as conn:
+            conn.execute("""
+                DELETE FROM interval_staffing
+                WHERE interval_date BETWEEN ? AND ? AND interval_minutes = ?
+            """, (date(year, month, 1), date(year, month, n_days), interval_minutes))
+            conn.executemany("""
+                INSERT INTO interval_staffing
+                (interval_date, lob_name, interval_minutes, interval_index,
+                 interval_start, scheduled, logged_in)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, result.itertuples(index=False, name=None))
+            conn.commit()
+
+    def get_curve(self, curve_date, lob_name=None, interval_minutes=15):
+        """Stored curve for one date (optionally one LOB), with empty intervals filled as 0."""
+        sql = """
+            SELECT lob_name, interval_index, interval_start, scheduled, logged_in
+            FROM interval_staffing
+            WHERE interval_date = ? AND interval_minutes = ?
+        """
+        params = [curve_date, interval_minutes]
+        if lob_name:
+            sql += " AND lob_name = ?"
+            params.append(lob_name)
+        with self.db.connect() as conn:
+            df = pd.read_sql_query(sql, conn, params=params)
+        if df.empty:
+            return df
+        ipd = MINUTES_PER_DAY // interval_minutes
+        full = pd.MultiIndex.from_product([df['lob_name'].unique(), range(ipd)],
+                                          names=['lob_name', 'interval_index'])
+        df = df.set_index(['lob_name', 'interval_index']).reindex(full).reset_index()
+        df['interval_start'] = [f"{(i * interval_minutes) // 60:02d}:{(i * interval_minutes) % 60:02d}"
+                                for i in df['interval_index']]
+        df[['scheduled', 'logged_in']] = df[['scheduled', 'logged_in']].fillna(0)
+        return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute the interval staffing curves of a month.")
+    parser.add_argument('--year-month', required=True, help="YYYY_MM")
+    parser.add_argument('--db-path', default='./data')
+    parser.add_argument('--interval', type=int, default=15, help="Interval minutes (15 or 30)")
+    args = parser.parse_args(argv)
+
+    db = DatabaseManager(year=int(args.year_month[:4]), db_path=args.db_path)
+    result = IntervalEngine(db).compute_month(args.year_month, interval_minutes=args.interval)
+    print(f"{args.year_month}: {len(result)} intervals over {result['lob_name'].nunique()} LOBs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+# modules/intraday.py
+from datetime import date, datetime
+
+import pandas as pd
+
+from modules.session_merge import SessionMerger, merge_intervals
+
+# Minutes after the scheduled start before a login counts as late.
+LATE_GRACE_MIN = 5
+
+
+class IntradayTracker:
+    """
+    Rolling "logged in now vs scheduled" view for the current day.
+
+    Each Aspect/EIM upload batch is folded once into `intraday_sessions`
+    (per-agent totals), and only the agents present in that batch are
+    recomputed, so the cost of a new file is proportional to its agents'
+    sessions of the day. A recomputation merges the agent's Aspect and EIM
+    sessions with merge_intervals, so sources and day-so-far exports that
+    repeat the same sessions are not counted twice.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.merger = SessionMerger(db)
+
+    def fold_batch(self, year_month, table_prefix, upload_batch, snapshot_date=None):
+        """Fold the rows of one upload batch for snapshot_date into the running totals."""
+        if table_prefix not in ('aspect_raw', 'eim_raw'):
+            return {"success": False, "error": f"Unsupported source table '{table_prefix}'"}
+        snapshot_date = snapshot_date or date.today()
+        source = f"{table_prefix}_{year_month}"
+
+        with self.db.connect() as conn:
+            seen = conn.execute(
+                "SELECT 1 FROM intraday_batches WHERE upload_batch = ?", (upload_batch,)
+            ).fetchone()
+            if seen:
+                return {"success": True, "rows_folded": 0, "agents_updated": 0, "skipped": True}
+
+            rows_folded = conn.execute(
+                f"SELECT COUNT(*) FROM {source} WHERE upload_batch = ? AND event_date = ?",
+                (upload_batch, snapshot_date)
+            ).fetchone()[0]
+            agents = [r[0] for r in conn.execute(f"""
+                SELECT DISTINCT citrix_uid FROM {source}
+                WHERE upload_batch = ? AND event_date = ? AND citrix_uid IS NOT NULL
+            """, (upload_batch, snapshot_date))]
+            agents_updated = self.refold_agents(conn, year_month, snapshot_date, agents)
+
+            conn.execute("""
+                INSERT INTO intraday_batches (upload_batch, snapshot_date, source_table, rows_folded)
+                VALUES (?, ?, ?, ?)
+            """, (upload_batch, snapshot_date, source, rows_folded))
+            conn.commit()
+
+        return {"success": True, "rows_folded": rows_folded, "agents_updated": agents_updated}
+
+    def refold_agents(self, conn, year_month, snapshot_date, agents):
+        """
+        Recompute intraday_sessions / intraday_adherence of `agents` for
+        snapshot_date from all their stored Aspect and EIM rows. Agents left
+        without sessions (after a rollback) lose their rows. Runs on the
+        caller's connection without committing; returns the agents with sessions.
+        """
+        if not agents:
+            return 0
+        conn.execute("DROP TABLE IF EXISTS _intraday_agents")
+        conn.execute("CREATE TEMP TABLE _intraday_agents (citrix_uid TEXT PRIMARY KEY)")
+        conn.executemany("INSERT OR IGNORE INTO _intraday_agents (citrix_uid) VALUES (?)",
+                         [(uid,) for uid in agents])
+        sessions = self.merger.load_sessions(conn, year_month, snapshot_date, agents_table='_intraday_agents')
+        rows = self._session_totals(sessions, snapshot_date)
+
+        in_batch = "citrix_uid IN (SELECT citrix_uid FROM _intraday_agents)"
+        conn.execute(f"DELETE FROM intraday_sessions WHERE snapshot_date = ? AND {in_batch}", (snapshot_date,))
+        conn.execute(f"DELETE FROM intraday_adherence WHERE snapshot_date = ? AND {in_batch}", (snapshot_date,))
+        conn.executemany("""
+            INSERT INTO intraday_sessions
+            (snapshot_date, citrix_uid, first_login, last_login, last_logout,
+             session_count, total_session_sec, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        """, rows)
+        self._refresh_adherence(conn, year_month, snapshot_date, "SELECT citrix_uid FROM _intraday_agents", ())
+        conn.execute("DROP TABLE _intraday_agents")
+        return len(rows)
+
+    def _session_totals(self, sessions, snapshot_date):
+        """intraday_sessions rows: first/last login, last logout, merged blocks and worked seconds per agent."""
+        if sessions.empty:
+            return []
+        timed, untimed = SessionMerger.split_timed(sessions)
+        blocks = merge_intervals(timed).groupby('citrix_uid').size().add(
+            untimed.groupby('citrix_uid').size(), fill_value=0)
+        worked = self.merger.worked_time(sessions)
+        by_agent = sessions.groupby('citrix_uid')
+        first_login = by_agent['login_time'].min()
+        last_login = by_agent['login_time'].max()
+        last_logout = by_agent['logout_time'].max()
+
+        def value(ts):
+            return None if pd.isna(ts) else ts.to_pydatetime()
+
+        return [(snapshot_date, uid, value(first_login[uid]), value(last_login[uid]), value(last_logout[uid]),
+                 int(blocks.get(uid, 0)), int(worked.get(uid, 0)))
+                for uid in by_agent.groups]
+
+    def _refresh_adherence(self, conn, year_month, snapshot_date, agents_sql, agents_params):
+        """Recompute intraday_adherence for the agents selected by agents_sql."""
+        conn.execute(f"""
+            INSERT OR REPLACE INTO intraday_adherence
+            (snapshot_date, citrix_uid, scheduled_shift, scheduled_start, first_login,
+             is_logged_in, late_min, staff_time_sec, adherence_status, updated_at)
+            SELECT snapshot_date, citrix_uid, scheduled_shift, scheduled_start, first_login,
+                   is_logged_in, late_min, total_session_sec,
+                   CASE
+                       WHEN scheduled_shift IS NULL THEN 'Not Rostered'
+                       WHEN scheduled_shift = 'OFF' THEN 'Unscheduled Login'
+                       WHEN scheduled_start IS NULL THEN 'Logged In'
+                       WHEN late_min > ? THEN 'Late'
+                       ELSE 'On Time'
+                   END,
+                   CURRENT_TIMESTAMP
+            FROM (
+                SELECT s.snapshot_date, s.citrix_uid, s.first_login, s.total_session_sec,
+                       COALESCE(r.normalized_shift, r.scheduled_shift) AS scheduled_shift,
+                       CASE WHEN r.normalized_shift GLOB '[0-9][0-9]:[0-9][0-9]'
+                            THEN s.snapshot_date || ' ' || r.normalized_shift || ':00'
+                       END AS scheduled_start,
+                       CASE WHEN s.last_logout IS NULL OR s.last_login > s.last_logout
+                            THEN 1 ELSE 0 END AS is_logged_in,
+                       ROUND((julianday(s.first_login) - julianday(
+                            s.snapshot_date || ' ' || r.normalized_shift || ':00')) * 1440, 1)
+                           AS late_min
+                FROM intraday_sessions s
+                LEFT JOIN roster_live_{year_month} r
+                       ON r.citrix_uid = s.citrix_uid AND r.shift_date = s.snapshot_date
+                WHERE s.snapshot_date = ?
+                  AND s.citrix_uid IN ({agents_sql})
+            )
+        """, (LATE_GRACE_MIN, snapshot_date, *agents_params))
+
+    def get_snapshot(self, snapshot_date=None, now=None):
+        """
+        Live adherence for the whole roster of snapshot_date.
+        Scheduled agents with no folded sessions show as 'Not Logged In'
+        once their start time has passed, otherwise 'Not Started'.
+        """
+        snapshot_date = snapshot_date or date.today()
+        now = now or datetime.now()
+        year_month = f"{snapshot_date.year}_{snapshot_date.month:02d}"
+        with self.db.connect() as conn:
+            df = pd.read_sql_query(f"""
+                SELECT r.citrix_uid, a.name, a.queue, a.team_leader,
+                       COALESCE(r.normalized_shift, r.scheduled_shift) AS scheduled_shift,
+                       i.first_login, i.is_logged_in, i.late_min, i.staff_time_sec,
+                       CASE
+                           WHEN i.citrix_uid IS NOT NULL THEN i.adherence_status
+                           WHEN r.normalized_shift = 'OFF' THEN 'Scheduled Off'
+                           WHEN r.normalized_shift GLOB '[0-9][0-9]:[0-9][0-9]'
+                                AND r.shift_date || ' ' || r.normalized_shift || ':00' > ?
+                               THEN 'Not Started'
+                           ELSE 'Not Logged In'
+                       END AS adherence_status
+                FROM roster_live_{year_month} r
+                LEFT JOIN agents_master a ON a.citrix_uid = r.citrix_uid
+                LEFT JOIN intraday_adherence i
+                       ON i.citrix_uid = r.citrix_uid AND i.snapshot_date = r.shift_date
+                WHERE r.shift_date = ?
+                UNION ALL
+                SELECT i.citrix_uid, a.name, a.queue, a.team_leader, i.scheduled_shift,
+                       i.first_login, i.is_logged_in, i.late_min, i.staff_time_sec,
+                       i.adherence_status
+                FROM intraday_adherence i
+                LEFT JOIN agents_master a ON a.citrix_uid = i.citrix_uid
+                WHERE i.snapshot_date = ? AND i.adherence_status = 'Not Rostered'
+            """, conn, params=(now.strftime('%Y-%m-%d %H:%M:%S'), snapshot_date, snapshot_date))
+        return df
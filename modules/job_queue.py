@@ -0,0 +1,216 @@
+# modules/job_queue.py
+import io
+import json
+import os
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+# Idle workers re-check the queue this often even without a wake-up
+POLL_INTERVAL_SEC = 5.0
+
+JOB_TYPES = ('headcount', 'roster', 'cms', 'aspect', 'eim')
+
+
+class SpooledUpload(io.BytesIO):
+    """In-memory file with the `name`/`size` attributes the handlers expect."""
+
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+
+class JobQueue:
+    """
+    Local upload job queue.
+
+    Uploaded files are spooled to `{db_path}/jobs/` and a row is added to the
+    `upload_jobs` table; worker threads claim queued rows one at a time, run
+    the matching UploadHandler method with a progress callback, and store the
+    result dict as JSON. Progress of running jobs is kept in memory: handlers
+    report it from inside their write transaction, where an UPDATE on another
+    connection would wait for their own lock. It is stored with the result. Jobs survive browser reloads, and jobs left Running
+    by a restarted process are queued again on start-up.
+    """
+
+    def __init__(self, db, workers=1):
+        self.db = db
+        self.workers = workers
+        self.spool_dir = os.path.join(db.db_path, 'jobs')
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        # job_id -> (rows_done, rows_total) of running jobs
+        self._progress = {}
+        self._progress_lock = threading.Lock()
+
+    # ---------- Lifecycle ----------
+    def start(self):
+        if self._threads:
+            return self
+        with self.db.connect() as conn:
+            conn.execute("""
+                UPDATE upload_jobs SET status = 'Queued', started_at = NULL
+                WHERE status = 'Running'
+            """)
+            conn.commit()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"upload-job-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    # ---------- Producer side ----------
+    def submit(self, job_type, file, params=None, submitted_by=None):
+        """Spool `file` to disk and queue a job; returns the job_id."""
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"Unknown job type '{job_type}'")
+        file.seek(0)
+        data = file.read()
+        file.seek(0)
+        with self.db.connect() as conn:
+            cur = conn.execute("""
+                INSERT INTO upload_jobs (job_type, file_name, params, status, submitted_by, submitted_at)
+                VALUES (?, ?, ?, 'Queued', ?, ?)
+            """, (job_type, file.name, json.dumps(params or {}), submitted_by, datetime.now()))
+            job_id = cur.lastrowid
+            path = os.path.join(self.spool_dir, f"{job_id}_{os.path.basename(file.name)}")
+            with open(path, 'wb') as fh:
+                fh.write(data)
+            conn.execute("UPDATE upload_jobs SET file_path = ? WHERE job_id = ?", (path, job_id))
+            conn.commit()
+        self._wake.set()
+        return job_id
+
+    def get_jobs(self, submitted_by=None, limit=50):
+        sql = """
+            SELECT job_id, job_type, file_name, status, rows_done, rows_total,
+                   submitted_by, submitted_at, started_at, finished_at, error, result
+            FROM upload_jobs
+        """
+        params = []
+        if submitted_by:
+            sql += " WHERE submitted_by = ?"
+            params.append(submitted_by)
+        sql += " ORDER BY job_id DESC LIMIT ?"
+        params.append(limit)
+        with self.db.connect() as conn:
+            df = pd.read_sql_query(sql, conn, params=params)
+        with self._progress_lock:
+            progress = dict(self._progress)
+        for job_id, (done, total) in progress.items():
+            running = df['job_id'] == job_id
+            df.loc[running, 'rows_done'] = done
+            df.loc[running, 'rows_total'] = total
+        return df
+
+    def get_result(self, job_id):
+        with self.db.connect() as conn:
+            row = conn.execute("SELECT result FROM upload_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row['result']) if row and row['result'] else None
+
+    # ---------- Worker side ----------
+    def _claim(self):
+        """Atomically move the oldest queued job to Running."""
+        with self.db.connect() as conn:
+            row = conn.execute("""
+                UPDATE upload_jobs SET status = 'Running', started_at = ?
+                WHERE job_id = (SELECT job_id FROM upload_jobs
+                                WHERE status = 'Queued' ORDER BY job_id LIMIT 1)
+                RETURNING job_id, job_type, file_name, file_path, params, submitted_by
+            """, (datetime.now(),)).fetchone()
+            conn.commit()
+        return dict(row) if row else None
+
+    def _worker(self):
+        while not self._stop.is_set():
+            job = self._claim()
+            if job is None:
+                self._wake.wait(POLL_INTERVAL_SEC)
+                self._wake.clear()
+                continue
+            self._run(job)
+
+    def _progress_writer(self, job_id):
+        """Progress callback for a job; memory only, no database access."""
+        def report(done, total):
+            with self._progress_lock:
+                self._progress[job_id] = (int(done), int(total))
+        return report
+
+    def _build_handler(self, submitted_by=None):
+        from modules.upload_handlers import UploadHandler
+        from modules.normalization import ShiftNormalizer
+        from modules.audit import AuditLogger
+        audit = AuditLogger(self.db, user={'citrix_uid': submitted_by} if submitted_by else None)
+        return UploadHandler(self.db, ShiftNormalizer(self.db), audit)
+
+    def _run(self, job):
+        job_id = job['job_id']
+        params = json.loads(job['params'] or '{}')
+        progress = self._progress_writer(job_id)
+        try:
+            with open(job['file_path'], 'rb') as fh:
+                file = SpooledUpload(fh.read(), job['file_name'])
+            handler = self._build_handler(job.get('submitted_by'))
+            job_type = job['job_type']
+            if job_type == 'headcount':
+                result = handler.process_headcount(file, progress=progress)
+            elif job_type == 'roster':
+                result = handler.process_roster(file, params['mapping'], params['year_month'],
+                                                progress=progress)
+            elif job_type == 'cms':
+                result = handler.process_cms_productivity(file, params['year_month'], progress=progress)
+            else:
+                method = handler.process_eim if job_type == 'eim' else handler.process_aspect
+                result = method(file, params['year_month'], progress=progress)
+                if result.get('success'):
+                    from modules.intraday import IntradayTracker
+                    from modules.interval_engine import IntervalEngine
+                    IntradayTracker(self.db).fold_batch(
+                        params['year_month'], f"{job_type}_raw", result['upload_batch'])
+                    IntervalEngine(self.db).compute_month(params['year_month'])
+            status = 'Completed' if result.get('success') else 'Failed'
+            error = None if result.get('success') else result.get('error')
+        except Exception as e:
+            result, status, error = None, 'Failed', str(e)
+
+        # The handler has committed (or failed): its last progress is stored with the result
+        with self._progress_lock:
+            done, total = self._progress.pop(job_id, (0, 0))
+        with self.db.connect() as conn:
+            conn.execute("""
+                UPDATE upload_jobs SET status = ?, result = ?, error = ?, finished_at = ?,
+                    rows_done = ?, rows_total = ?
+                WHERE job_id = ?
+            """, (status, json.dumps(result, default=str) if result is not None else None,
+                  error, datetime.now(), done, total, job_id))
+            conn.commit()
+        try:
+            os.remove(job['file_path'])
+        except OSError:
+            pass
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_job_queue(db, workers=1):
+    """Process-wide JobQueue per database file, started on first use."""
+    with _queues_lock:
+        queue = _queues.get(db.db_file)
+        if queue is None:
+            queue = JobQueue(db, workers=workers).start()
+            _queues[db.db_file] = queue
+        return queue
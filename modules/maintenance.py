@@ -0,0 +1,329 @@
+# modules/maintenance.py
+"""
+SQLite housekeeping for wfm_storage_{year}.db.
+
+- after bulk loads: uploads and the engine call note_bulk_load(); the
+  scheduler ANALYZEs those tables once writes have been quiet for a while,
+  so new month tables get statistics before their first report
+- every tick: PASSIVE WAL checkpoint (never waits for readers)
+- once per day inside the off-hours window: PRAGMA optimize, TRUNCATE
+  checkpoint, incremental vacuum when enough pages are free (a database
+  created before auto_vacuum = INCREMENTAL gets one full VACUUM instead) and
+  optionally the audit / error log retention of AuditTrail.archive
+
+Every run is recorded in maintenance_log. The same tasks can be run from
+cron:
+
+    python -m modules.maintenance --year 2026 --db-path ./data --task nightly
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, time as dtime
+
+from modules import metrics
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv('WFM_MAINTENANCE', '1') == '1'
+# Seconds between two scheduler ticks
+INTERVAL_SEC = float(os.getenv('WFM_MAINT_INTERVAL_SEC', '300'))
+# Off-hours window (local time, may wrap midnight) for optimize / vacuum
+WINDOW = os.getenv('WFM_MAINT_WINDOW', '01:00-05:00')
+# Loaded tables are analyzed once no load was noted for this long
+ANALYZE_QUIET_SEC = float(os.getenv('WFM_MAINT_ANALYZE_QUIET_SEC', '60'))
+# Rows examined per index by ANALYZE / optimize (0 = all)
+ANALYSIS_LIMIT = int(os.getenv('WFM_MAINT_ANALYSIS_LIMIT', '1000'))
+# Incremental vacuum only when at least this many pages and this share of the file are free
+VACUUM_MIN_PAGES = int(os.getenv('WFM_MAINT_VACUUM_MIN_PAGES', '1000'))
+VACUUM_MIN_RATIO = float(os.getenv('WFM_MAINT_VACUUM_MIN_RATIO', '0.1'))
+# Months of audit_log / error_log kept in the live database (0 = no archiving)
+AUDIT_RETENTION_MONTHS = int(os.getenv('WFM_AUDIT_RETENTION_MONTHS', '0'))
+
+MAINTENANCE_RUNS = metrics.Counter('wfm_maintenance_runs_total', "Maintenance tasks run.", ('task', 'result'))
+MAINTENANCE_SECONDS = metrics.Histogram('wfm_maintenance_duration_seconds', "Duration of one maintenance task.",
+                                        ('task',))
+
+
+def parse_window(window):
+    """'01:00-05:00' -> (time(1, 0), time(5, 0))."""
+    start, end = window.split('-')
+    return (datetime.strptime(start.strip(), '%H:%M').time(),
+            datetime.strptime(end.strip(), '%H:%M').time())
+
+
+def in_window(now, window=WINDOW):
+    start, end = parse_window(window)
+    current = dtime(now.hour, now.minute)
+    if start <= end:
+        return start <= current < end
+    return current >= start or current < end
+
+
+# ---------- Tasks (each returns a detail dict) ----------
+def analyze(conn, tables=None):
+    """ANALYZE the given tables (all of them when None) with the analysis limit."""
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if tables is None:
+        conn.execute("ANALYZE")
+        done = sorted(existing)
+    else:
+        done = [t for t in sorted(set(tables)) if t in existing]
+        for table in done:
+            conn.execute(f'ANALYZE main."{table}"')
+    conn.commit()
+    return {"tables": len(done)}
+
+
+def optimize(conn):
+    """PRAGMA optimize: re-analyzes only the tables whose statistics are stale."""
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    conn.execute("PRAGMA optimize")
+    conn.commit()
+    return {}
+
+
+def checkpoint(conn, mode='PASSIVE'):
+    """WAL checkpoint; TRUNCATE also resets the -wal file to zero bytes."""
+    if mode not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+        raise ValueError(f"Unknown checkpoint mode '{mode}'")
+    busy, log_frames, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+    return {"mode": mode, "busy": busy, "wal_frames": log_frames, "checkpointed": checkpointed}
+
+
+def vacuum(conn, force=False):
+    """
+    Return free pages to the file system. Incremental when auto_vacuum is
+    INCREMENTAL, otherwise a full VACUUM that also switches the file to it.
+    Skipped while fewer than VACUUM_MIN_PAGES / VACUUM_MIN_RATIO pages are free.
+    """
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    detail = {"page_count": page_count, "free_pages": free}
+    if mode != 2:
+        # Converting needs one full VACUUM (rewrites the whole file)
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        detail["full_vacuum"] = True
+    elif force or (free >= VACUUM_MIN_PAGES and free >= page_count * VACUUM_MIN_RATIO):
+        # Frees one page per step; execute() only steps once, executescript runs it to the end
+        conn.executescript("PRAGMA incremental_vacuum;")
+    else:
+        detail["skipped"] = True
+        return detail
+    detail["pages_after"] = conn.execute("PRAGMA page_count").fetchone()[0]
+    return detail
+
+
+def size_report(db):
+    """
+    Database file, WAL and per-table sizes. Table and index bytes come from the
+    dbstat virtual table when SQLite has it, otherwise only row counts are listed.
+    """
+    wal_file = db.db_file + '-wal'
+    with db.connect() as conn:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        tables = []
+        try:
+            rows = conn.execute("""
+                SELECT m.tbl_name AS table_name,
+                       SUM(CASE WHEN m.type = 'table' THEN s.pgsize ELSE 0 END) AS table_bytes,
+                       SUM(CASE WHEN m.type = 'index' THEN s.pgsize ELSE 0 END) AS index_bytes
+                FROM dbstat s JOIN sqlite_master m ON m.name = s.name
+                GROUP BY m.tbl_name ORDER BY table_bytes + index_bytes DESC
+            """).fetchall()
+            tables = [dict(r) for r in rows]
+        except Exception:
+            names = [r[0] for r in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+            tables = [{"table_name": n, "rows": conn.execute(f'SELECT COUNT(*) FROM "{n}"').fetchone()[0]}
+                      for n in names]
+    return {
+        "file_bytes": os.path.getsize(db.db_file) if os.path.exists(db.db_file) else 0,
+        "wal_bytes": os.path.getsize(wal_file) if os.path.exists(wal_file) else 0,
+        "page_size": page_size,
+        "page_count": page_count,
+        "free_pages": free,
+        "free_bytes": free * page_size,
+        "auto_vacuum": {0: 'NONE', 1: 'FULL', 2: 'INCREMENTAL'}.get(auto_vacuum, auto_vacuum),
+        "tables": tables,
+    }
+
+
+class Maintenance:
+    """
+    Runs the tasks above for one database, from the scheduler thread or on
+    demand (Diagnostics page, CLI). One task at a time per database.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._lock = threading.Lock()
+        self._dirty = {}
+        self._dirty_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---------- Bulk load notes ----------
+    def note_bulk_load(self, table, rows=0):
+        """Mark `table` for ANALYZE once loads have been quiet for ANALYZE_QUIET_SEC."""
+        if rows:
+            with self._dirty_lock:
+                self._dirty[table] = time.monotonic()
+
+    def _quiet_tables(self):
+        cutoff = time.monotonic() - ANALYZE_QUIET_SEC
+        with self._dirty_lock:
+            ready = [t for t, at in self._dirty.items() if at <= cutoff]
+            for table in ready:
+                del self._dirty[table]
+        return ready
+
+    # ---------- Running tasks ----------
+    def run(self, task, **kwargs):
+        """Run one task ('analyze', 'optimize', 'checkpoint', 'vacuum', 'archive'), logged in maintenance_log."""
+        started_at = datetime.now()
+        started = time.perf_counter()
+        detail, error = None, None
+        with self._lock:
+            try:
+                if task == 'archive':
+                    months = kwargs.get('months', AUDIT_RETENTION_MONTHS)
+                    if months <= 0:
+                        raise ValueError("Log retention is off (WFM_AUDIT_RETENTION_MONTHS)")
+                    # Imported here: audit_trail pulls in pandas, which app start-up does not need
+                    from modules.audit_trail import AuditTrail
+                    detail = AuditTrail(self.db).archive(months=months)
+                else:
+                    func = {'analyze': analyze, 'optimize': optimize,
+                            'checkpoint': checkpoint, 'vacuum': vacuum}[task]
+                    with self.db.connect() as conn:
+                        detail = func(conn, **kwargs)
+            except Exception as e:
+                error = str(e)
+                logger.warning("Maintenance %s failed: %s", task, e)
+        seconds = time.perf_counter() - started
+        MAINTENANCE_RUNS.inc(task=task, result='failed' if error else 'ok')
+        MAINTENANCE_SECONDS.observe(seconds, task=task)
+        try:
+            with self.db.connect() as conn:
+                conn.execute("""
+                    INSERT INTO maintenance_log (task, started_at, duration_ms, detail, error)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (task, started_at, round(seconds * 1000, 1),
+                      json.dumps(detail, default=str) if detail is not None else None, error))
+                conn.commit()
+        except Exception:
+            logger.exception("maintenance_log write failed")
+        return {"success": error is None, "task": task, "seconds": round(seconds, 3),
+                "detail": detail, "error": error}
+
+    def nightly(self):
+        """Off-hours tasks: optimize, truncate the WAL, vacuum and log retention."""
+        results = [self.run('optimize'), self.run('checkpoint', mode='TRUNCATE'), self.run('vacuum')]
+        if AUDIT_RETENTION_MONTHS > 0:
+            results.append(self.run('archive'))
+        return results
+
+    def last_run(self, task):
+        with self.db.connect() as conn:
+            row = conn.execute("SELECT MAX(started_at) FROM maintenance_log WHERE task = ? AND error IS NULL",
+                               (task,)).fetchone()
+        return row[0] if row else None
+
+    def history(self, limit=50):
+        with self.db.connect() as conn:
+            rows = conn.execute("""
+                SELECT task, started_at, duration_ms, detail, error FROM maintenance_log
+                ORDER BY id DESC LIMIT ?
+            """, (limit,)).fetchall()
+        return [dict(r) for r in rows]
+
+    # ---------- Scheduler ----------
+    def tick(self, now=None):
+        """One scheduler pass; returns the results of the tasks it ran."""
+        now = now or datetime.now()
+        results = []
+        tables = self._quiet_tables()
+        if tables:
+            results.append(self.run('analyze', tables=tables))
+        results.append(self.run('checkpoint'))
+        if in_window(now):
+            last = self.last_run('vacuum')
+            if not last or str(last)[:10] < now.strftime('%Y-%m-%d'):
+                results.extend(self.nightly())
+        return results
+
+    def start(self):
+        if self._thread:
+            return self
+
+        def loop():
+            while not self._stop.wait(INTERVAL_SEC):
+                try:
+                    self.tick()
+                except Exception:
+                    logger.exception("Maintenance tick failed")
+
+        self._thread = threading.Thread(target=loop, name="db-maintenance", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_maintenance(db, start=False):
+    """Process-wide Maintenance per database file; start=True also starts its scheduler (WFM_MAINTENANCE)."""
+    with _instances_lock:
+        maintenance = _instances.get(db.db_file)
+        if maintenance is None:
+            maintenance = _instances[db.db_file] = Maintenance(db)
+    if start and ENABLED:
+        maintenance.start()
+    return maintenance
+
+
+def note_bulk_load(db, table, rows=0):
+    """Shortcut for uploads / the engine: get_maintenance(db).note_bulk_load(table, rows)."""
+    get_maintenance(db).note_bulk_load(table, rows)
+
+
+def main(argv=None):
+    from database.db_manager import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Run SQLite maintenance on a yearly database.")
+    parser.add_argument('--year', type=int, required=True)
+    parser.add_argument('--db-path', default='./data')
+    parser.add_argument('--task', default='nightly',
+                        choices=['nightly', 'analyze', 'optimize', 'checkpoint', 'vacuum', 'archive', 'report'])
+    args = parser.parse_args(argv)
+
+    db = DatabaseManager(year=args.year, db_path=args.db_path)
+    db.bootstrap([])
+    maintenance = get_maintenance(db)
+    if args.task == 'report':
+        print(json.dumps(size_report(db), indent=2, default=str))
+        return
+    results = maintenance.nightly() if args.task == 'nightly' else [maintenance.run(args.task)]
+    for result in results:
+        print(json.dumps(result, default=str))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+# modules/metrics.py
+"""
+Process-wide counters and histograms in the Prometheus text format.
+
+Handlers and the engine update the module-level metrics below; the
+exporter publishes them either as a textfile (WFM_METRICS_FILE, for the
+node_exporter textfile collector or a sidecar) or on a small HTTP endpoint
+(WFM_METRICS_PORT, GET /metrics). Both are off unless configured.
+"""
+import functools
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from database import instrumentation
+
+logger = logging.getLogger(__name__)
+
+METRICS_FILE = os.getenv('WFM_METRICS_FILE')
+METRICS_PORT = int(os.getenv('WFM_METRICS_PORT', '0') or 0)
+# Seconds between two textfile writes
+WRITE_INTERVAL_SEC = float(os.getenv('WFM_METRICS_INTERVAL_SEC', '15'))
+
+SECONDS_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+RATE_BUCKETS = (100, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if amount <= 0:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        return [f"{self.name}{_labels(self.label_names, key)} {value}"
+                for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """Value read from `func` at render time."""
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, func):
+        super().__init__(name, help_text)
+        self.func = func
+
+    def _samples(self):
+        try:
+            value = self.func()
+        except Exception:
+            return []
+        return [f"{self.name} {value}"]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=SECONDS_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['counts'][i] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+
+    def _samples(self):
+        lines = []
+        for key, entry in sorted(self._values.items()):
+            for bound, count in zip(self.buckets, entry['counts']):
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [('le', bound)])} {count}")
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [('le', '+Inf')])} {entry['count']}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {round(entry['sum'], 6)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {entry['count']}")
+        return lines
+
+
+REGISTRY = []
+
+# ---------- Ingestion ----------
+ROWS_INGESTED = Counter('wfm_rows_ingested_total', "Rows written by uploads.", ('source',))
+ROWS_REJECTED = Counter('wfm_rows_rejected_total', "Upload rows written to error_log.",
+                        ('source', 'error_type'))
+UNKNOWN_AGENTS = Counter('wfm_unknown_agents_total', "Upload rows whose agent could not be resolved.",
+                         ('source',))
+UPLOADS = Counter('wfm_uploads_total', "Upload files processed.", ('source', 'result'))
+UPLOAD_SECONDS = Histogram('wfm_upload_duration_seconds', "Time to write one upload.", ('source',))
+UPLOAD_ROWS_PER_SEC = Histogram('wfm_upload_rows_per_second', "Write throughput of one upload.",
+                                ('source',), RATE_BUCKETS)
+STAGE_SECONDS = Histogram('wfm_stage_duration_seconds', "Upload and engine stage durations.", ('stage',))
+
+# ---------- Attendance engine ----------
+ATTENDANCE_RUNS = Counter('wfm_attendance_runs_total', "Attendance calculations.", ('mode',))
+ATTENDANCE_ROWS = Counter('wfm_attendance_rows_total', "attendance_processed rows written.", ('mode',))
+ATTENDANCE_SECONDS = Histogram('wfm_attendance_duration_seconds', "Time of one attendance calculation.",
+                               ('mode',))
+
+# ---------- Caches and SQLite ----------
+CACHE_REQUESTS = Counter('wfm_cache_requests_total', "Cache lookups by result (hit / miss).",
+                         ('cache', 'result'))
+LOCK_WAIT_SECONDS = Histogram('wfm_sqlite_lock_wait_seconds', "Time to acquire the SQLite write lock.",
+                              ('operation',))
+LOCK_TIMEOUTS = Counter('wfm_sqlite_lock_timeouts_total', "Statements that failed with database is locked.",
+                        ('operation',))
+
+
+def record_upload(source, result, seconds):
+    """Ingestion metrics of one UploadHandler write_* result."""
+    if not result.get('success'):
+        UPLOADS.inc(source=source, result='failed')
+        return
+    rows = result.get('rows_processed', result.get('new_agents', 0)) or 0
+    UPLOADS.inc(source=source, result='ok')
+    ROWS_INGESTED.inc(rows, source=source)
+    for error_type, count in (result.get('error_summary') or {}).items():
+        ROWS_REJECTED.inc(count, source=source, error_type=error_type)
+        if error_type in ('UNKNOWN_LOGIN', 'UNKNOWN_AGENT'):
+            UNKNOWN_AGENTS.inc(count, source=source)
+    UPLOAD_SECONDS.observe(seconds, source=source)
+    if seconds > 0 and rows:
+        UPLOAD_ROWS_PER_SEC.observe(rows / seconds, source=source)
+
+
+def track_upload(source):
+    """
+    Decorator for UploadHandler.write_* methods: times the call and records its
+    result with record_upload. `source` is a name or a function of the call
+    arguments returning one.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            name = source(*args, **kwargs) if callable(source) else source
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                UPLOADS.inc(source=name, result='failed')
+                raise
+            record_upload(name, result, time.perf_counter() - started)
+            return result
+        return wrapper
+    return decorator
+
+
+def record_attendance(mode, rows, seconds):
+    ATTENDANCE_RUNS.inc(mode=mode)
+    ATTENDANCE_ROWS.inc(rows, mode=mode)
+    ATTENDANCE_SECONDS.observe(seconds, mode=mode)
+
+
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def begin_immediate(conn, operation):
+    """
+    BEGIN IMMEDIATE on conn, timing the wait for the write lock.
+    A busy timeout is counted in wfm_sqlite_lock_timeouts_total and re-raised.
+    """
+    started = time.perf_counter()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+    except Exception as e:
+        if 'locked' in str(e) or 'busy' in str(e):
+            LOCK_TIMEOUTS.inc(operation=operation)
+        raise
+    finally:
+        LOCK_WAIT_SECONDS.observe(time.perf_counter() - started, operation=operation)
+
+
+instrumentation.stage_listeners.append(
+    lambda stage, ms, rows: STAGE_SECONDS.observe(ms / 1000, stage=stage))
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path):
+    """Atomically replace `path` with the current metrics."""
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_exporter_lock = threading.Lock()
+_exporter_started = False
+
+
+def start_exporter(metrics_file=None, port=None):
+    """
+    Start the textfile writer and/or HTTP endpoint once per process.
+    Defaults come from WFM_METRICS_FILE / WFM_METRICS_PORT; returns True when
+    something was started.
+    """
+    global _exporter_started
+    metrics_file = metrics_file or METRICS_FILE
+    port = port or METRICS_PORT
+    with _exporter_lock:
+        if _exporter_started or not (metrics_file or port):
+            return False
+        _exporter_started = True
+
+    if port:
+        try:
+            server = ThreadingHTTPServer(('0.0.0.0', port), _MetricsHandler)
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            logger.info("Metrics endpoint on :%s/metrics", port)
+        except OSError as e:
+            logger.warning("Metrics endpoint not started on port %s: %s", port, e)
+
+    if metrics_file:
+        def write_loop():
+            while True:
+                try:
+                    write_textfile(metrics_file)
+                except OSError as e:
+                    logger.warning("Metrics file %s not written: %s", metrics_file, e)
+                time.sleep(WRITE_INTERVAL_SEC)
+        threading.Thread(target=write_loop, name="metrics-file", daemon=True).start()
+    return True
@@ -1,6 +1,12 @@
 # modules/normalization.py
 import re
+import sqlite3
 from database.db_manager import DatabaseManager
+from database.statements import sql
+from modules.metrics import cache_lookup
+
+# Values the engine / intraday / interval readers understand: a start time or OFF
+NORMALIZED_SHIFT = re.compile(r'^([01]\d|2[0-3]):[0-5]\d$|^OFF$')
 
 class ShiftNormalizer:
     def __init__(self, db: DatabaseManager):
@@ -12,15 +18,22 @@ class ShiftNormalizer:
             cur = conn.execute("SELECT raw_pattern, normalized_shift FROM shift_dictionary WHERE is_active=1")
             self.dict = dict(cur.fetchall())
 
+    @staticmethod
+    def clean(raw_shift):
+        """Form of a raw value that shift_dictionary.raw_pattern is matched against."""
+        cleaned = str(raw_shift).strip().replace('"', '').replace("'", "")
+        cleaned = re.sub(r'[“”]', '', cleaned)
+        return re.sub(r'(\d)[;,.](\d)', r'\1:\2', cleaned)  # 9,00 -> 9:00
+
     def normalize(self, raw_shift):
         if not raw_shift or str(raw_shift).strip().upper() == "OFF":
             return "OFF"
-        cleaned = str(raw_shift).strip().replace('"', '').replace("'", "")
-        cleaned = re.sub(r'[“”]', '', cleaned)
-        cleaned = re.sub(r'(\d)[;,.](\d)', r'\1:\2', cleaned)  # 9,00 -> 9:00
+        cleaned = self.clean(raw_shift)
         # Check dictionary
         if cleaned in self.dict:
+            cache_lookup('shift_dictionary', True)
             return self.dict[cleaned]
+        cache_lookup('shift_dictionary', False)
         # Try parsing time
         try:
             # handle formats like "9:00" or "09:00"
@@ -44,4 +57,39 @@ class ShiftNormalizer:
                 self._load_dictionary()
                 return {"success": True}
             except sqlite3.IntegrityError:
-                return {"success": False, "error": "Pattern already exists"}
\ No newline at end of file
+                return {"success": False, "error": "Pattern already exists"}
+
+    def add_patterns(self, mappings, shift_type="Learned", created_by=None, year_months=()):
+        """
+        Insert or update many raw -> normalized mappings in one transaction and
+        reload the dictionary once. Raw values are stored in their clean() form;
+        roster rows of year_months still UNKNOWN for a raw value are updated in
+        the same transaction. Normalized values other than HH:MM or OFF are
+        not stored and come back in "rejected".
+        """
+        mappings = {raw: normalized.strip() for raw, normalized in dict(mappings).items()
+                    if str(raw).strip() and isinstance(normalized, str) and normalized.strip()}
+        rejected = {raw: normalized for raw, normalized in mappings.items() if not NORMALIZED_SHIFT.match(normalized)}
+        mappings = {raw: normalized for raw, normalized in mappings.items() if raw not in rejected}
+        rows = [(self.clean(raw), normalized, shift_type, created_by) for raw, normalized in mappings.items()]
+        if not rows:
+            error = "No valid mappings to add (expected HH:MM or OFF)" if rejected else "No mappings to add"
+            return {"success": False, "error": error, "rejected": rejected}
+        with self.db.connect() as conn:
+            conn.executemany("""
+                INSERT INTO shift_dictionary (raw_pattern, normalized_shift, shift_type, created_by)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(raw_pattern) DO UPDATE SET
+                    normalized_shift = excluded.normalized_shift,
+                    shift_type = excluded.shift_type,
+                    created_by = excluded.created_by,
+                    is_active = 1
+            """, rows)
+            updated = 0
+            relearn = [(normalized, raw) for raw, normalized in mappings.items()]
+            for year_month in year_months:
+                for family in ('roster_live', 'roster_original'):
+                    updated += conn.executemany(sql(f'{family}.relearn', year_month), relearn).rowcount
+            conn.commit()
+        self._load_dictionary()
+        return {"success": True, "added": len(rows), "rows_updated": updated, "rejected": rejected}
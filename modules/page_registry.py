@@ -0,0 +1,123 @@
+# modules/page_registry.py
+import importlib
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from modules.metrics import cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# Latency budget; anything over it is logged as a warning
+STARTUP_BUDGET_SEC = float(os.getenv('WFM_STARTUP_BUDGET_SEC', '3.0'))
+PAGE_BUDGET_MS = float(os.getenv('WFM_PAGE_BUDGET_MS', '800'))
+# Render samples kept per page
+SAMPLES = 200
+
+
+class PageSpec:
+    """One sidebar page: the module that renders it, its entry function and who can see it."""
+
+    def __init__(self, name, module, entry='main', roles=None, args=('db', 'audit')):
+        self.name = name
+        self.module = module
+        self.entry = entry
+        self.roles = roles
+        self.args = args
+
+
+class PageRegistry:
+    """
+    Sidebar pages loaded on first use.
+
+    app.py only registers module paths; a page module (and everything it
+    imports: pandas, upload handlers, swap workflow ...) is imported the
+    first time that page is opened and the entry function is called on
+    every render. The registry lives for the whole process
+    (st.cache_resource), so it also keeps the startup and render timings:
+
+    - cold_start_sec: first script run of the process up to the menu
+    - first_render_sec: first script run that rendered a page, start to end
+      (includes importing that page's modules)
+    - per page: import time once, render time of the last SAMPLES renders
+    """
+
+    def __init__(self):
+        self.pages = {}
+        self.cold_start_sec = None
+        self.first_render_sec = None
+        self._modules = {}
+        self._import_ms = {}
+        self._render_ms = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, module, entry='main', roles=None, args=('db', 'audit')):
+        self.pages[name] = PageSpec(name, module, entry, roles, args)
+
+    def menu(self, role):
+        """Page names visible to `role`, in registration order."""
+        return [name for name, spec in self.pages.items() if spec.roles is None or role in spec.roles]
+
+    def mark_cold_start(self, run_started):
+        """Record the first run's time to menu; later calls are ignored."""
+        if self.cold_start_sec is not None:
+            return
+        self.cold_start_sec = time.perf_counter() - run_started
+        if self.cold_start_sec > STARTUP_BUDGET_SEC:
+            logger.warning("Cold start %.2fs over budget (%.1fs)", self.cold_start_sec, STARTUP_BUDGET_SEC)
+        else:
+            logger.info("Cold start %.2fs", self.cold_start_sec)
+
+    def _load(self, spec):
+        module = self._modules.get(spec.module)
+        cache_lookup('page_modules', module is not None)
+        if module is None:
+            with self._lock:
+                module = self._modules.get(spec.module)
+                if module is None:
+                    started = time.perf_counter()
+                    module = importlib.import_module(spec.module)
+                    self._import_ms[spec.module] = (time.perf_counter() - started) * 1000
+                    self._modules[spec.module] = module
+        return getattr(module, spec.entry)
+
+    def render(self, name, run_started=None, **context):
+        """
+        Render page `name`, passing the context values named in its spec.
+        Timings are only recorded when the page returns normally
+        (st.rerun / st.stop end the run early).
+        """
+        spec = self.pages[name]
+        entry = self._load(spec)
+        started = time.perf_counter()
+        entry(**{arg: context[arg] for arg in spec.args})
+        finished = time.perf_counter()
+
+        elapsed_ms = (finished - started) * 1000
+        with self._lock:
+            self._render_ms.setdefault(name, deque(maxlen=SAMPLES)).append(elapsed_ms)
+            if self.first_render_sec is None and run_started is not None:
+                self.first_render_sec = finished - run_started
+                logger.info("First render (%s) %.2fs", name, self.first_render_sec)
+        if elapsed_ms > PAGE_BUDGET_MS:
+            logger.warning("Page %s rendered in %.0f ms, over budget (%.0f ms)", name, elapsed_ms, PAGE_BUDGET_MS)
+        return elapsed_ms
+
+    def timings(self):
+        """Per-page rows for the admin view: import ms, renders, last/median/max render ms."""
+        rows = []
+        with self._lock:
+            for name, spec in self.pages.items():
+                samples = sorted(self._render_ms.get(name, ()))
+                rows.append({
+                    "page": name,
+                    "loaded": spec.module in self._modules,
+                    "import_ms": round(self._import_ms.get(spec.module, 0.0), 1),
+                    "renders": len(samples),
+                    "last_ms": round(self._render_ms[name][-1], 1) if samples else None,
+                    "median_ms": round(samples[len(samples) // 2], 1) if samples else None,
+                    "max_ms": round(samples[-1], 1) if samples else None,
+                })
+        return rows
@@ -0,0 +1,48 @@
+# modules/report_queries.py
+import numpy as np
+import pandas as pd
+
+from modules.frames import apply_types
+
+# Raw queries behind the Reports page, kept free of Streamlit so they can be
+# benchmarked and reused by exports.
+
+
+def attendance_summary(conn, year_month):
+    """Per-agent attendance totals of one month with the attendance percentage."""
+    df = pd.read_sql_query(f"""
+        SELECT
+            a.citrix_uid,
+            a.name AS agent_name,
+            a.team_leader,
+            a.supervisor,
+            COUNT(DISTINCT ap.shift_date) AS days_worked,
+            SUM(ap.staff_time_min) AS total_staff_hours,
+            SUM(CASE
+                WHEN ap.attendance_status IN ('Present', 'Present - Modified')
+                THEN 1 ELSE 0
+            END) AS present_days,
+            SUM(CASE
+                WHEN ap.attendance_status IN ('Absent', 'Absent - Unjustified')
+                THEN 1 ELSE 0
+            END) AS absent_days,
+            SUM(CASE
+                WHEN ap.attendance_status IN ('Leave', 'Leave - Approved')
+                THEN 1 ELSE 0
+            END) AS leave_days
+        FROM attendance_processed_{year_month} ap
+        JOIN agents_master a ON ap.citrix_uid = a.citrix_uid
+        GROUP BY a.citrix_uid, a.name, a.team_leader, a.supervisor
+    """, conn)
+
+    # تحويل الأعمدة الرقمية إلى أنواع رقمية (والأسماء إلى categorical)
+    df['total_staff_hours'] = pd.to_numeric(df['total_staff_hours'], errors='coerce').fillna(0)
+    apply_types(df)
+
+    # حساب نسبة الحضور
+    total_days = df['present_days'] + df['absent_days'] + df['leave_days']
+    # تجنب القسمة على صفر
+    attendance_pct = (df['present_days'] / total_days.replace(0, np.nan) * 100).round(1)
+    df['attendance_percentage'] = attendance_pct.fillna(0).astype(str) + '%'
+    return df
+
@@ -0,0 +1,96 @@
+# modules/session_merge.py
+import pandas as pd
+
+from database.statements import sql
+
+# Gaps shorter than this (in seconds) are not reported by find_gaps by default.
+DEFAULT_GAP_THRESHOLD_SEC = 15 * 60
+
+
+def merge_intervals(df, key='citrix_uid', start='login_time', end='logout_time'):
+    """
+    Merge overlapping or touching [start, end] intervals per key.
+
+    Rows are sorted once by (key, start); a new block starts whenever a
+    login is later than the running max logout of the same agent. Returns
+    one row per merged block with columns key, start, end, duration_sec.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=[key, start, end, 'duration_sec'])
+    df = df[[key, start, end]].sort_values([key, start], kind='mergesort').reset_index(drop=True)
+    running_end = df.groupby(key, sort=False)[end].cummax()
+    prev_end = running_end.groupby(df[key], sort=False).shift(1)
+    block = (prev_end.isna() | (df[start] > prev_end)).cumsum()
+    merged = df.groupby(block, sort=False).agg({key: 'first', start: 'min', end: 'max'})
+    merged['duration_sec'] = (merged[end] - merged[start]).dt.total_seconds().astype('int64')
+    return merged.reset_index(drop=True)
+
+
+def find_gaps(merged, min_gap_sec=DEFAULT_GAP_THRESHOLD_SEC, key='citrix_uid',
+              start='login_time', end='logout_time'):
+    """Gaps between consecutive merged blocks of the same agent longer than min_gap_sec."""
+    if merged.empty:
+        return pd.DataFrame(columns=[key, 'gap_start', 'gap_end', 'gap_sec'])
+    next_start = merged.groupby(key, sort=False)[start].shift(-1)
+    gaps = pd.DataFrame({
+        key: merged[key],
+        'gap_start': merged[end],
+        'gap_end': next_start,
+    }).dropna(subset=['gap_end'])
+    gaps['gap_sec'] = (gaps['gap_end'] - gaps['gap_start']).dt.total_seconds().astype('int64')
+    return gaps[gaps['gap_sec'] > min_gap_sec].reset_index(drop=True)
+
+
+class SessionMerger:
+    """Loads Aspect/EIM sessions and turns them into deduplicated worked time."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def load_sessions(self, conn, year_month, event_date=None, agents_table=None):
+        """
+        All Aspect and EIM session rows for the month (or one event_date) with a
+        source column; agents_table limits them to the citrix_uids of a TEMP table.
+        """
+        frames = []
+        for prefix, source in (('eim_raw', 'EIM'), ('aspect_raw', 'Aspect')):
+            name, params, tables = f'sessions.{prefix}', (), {}
+            if event_date is not None:
+                name, params = name + '.day', (event_date,)
+            if agents_table:
+                name, tables = name + '.agents', {'agents': agents_table}
+            df = pd.read_sql_query(sql(name, year_month, **tables), conn, params=params)
+            df['source'] = source
+            frames.append(df)
+        sessions = pd.concat(frames, ignore_index=True)
+        sessions['login_time'] = pd.to_datetime(sessions['login_time'], errors='coerce')
+        sessions['logout_time'] = pd.to_datetime(sessions['logout_time'], errors='coerce')
+        return sessions
+
+    @staticmethod
+    def split_timed(sessions):
+        """(rows with a usable login/logout window, rows without one)."""
+        timed = (sessions['login_time'].notna() & sessions['logout_time'].notna()
+                 & (sessions['logout_time'] > sessions['login_time']))
+        return sessions[timed], sessions[~timed]
+
+    def worked_time(self, sessions):
+        """
+        Deduplicated worked seconds per agent.
+        Timed sessions are merged across sources; rows without a login/logout
+        window fall back to their recorded session_duration_sec.
+        """
+        timed, untimed = self.split_timed(sessions)
+        merged = merge_intervals(timed)
+        worked = merged.groupby('citrix_uid')['duration_sec'].sum()
+        fallback = pd.to_numeric(untimed['session_duration_sec'], errors='coerce').fillna(0)
+        fallback = fallback.groupby(untimed['citrix_uid']).sum()
+        return worked.add(fallback, fill_value=0).astype('int64')
+
+    def gaps_for_date(self, event_date, min_gap_sec=DEFAULT_GAP_THRESHOLD_SEC):
+        """Gaps longer than min_gap_sec between an agent's merged sessions on event_date."""
+        year_month = f"{event_date.year}_{event_date.month:02d}"
+        with self.db.connect() as conn:
+            sessions = self.load_sessions(conn, year_month, event_date)
+        timed, _ = self.split_timed(sessions)
+        return find_gaps(merge_intervals(timed), min_gap_sec)
@@ -0,0 +1,142 @@
+# modules/shift_learning.py
+"""
+Learning shift_dictionary entries from roster values ShiftNormalizer could
+not read ("UNKNOWN").
+
+collect_unknown() counts the distinct unknown raw values of an upload,
+propose() guesses a normalization for one value and ShiftLearner lists the
+unknown values still stored in a month with their proposals. Approved
+mappings go to ShiftNormalizer.add_patterns: one transaction, one dictionary
+reload, and the month's UNKNOWN roster rows are re-normalized with them.
+
+Normalized shifts are start times ("HH:MM", as read by the engine, the
+intraday tracker and the interval engine) or OFF, so a range proposes its
+start: "9-6" -> 09:00 (09:00-18:00), "2-11" -> 14:00 (14:00-23:00).
+"""
+import os
+import re
+
+import pandas as pd
+
+from database.migrate_facts import monthly_tables
+from database.statements import sql
+from modules.normalization import ShiftNormalizer
+
+# A bare 12-hour start before this hour is read as PM ("2-11" -> 14:00)
+EARLIEST_START_HOUR = int(os.getenv('WFM_SHIFT_EARLIEST_START', '6'))
+# Usual shift length; picks the end of an ambiguous range ("9-6" ends at 18:00)
+SHIFT_HOURS = float(os.getenv('WFM_SHIFT_HOURS', '9'))
+# Ranges whose length falls outside these bounds are not proposed
+MIN_SHIFT_HOURS, MAX_SHIFT_HOURS = 3, 12
+
+# الأرقام العربية والفارسية -> 0-9
+_DIGITS = str.maketrans('٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹', '01234567890123456789')
+OFF_WORDS = {'off', 'day off', 'dayoff', 'rest', 'rest day', 'rd', 'weekend',
+             'راحة', 'راحه', 'اوف', 'أوف', 'عطلة', 'عطله'}
+_TIME = r'(\d{1,2})(?::(\d{2}))?\s*(am|pm|a\.?m\.?|p\.?m\.?|ص|م)?'
+_SINGLE = re.compile(rf'^{_TIME}$')
+_FOUR_DIGITS = re.compile(r'^(\d{2})(\d{2})$')
+_RANGE = re.compile(rf'^{_TIME}\s*(?:-|–|—|~|to|till|until|الى|إلى|الي|لـ|ل)\s*{_TIME}$')
+
+
+def _hour24(hour, meridiem):
+    """Hour of a 12-hour clock value with an am/pm (ص/م) marker."""
+    pm = meridiem[0] in ('p', 'م')
+    return hour % 12 + (12 if pm else 0)
+
+
+def _start_hour(hour_text, meridiem):
+    """24-hour start: explicit am/pm, a 24-hour value ("14", "02:00"), else EARLIEST_START_HOUR."""
+    hour = int(hour_text)
+    if meridiem:
+        return _hour24(hour, meridiem)
+    if hour > 12 or hour_text.startswith('0'):
+        return hour
+    return hour + 12 if hour < EARLIEST_START_HOUR else hour
+
+
+def propose(raw):
+    """
+    {"proposed", "rule", "reading"} for a raw shift value, or None when no
+    heuristic applies. rule is one of off, time, range.
+    """
+    text = ShiftNormalizer.clean(raw).translate(_DIGITS).casefold()
+    text = re.sub(r'\s+', ' ', text).strip()
+    if not text:
+        return None
+    if text in OFF_WORDS:
+        return {"proposed": "OFF", "rule": "off", "reading": "OFF"}
+
+    four = _FOUR_DIGITS.match(text)
+    if four and int(four[1]) < 24 and int(four[2]) < 60:
+        start = f"{int(four[1]):02d}:{four[2]}"
+        return {"proposed": start, "rule": "time", "reading": start}
+
+    single = _SINGLE.match(text)
+    if single:
+        hour, minute = int(single[1]), int(single[2] or 0)
+        if hour > 23 or minute > 59:
+            return None
+        start = f"{_start_hour(single[1], single[3]) % 24:02d}:{minute:02d}"
+        return {"proposed": start, "rule": "time", "reading": start}
+
+    rng = _RANGE.match(text)
+    if not rng:
+        return None
+    sh_text, sm, s_mer, eh, em, e_mer = rng.groups()
+    sh, eh, s_min, e_min = int(sh_text), int(eh), int(sm or 0), int(em or 0)
+    if sh > 23 or eh > 24 or s_min > 59 or e_min > 59:
+        return None
+    start = _start_hour(sh_text, s_mer) * 60 + s_min
+    # End: the reading (as given, or +12h when no marker) whose length is closest to SHIFT_HOURS
+    if e_mer:
+        ends = [_hour24(eh, e_mer)]
+    elif eh <= 12:
+        ends = [eh, eh + 12]
+    else:
+        ends = [eh]
+    lengths = [((end * 60 + e_min - start) % 1440) / 60 for end in ends]
+    length, end = min(zip(lengths, ends), key=lambda pair: abs(pair[0] - SHIFT_HOURS))
+    if not MIN_SHIFT_HOURS <= length <= MAX_SHIFT_HOURS:
+        return None
+    start_text = f"{start // 60 % 24:02d}:{start % 60:02d}"
+    return {"proposed": start_text, "rule": "range",
+            "reading": f"{start_text}-{end % 24:02d}:{e_min:02d}"}
+
+
+def collect_unknown(raw_values, shift_map):
+    """{raw: rows} of the raw values shift_map normalizes to UNKNOWN, most frequent first."""
+    counts = pd.Series(raw_values).value_counts()
+    return {raw: int(n) for raw, n in counts.items() if shift_map.get(raw) == 'UNKNOWN'}
+
+
+class ShiftLearner:
+    """Unknown roster shifts of stored months, with proposals, and their approval."""
+
+    def __init__(self, db, normalizer):
+        self.db = db
+        self.normalizer = normalizer
+
+    def roster_months(self):
+        with self.db.connect() as conn:
+            return [ym for ym, families in monthly_tables(conn).items() if 'roster_live' in families]
+
+    def suggestions(self, year_month):
+        """Distinct UNKNOWN roster_live values of year_month with counts and proposals."""
+        with self.db.connect() as conn:
+            df = pd.read_sql_query(sql('roster_live.unknown_shifts', year_month), conn)
+        return self.propose_all(df)
+
+    @staticmethod
+    def propose_all(df):
+        """Add proposed / rule / reading columns to a frame with a raw_shift column."""
+        proposals = [propose(raw) or {} for raw in df['raw_shift']]
+        df = df.assign(proposed=[p.get('proposed') for p in proposals],
+                       rule=[p.get('rule') for p in proposals],
+                       reading=[p.get('reading') for p in proposals])
+        return df.sort_values('rows', ascending=False, ignore_index=True) if 'rows' in df else df
+
+    def approve(self, mappings, created_by=None, year_months=()):
+        """Store raw -> normalized mappings and re-normalize the UNKNOWN rows of year_months."""
+        return self.normalizer.add_patterns(mappings, shift_type='Learned', created_by=created_by,
+                                            year_months=year_months)
@@ -0,0 +1,425 @@
+# modules/swap_workflow.py
+from datetime import date, datetime, timedelta
+import pandas as pd
+
+from modules.metrics import begin_immediate
+
+# Policy limits checked on submission (violations are stored, RTM decides)
+MIN_REST_HOURS = 12
+MIN_WEEKLY_OFF = 2
+# Same 9h shift length as AttendanceEngine / IntervalEngine
+SHIFT_HOURS = 9
+# Days around the requested dates read for rest / weekly OFF checks
+WINDOW_DAYS = 7
+
+HHMM = "'[0-9][0-9]:[0-9][0-9]'"
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return pd.to_datetime(value).date()
+
+
+class SwapManager:
+    """
+    Shift swap / leave update requests on shift_swaps, applied to roster_live.
+
+    Requests are validated as a set: they are loaded into a TEMP table and
+    agent lookup, current shifts, duplicate pending requests, rest hours
+    and weekly OFF counts are each one indexed join over the whole batch.
+    Approvals apply every selected swap to roster_live_{ym} with one
+    UPDATE ... FROM per month inside a single transaction.
+    """
+
+    def __init__(self, db, normalizer, audit):
+        self.db = db
+        self.normalizer = normalizer
+        self.audit = audit
+
+    # ---------- Helpers ----------
+    def _roster_window(self, conn, dates):
+        """TEMP view roster_window over the roster_live months around `dates`."""
+        start = min(dates) - timedelta(days=WINDOW_DAYS)
+        end = max(dates) + timedelta(days=WINDOW_DAYS)
+        existing = {row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'roster_live_%'")}
+        months = pd.period_range(start, end, freq='M')
+        selects = [f"SELECT citrix_uid, shift_date, scheduled_shift, normalized_shift FROM {table}"
+                   for table in (f"roster_live_{m.year}_{m.month:02d}" for m in months)
+                   if table in existing]
+        if not selects:
+            selects = ["SELECT NULL AS citrix_uid, NULL AS shift_date, NULL AS scheduled_shift, "
+                       "NULL AS normalized_shift WHERE 0"]
+        conn.execute("DROP VIEW IF EXISTS temp.roster_window")
+        conn.execute(f"CREATE TEMP VIEW roster_window AS {' UNION ALL '.join(selects)}")
+
+    def _normalize_all(self, values):
+        """Normalize each distinct requested shift once; leave names are kept as-is."""
+        return {v: self.normalizer.normalize(v) for v in set(values) if v is not None}
+
+    # ---------- Submission ----------
+    def create_request(self, requester, agent_a_acd, agent_b_acd, shift_date,
+                       new_shift_a, new_shift_b=None, leave_type=None):
+        result = self.submit_many([{
+            'agent_a_acd': agent_a_acd, 'agent_b_acd': agent_b_acd, 'shift_date': shift_date,
+            'new_shift_a': new_shift_a, 'new_shift_b': new_shift_b, 'leave_type': leave_type
+        }], requester)
+        return result['requests'][0]
+
+    def submit_many(self, requests, requester):
+        """
+        Validate and store many requests at once.
+        Each request is a dict with agent_a_acd, agent_b_acd (optional), shift_date,
+        new_shift_a, new_shift_b and leave_type. For a swap with no new shifts
+        given, A and B exchange their current shifts.
+        Returns {"success", "submitted", "requests": [per-request result]}.
+        """
+        today = date.today()
+        rows = []
+        for i, req in enumerate(requests):
+            leave = req.get('leave_type')
+            leave = None if leave in (None, '', 'None') else leave
+            b_acd = req.get('agent_b_acd')
+            b_acd = None if b_acd is None or pd.isna(b_acd) or str(b_acd).strip() == '' else str(b_acd).strip()
+            new_a = req.get('new_shift_a')
+            new_a = None if new_a is None or pd.isna(new_a) or str(new_a).strip() == '' else str(new_a).strip()
+            new_b = req.get('new_shift_b')
+            new_b = None if new_b is None or pd.isna(new_b) or str(new_b).strip() == '' else str(new_b).strip()
+            try:
+                shift_date = _as_date(req['shift_date'])
+                error = None
+            except Exception:
+                shift_date, error = None, "Invalid shift date"
+            if error is None and shift_date <= today:
+                error = "Same-day or past swaps not allowed"
+            if error is None and not b_acd and not (new_a or leave):
+                error = "New shift or leave type required"
+            rows.append((i, str(req['agent_a_acd']).strip(), b_acd, shift_date,
+                         new_a or (leave if not b_acd else None), new_b, leave, error))
+
+        valid_dates = [r[3] for r in rows if r[7] is None]
+        results = [{"success": False, "error": r[7]} if r[7] else None for r in rows]
+        if not valid_dates:
+            return {"success": False, "submitted": 0, "requests": results}
+
+        with self.db.connect() as conn:
+            # Take the write lock up front: the batch reads then writes, and a
+            # deferred read snapshot cannot be upgraded once another writer commits
+            begin_immediate(conn, 'swap.submit_many')
+            conn.execute("""
+                CREATE TEMP TABLE _swap_req (
+                    row_no INTEGER PRIMARY KEY, a_acd TEXT, b_acd TEXT, shift_date DATE,
+                    new_a TEXT, new_b TEXT, leave_type TEXT, error TEXT,
+                    a_citrix TEXT, b_citrix TEXT, orig_a TEXT, orig_b TEXT,
+                    orig_norm_a TEXT, orig_norm_b TEXT, norm_a TEXT, norm_b TEXT
+                )
+            """)
+            conn.executemany("""
+                INSERT INTO _swap_req (row_no, a_acd, b_acd, shift_date, new_a, new_b, leave_type, error)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            self._roster_window(conn, valid_dates)
+
+            # Agents and current shifts
+            conn.execute("""
+                UPDATE _swap_req AS q SET a_citrix = a.citrix_uid
+                FROM agents_master a WHERE a.acd_id = q.a_acd
+            """)
+            conn.execute("""
+                UPDATE _swap_req AS q SET b_citrix = a.citrix_uid
+                FROM agents_master a WHERE a.acd_id = q.b_acd
+            """)
+            conn.execute("""
+                UPDATE _swap_req AS q SET orig_a = r.scheduled_shift, orig_norm_a = r.normalized_shift
+                FROM roster_window r WHERE r.citrix_uid = q.a_citrix AND r.shift_date = q.shift_date
+            """)
+            conn.execute("""
+                UPDATE _swap_req AS q SET orig_b = r.scheduled_shift, orig_norm_b = r.normalized_shift
+                FROM roster_window r WHERE r.citrix_uid = q.b_citrix AND r.shift_date = q.shift_date
+            """)
+            conn.execute("""
+                UPDATE _swap_req SET error = CASE
+                    WHEN a_citrix IS NULL THEN 'Agent A not found'
+                    WHEN b_acd IS NOT NULL AND b_citrix IS NULL THEN 'Agent B not found'
+                    WHEN a_citrix = b_citrix THEN 'Agent A and B are the same agent'
+                    WHEN orig_a IS NULL THEN 'No shift found for agent A on that date'
+                    WHEN b_citrix IS NOT NULL AND orig_b IS NULL THEN 'No shift found for agent B on that date'
+                END
+                WHERE error IS NULL
+            """)
+            # A plain swap exchanges the two current shifts
+            conn.execute("""
+                UPDATE _swap_req SET new_a = COALESCE(new_a, orig_b), new_b = COALESCE(new_b, orig_a)
+                WHERE b_citrix IS NOT NULL AND error IS NULL
+            """)
+
+            shift_values = [r[0] for r in conn.execute(
+                "SELECT new_a FROM _swap_req WHERE leave_type IS NULL UNION SELECT new_b FROM _swap_req")]
+            norm = self._normalize_all(shift_values)
+            conn.executemany("UPDATE _swap_req SET norm_a = ? WHERE new_a = ? AND leave_type IS NULL",
+                             [(n, raw) for raw, n in norm.items()])
+            conn.executemany("UPDATE _swap_req SET norm_b = ? WHERE new_b = ?",
+                             [(n, raw) for raw, n in norm.items()])
+            conn.execute("UPDATE _swap_req SET norm_a = leave_type WHERE leave_type IS NOT NULL AND b_citrix IS NULL")
+
+            # One row per (request, agent) for the policy joins
+            conn.execute("""
+                CREATE TEMP TABLE _swap_agent AS
+                SELECT row_no, a_citrix AS citrix_uid, shift_date, orig_norm_a AS orig_norm, norm_a AS new_norm
+                FROM _swap_req WHERE error IS NULL
+                UNION ALL
+                SELECT row_no, b_citrix, shift_date, orig_norm_b, norm_b
+                FROM _swap_req WHERE error IS NULL AND b_citrix IS NOT NULL
+            """)
+            conn.execute("CREATE INDEX temp.idx_swap_agent ON _swap_agent (citrix_uid, shift_date)")
+
+            # Duplicates: pending in shift_swaps, or repeated inside this batch
+            conn.execute("""
+                UPDATE _swap_req SET error = 'Duplicate pending swap for this agent and date'
+                WHERE row_no IN (
+                    SELECT x.row_no FROM _swap_agent x
+                    WHERE EXISTS (SELECT 1 FROM shift_swaps s
+                                  WHERE s.status = 'Pending' AND s.agent_a_citrix = x.citrix_uid
+                                    AND s.shift_date = x.shift_date)
+                       OR EXISTS (SELECT 1 FROM shift_swaps s
+                                  WHERE s.status = 'Pending' AND s.agent_b_citrix = x.citrix_uid
+                                    AND s.shift_date = x.shift_date)
+                       OR EXISTS (SELECT 1 FROM _swap_agent y
+                                  WHERE y.citrix_uid = x.citrix_uid AND y.shift_date = x.shift_date
+                                    AND y.row_no < x.row_no)
+                )
+            """)
+
+            # Rest hours against the previous and next rostered day
+            violations = conn.execute(f"""
+                WITH checks AS (
+                    SELECT x.row_no, x.citrix_uid, 'prev' AS side,
+                           (julianday(x.shift_date || ' ' || x.new_norm)
+                            - julianday(p.shift_date || ' ' || p.normalized_shift)) * 24 - ? AS rest_h
+                    FROM _swap_agent x
+                    JOIN roster_window p
+                      ON p.citrix_uid = x.citrix_uid AND p.shift_date = date(x.shift_date, '-1 day')
+                    WHERE x.new_norm GLOB {HHMM} AND p.normalized_shift GLOB {HHMM}
+                    UNION ALL
+                    SELECT x.row_no, x.citrix_uid, 'next',
+                           (julianday(n.shift_date || ' ' || n.normalized_shift)
+                            - julianday(x.shift_date || ' ' || x.new_norm)) * 24 - ?
+                    FROM _swap_agent x
+                    JOIN roster_window n
+                      ON n.citrix_uid = x.citrix_uid AND n.shift_date = date(x.shift_date, '+1 day')
+                    WHERE x.new_norm GLOB {HHMM} AND n.normalized_shift GLOB {HHMM}
+                )
+                SELECT row_no, citrix_uid || ': ' || printf('%.1f', rest_h) || 'h rest ('
+                       || side || ' day)' AS violation
+                FROM checks WHERE rest_h < ?
+                UNION ALL
+                -- Weekly (Mon-Sun) OFF days after the change, only when the change removes an OFF
+                SELECT x.row_no, x.citrix_uid || ': ' || COUNT(w.shift_date) || ' OFF days in week'
+                FROM _swap_agent x
+                LEFT JOIN roster_window w
+                  ON w.citrix_uid = x.citrix_uid
+                 AND w.shift_date BETWEEN date(x.shift_date, '-' || ((strftime('%w', x.shift_date) + 6) % 7) || ' days')
+                                      AND date(x.shift_date, '+' || (6 - (strftime('%w', x.shift_date) + 6) % 7) || ' days')
+                 AND w.shift_date != x.shift_date
+                 AND w.normalized_shift = 'OFF'
+                WHERE x.orig_norm = 'OFF' AND COALESCE(x.new_norm, '') != 'OFF'
+                GROUP BY x.row_no, x.citrix_uid
+                HAVING COUNT(w.shift_date) < ?
+            """, (SHIFT_HOURS, SHIFT_HOURS, MIN_REST_HOURS, MIN_WEEKLY_OFF)).fetchall()
+            by_row = {}
+            for row in violations:
+                by_row.setdefault(row['row_no'], []).append(row['violation'])
+
+            inserted = conn.execute("""
+                INSERT INTO shift_swaps
+                (requester_citrix, agent_a_citrix, agent_b_citrix, shift_date,
+                 original_shift_a, original_shift_b, requested_shift_a, requested_shift_b,
+                 swap_type, leave_type, submitted_by, submitted_at)
+                SELECT ?, a_citrix, b_citrix, shift_date, orig_a, orig_b, new_a, new_b,
+                       CASE WHEN b_citrix IS NOT NULL THEN 'Swap' ELSE 'Update' END,
+                       leave_type, ?, ?
+                FROM _swap_req WHERE error IS NULL
+                ORDER BY row_no
+                RETURNING swap_id, agent_a_citrix, shift_date
+            """, (requester, requester, datetime.now())).fetchall()
+            row_of = {(r['a_citrix'], str(r['shift_date'])): r['row_no'] for r in conn.execute(
+                "SELECT row_no, a_citrix, shift_date FROM _swap_req WHERE error IS NULL")}
+            swap_ids = {}
+            for r in inserted:
+                row_no = row_of[(r['agent_a_citrix'], str(r['shift_date']))]
+                swap_ids[row_no] = r['swap_id']
+
+            # Soft violations are stored on the request for the reviewer
+            conn.executemany("UPDATE shift_swaps SET policy_violation = ? WHERE swap_id = ?",
+                             [('; '.join(v), swap_ids[row_no]) for row_no, v in by_row.items()
+                              if row_no in swap_ids])
+            final = conn.execute("SELECT row_no, error, a_citrix, b_citrix, shift_date, new_a, new_b "
+                                 "FROM _swap_req").fetchall()
+            conn.commit()
+
+        for row in final:
+            i = row['row_no']
+            if i in swap_ids:
+                results[i] = {"success": True, "swap_id": swap_ids[i],
+                              "policy_violation": '; '.join(by_row.get(i, [])) or None}
+                self.audit.log_action(action='SWAP_REQUEST', entity_name='shift_swaps',
+                                      entity_key=swap_ids[i], user_citrix=requester,
+                                      new_value={"agent_a": row['a_citrix'], "agent_b": row['b_citrix'],
+                                                 "shift_date": row['shift_date'], "shift_a": row['new_a'],
+                                                 "shift_b": row['new_b']})
+            elif results[i] is None:
+                results[i] = {"success": False, "error": row['error']}
+        return {"success": bool(swap_ids), "submitted": len(swap_ids), "requests": results}
+
+    # ---------- Queries ----------
+    def get_pending_swaps(self, requester=None, limit=1000):
+        sql = """
+            SELECT s.*, a1.name as agent_a_name, a2.name as agent_b_name
+            FROM shift_swaps s
+            LEFT JOIN agents_master a1 ON s.agent_a_citrix = a1.citrix_uid
+            LEFT JOIN agents_master a2 ON s.agent_b_citrix = a2.citrix_uid
+            WHERE s.status = 'Pending'
+        """
+        params = []
+        if requester:
+            sql += " AND s.requester_citrix = ?"
+            params.append(requester)
+        sql += " ORDER BY s.shift_date, s.swap_id LIMIT ?"
+        params.append(limit)
+        with self.db.connect() as conn:
+            df = pd.read_sql_query(sql, conn, params=params)
+            return df
+
+    # ---------- Review ----------
+    def _load_selection(self, conn, swap_ids):
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS _swap_sel (swap_id INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM _swap_sel")
+        conn.executemany("INSERT OR IGNORE INTO _swap_sel (swap_id) VALUES (?)",
+                         [(int(s),) for s in swap_ids])
+
+    def approve_swaps(self, swap_ids, reviewer, notes=None):
+        """
+        Approve many pending swaps in one transaction.
+        A swap is held back (left Pending) when the roster changed since it was
+        requested or when an earlier swap in the same selection touches the same
+        agent and date. Returns approved ids, held-back conflicts and the
+        (citrix_uid, shift_date) pairs whose roster changed.
+        """
+        now = datetime.now()
+        with self.db.connect() as conn:
+            begin_immediate(conn, 'swap.approve_swaps')
+            self._load_selection(conn, swap_ids)
+            conn.execute("""
+                CREATE TEMP TABLE _swap_apply AS
+                SELECT s.swap_id, s.agent_a_citrix AS citrix_uid, s.shift_date,
+                       s.original_shift_a AS expected, s.requested_shift_a AS new_shift,
+                       s.leave_type, NULL AS new_norm
+                FROM shift_swaps s JOIN _swap_sel USING (swap_id)
+                WHERE s.status = 'Pending'
+                UNION ALL
+                SELECT s.swap_id, s.agent_b_citrix, s.shift_date, s.original_shift_b,
+                       s.requested_shift_b, NULL, NULL
+                FROM shift_swaps s JOIN _swap_sel USING (swap_id)
+                WHERE s.status = 'Pending' AND s.agent_b_citrix IS NOT NULL
+            """)
+            conn.execute("CREATE INDEX temp.idx_swap_apply ON _swap_apply (citrix_uid, shift_date)")
+            pending = {r[0] for r in conn.execute("SELECT DISTINCT swap_id FROM _swap_apply")}
+            not_pending = [int(s) for s in swap_ids if int(s) not in pending]
+            if not pending:
+                return {"success": False, "error": "No pending swaps selected",
+                        "approved": [], "conflicts": {}, "not_pending": not_pending, "affected": []}
+
+            dates = [_as_date(r[0]) for r in conn.execute("SELECT DISTINCT shift_date FROM _swap_apply")]
+            self._roster_window(conn, dates)
+
+            conflicts = {}
+            for row in conn.execute("""
+                SELECT DISTINCT x.swap_id FROM _swap_apply x
+                WHERE EXISTS (SELECT 1 FROM _swap_apply y
+                              WHERE y.citrix_uid = x.citrix_uid AND y.shift_date = x.shift_date
+                                AND y.swap_id < x.swap_id)
+            """):
+                conflicts[row[0]] = "Another selected swap changes the same agent and date"
+            for row in conn.execute("""
+                SELECT DISTINCT x.swap_id FROM _swap_apply x
+                LEFT JOIN roster_window r ON r.citrix_uid = x.citrix_uid AND r.shift_date = x.shift_date
+                WHERE r.scheduled_shift IS NOT x.expected
+            """):
+                conflicts.setdefault(row[0], "Roster changed since the request was submitted")
+            conn.executemany("DELETE FROM _swap_apply WHERE swap_id = ?", [(s,) for s in conflicts])
+
+            norm = self._normalize_all(r[0] for r in conn.execute(
+                "SELECT DISTINCT new_shift FROM _swap_apply WHERE leave_type IS NULL"))
+            conn.executemany("UPDATE _swap_apply SET new_norm = ? WHERE new_shift = ? AND leave_type IS NULL",
+                             [(n, raw) for raw, n in norm.items()])
+            conn.execute("UPDATE _swap_apply SET new_norm = leave_type WHERE leave_type IS NOT NULL")
+
+            for month in sorted({(d.year, d.month) for d in dates}):
+                year_month = f"{month[0]}_{month[1]:02d}"
+                conn.execute(f"""
+                    UPDATE roster_live_{year_month} AS r
+                    SET scheduled_shift = x.new_shift, normalized_shift = x.new_norm,
+                        shift_source = 'Swap', modified_by = ?, modified_at = ?,
+                        approved_by = ?, approved_at = ?
+                    FROM _swap_apply x
+                    WHERE r.citrix_uid = x.citrix_uid AND r.shift_date = x.shift_date
+                      AND x.shift_date LIKE ?
+                """, (reviewer, now, reviewer, now, f"{month[0]}-{month[1]:02d}-%"))
+
+            approved = [r[0] for r in conn.execute("SELECT DISTINCT swap_id FROM _swap_apply ORDER BY swap_id")]
+            affected = [(r[0], r[1]) for r in conn.execute(
+                "SELECT DISTINCT citrix_uid, shift_date FROM _swap_apply")]
+            conn.execute("""
+                UPDATE shift_swaps AS s
+                SET status = 'Approved', reviewed_by = ?, reviewed_at = ?, review_notes = ?
+                FROM (SELECT DISTINCT swap_id FROM _swap_apply) a
+                WHERE s.swap_id = a.swap_id
+            """, (reviewer, now, notes))
+            conn.commit()
+
+        for swap_id in approved:
+            self.audit.log_action(action='SWAP_APPROVE', entity_name='shift_swaps', entity_key=swap_id,
+                                  user_citrix=reviewer)
+        return {"success": True, "approved": approved, "conflicts": conflicts,
+                "not_pending": not_pending, "affected": affected}
+
+    def approve_and_apply(self, swap_ids, reviewer, notes=None):
+        """
+        approve_swaps, then recompute attendance (and the daily_kpi rows)
+        for the affected (agent, date) pairs only.
+        """
+        result = self.approve_swaps(swap_ids, reviewer, notes)
+        if result['affected']:
+            from modules.attendance_engine import AttendanceEngine
+            engine = AttendanceEngine(self.db, self.normalizer, self.audit)
+            result['attendance'] = engine.recalculate_agents(result['affected'])
+        return result
+
+    def approve_swap(self, swap_id, reviewer):
+        result = self.approve_and_apply([swap_id], reviewer)
+        if result['approved']:
+            return {"success": True}
+        if result['conflicts']:
+            return {"success": False, "error": result['conflicts'][int(swap_id)]}
+        return {"success": False, "error": "Swap not found or already processed"}
+
+    def reject_swaps(self, swap_ids, reviewer, notes=None):
+        now = datetime.now()
+        with self.db.connect() as conn:
+            begin_immediate(conn, 'swap.reject_swaps')
+            self._load_selection(conn, swap_ids)
+            rejected = [r[0] for r in conn.execute("""
+                UPDATE shift_swaps AS s
+                SET status = 'Rejected', reviewed_by = ?, reviewed_at = ?, review_notes = ?
+                FROM _swap_sel x
+                WHERE s.swap_id = x.swap_id AND s.status = 'Pending'
+                RETURNING swap_id
+            """, (reviewer, now, notes)).fetchall()]
+            conn.commit()
+        for swap_id in rejected:
+            self.audit.log_action(action='SWAP_REJECT', entity_name='shift_swaps', entity_key=swap_id,
+                                  user_citrix=reviewer, new_value={"notes": notes})
+        return {"success": True, "rejected": rejected}
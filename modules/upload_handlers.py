@@ -1,549 +1,794 @@
 # modules/upload_handlers.py
+import io
 import pandas as pd
 from datetime import datetime
 import hashlib
+from modules.upload_ledger import UploadLedger
+from modules.error_sink import ErrorSink
+from database.instrumentation import StageTimer
+from database.statements import sql
+from modules.metrics import track_upload
+from modules.maintenance import note_bulk_load
+from modules.identity import IdentityResolver
+from modules.shift_learning import collect_unknown
+
+# Rows between two progress callbacks
+PROGRESS_EVERY = 500
+
+# Login IDs that are report artefacts rather than agents
+SKIP_LOGINS = ('', '0', 'Totals', 'nan')
+
+
+# ---------- Parsing (no database access) ----------
+# The parse_* functions only take the file name and raw bytes and return
+# plain DataFrames, so they can run in worker processes (see
+# modules/batch_ingest.py) while a single writer talks to SQLite.
+
+def read_upload(file):
+    """Return the full content of an uploaded file and rewind it."""
+    file.seek(0)
+    data = file.read()
+    file.seek(0)
+    return data if isinstance(data, bytes) else data.encode('utf-8')
+
+
+def _parse_date(date_val):
+    if isinstance(date_val, str):
+        for fmt in ('%d/%m/%Y', '%Y-%m-%d', '%d-%b-%y'):
+            try:
+                return datetime.strptime(date_val, fmt).date()
+            except:
+                continue
+    return pd.to_datetime(date_val).date()
+
+
+def _to_int(val):
+    if pd.isna(val):
+        return 0
+    try:
+        return int(float(str(val).replace(',', '')))
+    except:
+        return 0
+
+
+def default_roster_mapping(columns):
+    """Mapping used by the app: Name + Citrix UID, every other column is a date."""
+    fixed_cols = ['Name', 'Citrix UID']
+    return {
+        'name_col': 'Name',
+        'citrix_col': 'Citrix UID',
+        'acd_col': None,
+        'login_col': None,
+        'date_cols': [col for col in columns if col not in fixed_cols]
+    }
+
+
+def parse_headcount(name, data):
+    df = pd.read_csv(io.BytesIO(data)) if name.endswith('.csv') else pd.read_excel(io.BytesIO(data))
+    required = ['Citrix UID', 'ACD ID', 'Name']
+    missing = [c for c in required if c not in df.columns]
+    if missing:
+        return {"success": False, "error": f"Missing columns: {missing}"}
+
+    df['ACD ID'] = df['ACD ID'].astype(str).str.strip()
+    df['Citrix UID'] = df['Citrix UID'].astype(str).str.strip()
+    df = df.dropna(subset=['Citrix UID', 'ACD ID', 'Name'])
+
+    # إزالة التكرارات
+    before = len(df)
+    df = df.drop_duplicates(subset=['Citrix UID'], keep='first')
+    df = df.drop_duplicates(subset=['ACD ID'], keep='first')
+    removed = before - len(df)
+    result = {"success": True, "df": df, "file_name": name}
+    if removed > 0:
+        result["warnings"] = [f"Removed {removed} duplicate rows (based on Citrix UID and ACD ID)."]
+    return result
+
+
+def parse_roster(name, data, mapping=None):
+    if name.endswith('.csv'):
+        df = pd.read_csv(io.BytesIO(data))
+    else:
+        df = pd.read_excel(io.BytesIO(data))
+    mapping = mapping or default_roster_mapping(df.columns)
+
+    name_col = mapping['name_col']
+    citrix_col = mapping.get('citrix_col')
+    acd_col = mapping.get('acd_col')
+    login_col = mapping.get('login_col')
+    date_cols = mapping['date_cols']
+
+    if name_col not in df.columns:
+        return {"success": False, "error": f"Column '{name_col}' not found."}
+    for col in date_cols:
+        if col not in df.columns:
+            return {"success": False, "error": f"Date column '{col}' not found."}
+
+    id_vars = [name_col]
+    if citrix_col and citrix_col != 'None' and citrix_col in df.columns:
+        id_vars.append(citrix_col)
+    if acd_col and acd_col != 'None' and acd_col in df.columns:
+        id_vars.append(acd_col)
+    if login_col and login_col != 'None' and login_col in df.columns:
+        id_vars.append(login_col)
+
+    melted = df.melt(id_vars=id_vars, value_vars=date_cols,
+                     var_name='raw_date', value_name='raw_shift')
+
+    try:
+        melted['shift_date'] = pd.to_datetime(melted['raw_date'], format='%d-%b-%y', errors='coerce')
+    except:
+        melted['shift_date'] = pd.to_datetime(melted['raw_date'], errors='coerce')
+    melted = melted.dropna(subset=['shift_date'])
+    return {"success": True, "df": melted, "mapping": mapping}
+
+
+def parse_cms(name, data):
+    """
+    Agents Productivity Report: ملف نصي مفصول بعلامة تبويب ويبدأ بسطر عنوان ثم سطر رأس.
+    Returns one row per agent line with report_date (None + parse_error when invalid).
+    """
+    if name.endswith('.csv') or name.endswith('.txt'):
+        df = pd.read_csv(io.BytesIO(data), sep='\t', skiprows=1, encoding='utf-8')
+    else:
+        df = pd.read_excel(io.BytesIO(data), skiprows=1)
+
+    df.columns = [str(c).strip().lower().replace(' ', '_') for c in df.columns]
+
+    required = ['date', 'login_id', 'ans_calls', 'handle_time', 'talk_time', 'hold_time', 'acw_time']
+    missing = [c for c in required if c not in df.columns]
+    if missing:
+        return {"success": False, "error": f"Missing columns: {missing}"}
+
+    df['login_id'] = df['login_id'].astype(str).str.strip()
+    df = df[~df['login_id'].isin(SKIP_LOGINS)]
+
+    report_dates, parse_errors = [], []
+    for idx, date_val in df['date'].items():
+        try:
+            report_dates.append(_parse_date(date_val))
+            parse_errors.append(None)
+        except Exception:
+            report_dates.append(None)
+            parse_errors.append(f"Row {idx}: invalid date {date_val}")
+    df = df.assign(report_date=pd.Series(report_dates, index=df.index, dtype=object),
+                   parse_error=pd.Series(parse_errors, index=df.index, dtype=object))
+
+    for col in ('ans_calls', 'handle_time', 'talk_time', 'hold_time', 'acw_time',
+                'avail_time', 'staffed_time'):
+        df[col] = df[col].map(_to_int) if col in df.columns else 0
+    if 'name' not in df.columns:
+        df['name'] = ''
+    return {"success": True, "df": df}
+
+
+def parse_login_logout(name, data):
+    """
+    ملفات تسجيل الدخول/الخروج (Aspect/EIM).
+    تتعامل مع ملفات EIM و Login-Logout بشكل موحد.
+    """
+    # قراءة الملف كله للبحث عن الرأس
+    content = data.decode('utf-8', errors='ignore')
+    lines = content.splitlines()
+
+    # البحث عن سطر الرأس الذي يحتوي على Agent Name و Date
+    header_idx = None
+    for i, line in enumerate(lines[:20]):  # نبحث في أول 20 سطر فقط
+        if 'Agent Name' in line and 'Date' in line:
+            header_idx = i
+            break
+        if 'Agent name' in line.lower() and 'date' in line.lower():
+            header_idx = i
+            break
+
+    # إذا لم نجد، نبحث عن أي سطر يحتوي على Login ID أو Agent
+    if header_idx is None:
+        for i, line in enumerate(lines[:10]):
+            if 'Login ID' in line or 'Agent' in line:
+                header_idx = i
+                break
+
+    # إذا لم نجد، نفترض أن الرأس في السطر الأول
+    if header_idx is None:
+        header_idx = 0
+
+    # إعادة قراءة الملف باستخدام pandas مع التخطي حتى الرأس
+    # نستخدم sep=None للكشف التلقائي عن الفاصل، و on_bad_lines='skip' لتجاهل الصفوف التالفة
+    df = pd.read_csv(
+        io.BytesIO(data),
+        sep=None,
+        engine='python',
+        skiprows=header_idx,
+        encoding='utf-8',
+        on_bad_lines='skip'
+    )
+
+    # تنظيف أسماء الأعمدة: إلى lower case وإزالة المسافات
+    df.columns = [str(c).strip().lower().replace(' ', '_') for c in df.columns]
+
+    # التعامل مع الأعمدة المكررة (مثل login_time.1, login_time.2)
+    cols = df.columns.tolist()
+    seen = {}
+    unique_cols = []
+    for col in cols:
+        base = col.split('.')[0]
+        if base not in seen:
+            seen[base] = True
+            unique_cols.append(col)
+        else:
+            # نتجاهل الأعمدة المكررة
+            pass
+    df = df[unique_cols]
+
+    # تعيين event_date من العمود date إذا وجد
+    if 'date' in df.columns:
+        df = df.rename(columns={'date': 'event_date'})
+
+    # تعيين login_id
+    if 'login_id' not in df.columns:
+        # البحث عن عمود يشبه login
+        for col in df.columns:
+            if 'login' in col:
+                df = df.rename(columns={col: 'login_id'})
+                break
+        else:
+            # إذا لم نجد، نبحث عن أي عمود id
+            for col in df.columns:
+                if 'id' in col:
+                    df = df.rename(columns={col: 'login_id'})
+                    break
+
+    # التحقق من وجود الأعمدة الأساسية
+    required = ['login_id', 'event_date']
+    missing = [r for r in required if r not in df.columns]
+    if missing:
+        return {"success": False, "error": f"Missing columns: {missing}"}
+
+    # إزالة الصفوف ذات login_id فارغ
+    df = df.dropna(subset=['login_id'])
+    df['login_id'] = df['login_id'].astype(str).str.strip()
+    df = df[~df['login_id'].isin(SKIP_LOGINS)]
+
+    event_dates, login_dts, logout_dts, durations, parse_errors = [], [], [], [], []
+    for idx, row in df.iterrows():
+        # تاريخ الحدث
+        try:
+            event_date = _parse_date(row['event_date'])
+        except Exception:
+            event_dates.append(None)
+            login_dts.append(None)
+            logout_dts.append(None)
+            durations.append(0)
+            parse_errors.append(f"Row {idx}: invalid event_date {row.get('event_date')}")
+            continue
+
+        # أوقات الدخول والخروج
+        login_time = row.get('login_time')
+        logout_time = row.get('logout_time')
+        logout_date_str = row.get('logout_date')
+
+        login_dt = None
+        logout_dt = None
+        duration = 0
+
+        if login_time and login_time != '0' and pd.notna(login_time):
+            try:
+                if isinstance(login_time, str):
+                    login_dt = datetime.strptime(login_time.strip(), '%I:%M%p')
+                    login_dt = login_dt.replace(year=event_date.year, month=event_date.month, day=event_date.day)
+                else:
+                    login_dt = pd.to_datetime(login_time).to_pydatetime()
+            except:
+                pass
+
+        if logout_time and logout_time != '0' and pd.notna(logout_time):
+            try:
+                logout_date = event_date
+                if logout_date_str and pd.notna(logout_date_str):
+                    try:
+                        logout_date = datetime.strptime(str(logout_date_str).strip(), '%d/%m/%Y').date()
+                    except:
+                        pass
+                if isinstance(logout_time, str):
+                    logout_dt = datetime.strptime(logout_time.strip(), '%I:%M%p')
+                    logout_dt = logout_dt.replace(year=logout_date.year, month=logout_date.month, day=logout_date.day)
+                else:
+                    logout_dt = pd.to_datetime(logout_time).to_pydatetime()
+            except:
+                pass
+
+        if login_dt and logout_dt:
+            duration = int((logout_dt - login_dt).total_seconds())
+            if duration < 0:
+                duration = 0
+
+        event_dates.append(event_date)
+        login_dts.append(login_dt)
+        logout_dts.append(logout_dt)
+        durations.append(duration)
+        parse_errors.append(None)
+
+    # object Series keep the Python datetime/None values that sqlite3 binds natively
+    df = df.assign(event_date=pd.Series(event_dates, index=df.index, dtype=object),
+                   login_dt=pd.Series(login_dts, index=df.index, dtype=object),
+                   logout_dt=pd.Series(logout_dts, index=df.index, dtype=object),
+                   session_duration_sec=durations,
+                   parse_error=pd.Series(parse_errors, index=df.index, dtype=object))
+    for col in ('agent_name', 'logout_reason'):
+        if col not in df.columns:
+            df[col] = ''
+    return {"success": True, "df": df}
+
 
 class UploadHandler:
     def __init__(self, db, normalizer, audit):
         self.db = db
         self.normalizer = normalizer
         self.audit = audit
+        self.ledger = UploadLedger(db)
 
     # ---------- Helper methods ----------
-    def _get_agent_by_login(self, login_id):
-        """ابحث عن الوكيل باستخدام login_id (أو acd_id) وأعد citrix_uid و acd_id."""
-        if not login_id or login_id == '0' or login_id == 'Totals':
-            return None
-        with self.db.connect() as conn:
-            # حاول بـ login_id أولاً
-            cur = conn.execute(
-                "SELECT citrix_uid, acd_id FROM agents_master WHERE login_id = ?",
-                (str(login_id).strip(),)
-            )
-            row = cur.fetchone()
-            if row:
-                return dict(row)
-            # إذا لم نجد، جرب acd_id
-            cur = conn.execute(
-                "SELECT citrix_uid, acd_id FROM agents_master WHERE acd_id = ?",
-                (str(login_id).strip(),)
-            )
-            row = cur.fetchone()
-            if row:
-                return dict(row)
-        return None
+    def _load_login_lookup(self, conn):
+        """
+        login_id / acd_id -> {citrix_uid, acd_id}, loaded once per file.
+        A value matching both resolves by login_id first, then acd_id; "0" /
+        "Totals" rows are dropped by the parsers (SKIP_LOGINS).
+        """
+        lookup = {}
+        rows = conn.execute("SELECT citrix_uid, acd_id, login_id FROM agents_master").fetchall()
+        for row in rows:
+            if row['acd_id']:
+                lookup.setdefault(str(row['acd_id']).strip(), {'citrix_uid': row['citrix_uid'], 'acd_id': row['acd_id']})
+        for row in rows:
+            if row['login_id']:
+                lookup[str(row['login_id']).strip()] = {'citrix_uid': row['citrix_uid'], 'acd_id': row['acd_id']}
+        return lookup
+
+    def _check_duplicate(self, file, source_type):
+        """Hash the file and return (content_hash, rejection result or None)."""
+        content_hash = self.ledger.hash_file(file)
+        duplicate = self.ledger.find_duplicate(content_hash, source_type)
+        if duplicate:
+            return content_hash, {
+                "success": False,
+                "error": (f"Identical file already uploaded as batch {duplicate['batch_id']} "
+                          f"({duplicate['file_name']}, {duplicate['row_count']} rows)"),
+                "duplicate_of": duplicate['batch_id']
+            }
+        return content_hash, None
+
+    def _finish_batch(self, conn, batch_id):
+        """Close the ledger entry and report batches sharing (agent, date) pairs."""
+        self.ledger.finish(conn, batch_id)
+        overlaps = self.ledger.find_overlaps(conn, batch_id)
+        return [f"Overlaps batch {b} on {n} agent-days" for b, n in overlaps.items()], overlaps
 
     # ---------- Headcount ----------
-    def process_headcount(self, file):
+    def process_headcount(self, file, progress=None):
         """معالجة ملف HC (بدون تغيير)"""
         try:
-            df = pd.read_csv(file) if file.name.endswith('.csv') else pd.read_excel(file)
-            required = ['Citrix UID', 'ACD ID', 'Name']
-            missing = [c for c in required if c not in df.columns]
-            if missing:
-                return {"success": False, "error": f"Missing columns: {missing}"}
-
-            df['ACD ID'] = df['ACD ID'].astype(str).str.strip()
-            df['Citrix UID'] = df['Citrix UID'].astype(str).str.strip()
-            df = df.dropna(subset=['Citrix UID', 'ACD ID', 'Name'])
-
-            # إزالة التكرارات
-            before = len(df)
-            df = df.drop_duplicates(subset=['Citrix UID'], keep='first')
-            df = df.drop_duplicates(subset=['ACD ID'], keep='first')
-            removed = before - len(df)
-            if removed > 0:
-                print(f"Removed {removed} duplicate rows (based on Citrix UID and ACD ID).")
-
-            updated = 0
-            new = 0
-            errors = []
-
-            with self.db.connect() as conn:
-                for _, row in df.iterrows():
-                    citrix = row['Citrix UID']
-                    acd = row['ACD ID']
-                    name = row['Name']
-
-                    data = {
-                        'acd_id': acd,
-                        'name': name,
-                        'premises': row.get('Premises'),
-                        'segment': row.get('Segment'),
-                        'queue': row.get('Queue'),
-                        'language': row.get('Language'),
-                        'batch': row.get('Batch'),
-                        'date_of_join': row.get('Date of Join'),
-                        'certified_date': row.get('Certified Date'),
-                        'go_live_date': row.get('Go Live Date'),
-                        'team_leader': row.get('Team Leaders'),
-                        'supervisor': row.get('Supervisor'),
-                        'manager': row.get('Manger'),
-                        'status': row.get('Status', 'Active'),
-                    }
-
-                    for k, v in data.items():
-                        if pd.isna(v):
-                            data[k] = None
-
-                    columns = ','.join(data.keys())
-                    placeholders = ','.join(['?' for _ in data])
-                    values = [citrix] + list(data.values())
-
-                    existing = conn.execute(
-                        "SELECT citrix_uid FROM agents_master WHERE acd_id = ? AND citrix_uid != ?",
-                        (acd, citrix)
-                    ).fetchone()
-                    if existing:
-                        errors.append(f"ACD ID {acd} already assigned to {existing['citrix_uid']}, skipping {citrix}")
-                        continue
-
-                    conn.execute(f"""
-                        INSERT INTO agents_master (citrix_uid, {columns}) 
-                        VALUES (?, {placeholders})
-                        ON CONFLICT(citrix_uid) DO UPDATE SET 
-                            acd_id = excluded.acd_id,
-                            name = excluded.name,
-                            premises = excluded.premises,
-                            segment = excluded.segment,
-                            queue = excluded.queue,
-                            language = excluded.language,
-                            batch = excluded.batch,
-                            date_of_join = excluded.date_of_join,
-                            certified_date = excluded.certified_date,
-                            go_live_date = excluded.go_live_date,
-                            team_leader = excluded.team_leader,
-                            supervisor = excluded.supervisor,
-                            manager = excluded.manager,
-                            status = excluded.status,
-                            updated_at = CURRENT_TIMESTAMP
-                    """, values)
-
-                    new += 1
-
-                conn.commit()
-
-            result = {"success": True, "agents_updated": updated, "new_agents": new}
-            if errors:
-                result["warnings"] = errors
-            return result
-
+            timer = StageTimer('upload.headcount', file=file.name)
+            parsed = parse_headcount(file.name, read_upload(file))
+            if not parsed['success']:
+                return parsed
+            timer.lap('parse', rows=len(parsed['df']))
+            return self.write_headcount(parsed, progress=progress)
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    @track_upload('headcount')
+    def write_headcount(self, parsed, progress=None):
+        """Upsert the parsed HC rows into agents_master."""
+        df = parsed['df']
+        timer = StageTimer('upload.headcount', file=parsed.get('file_name'))
+        updated = 0
+        new = 0
+        errors = []
+
+        # Column order of `data` below matches the agents.upsert statement
+        upsert = sql('agents.upsert')
+        with self.db.connect() as conn:
+            sink = ErrorSink(self.db, parsed.get('file_name'), 'HC', conn=conn)
+            for pos, (_, row) in enumerate(df.iterrows()):
+                if progress and pos % PROGRESS_EVERY == 0:
+                    progress(pos, len(df))
+                citrix = row['Citrix UID']
+                acd = row['ACD ID']
+                name = row['Name']
+
+                data = {
+                    'acd_id': acd,
+                    'name': name,
+                    'premises': row.get('Premises'),
+                    'segment': row.get('Segment'),
+                    'queue': row.get('Queue'),
+                    'language': row.get('Language'),
+                    'batch': row.get('Batch'),
+                    'date_of_join': row.get('Date of Join'),
+                    'certified_date': row.get('Certified Date'),
+                    'go_live_date': row.get('Go Live Date'),
+                    'team_leader': row.get('Team Leaders'),
+                    'supervisor': row.get('Supervisor'),
+                    'manager': row.get('Manger'),
+                    'status': row.get('Status', 'Active'),
+                }
+
+                for k, v in data.items():
+                    if pd.isna(v):
+                        data[k] = None
+
+                values = [citrix] + list(data.values())
+
+                existing = conn.execute(sql('agents.acd_conflict'), (acd, citrix)).fetchone()
+                if existing:
+                    errors.append(f"ACD ID {acd} already assigned to {existing['citrix_uid']}, skipping {citrix}")
+                    sink.add('DUPLICATE_ACD', raw_data=errors[-1], agent_name=name, acd_id=acd)
+                    continue
+
+                conn.execute(upsert, values)
+
+                new += 1
+
+            sink.flush()
+            conn.commit()
+            timer.lap('insert', rows=new)
+            note_bulk_load(self.db, 'agents_master', new)
+            IdentityResolver(self.db).invalidate()
+            if progress:
+                progress(len(df), len(df))
+
+        self.audit.log_action(action='UPLOAD_HC', entity_name='agents_master',
+                              entity_key=parsed.get('file_name'),
+                              new_value={"agents": new, "skipped": len(errors)})
+
+        result = {"success": True, "agents_updated": updated, "new_agents": new,
+                  "error_summary": sink.summary()}
+        # Duplicate rows dropped by parse_headcount first, then skipped ACD conflicts
+        warnings = list(parsed.get('warnings') or []) + errors
+        if warnings:
+            result["warnings"] = warnings
+        return result
+
     # ---------- Roster ----------
-    def process_roster(self, file, mapping, year_month):
+    def process_roster(self, file, mapping, year_month, progress=None):
         """معالجة ملف Roster (جدول المناوبات)"""
         try:
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(file)
-            else:
-                df = pd.read_excel(file)
-
-            name_col = mapping['name_col']
-            citrix_col = mapping.get('citrix_col')
-            acd_col = mapping.get('acd_col')
-            login_col = mapping.get('login_col')
-            date_cols = mapping['date_cols']
-
-            if name_col not in df.columns:
-                return {"success": False, "error": f"Column '{name_col}' not found."}
-            for col in date_cols:
-                if col not in df.columns:
-                    return {"success": False, "error": f"Date column '{col}' not found."}
-
-            id_vars = [name_col]
-            if citrix_col and citrix_col != 'None' and citrix_col in df.columns:
-                id_vars.append(citrix_col)
-            if acd_col and acd_col != 'None' and acd_col in df.columns:
-                id_vars.append(acd_col)
-            if login_col and login_col != 'None' and login_col in df.columns:
-                id_vars.append(login_col)
-
-            melted = df.melt(id_vars=id_vars, value_vars=date_cols,
-                             var_name='raw_date', value_name='raw_shift')
-
-            try:
-                melted['shift_date'] = pd.to_datetime(melted['raw_date'], format='%d-%b-%y', errors='coerce')
-            except:
-                melted['shift_date'] = pd.to_datetime(melted['raw_date'], errors='coerce')
-            melted = melted.dropna(subset=['shift_date'])
-
-            melted['normalized_shift'] = melted['raw_shift'].apply(self.normalizer.normalize)
+            timer = StageTimer('upload.roster', file=file.name)
+            parsed = parse_roster(file.name, read_upload(file), mapping)
+            if not parsed['success']:
+                return parsed
+            timer.lap('parse', rows=len(parsed['df']))
+            return self.write_roster(parsed, file.name, year_month, progress=progress)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
 
-            unknown_agents = []
-            records = []
-
-            with self.db.connect() as conn:
-                agent_map = {}
-                cur = conn.execute("SELECT citrix_uid, acd_id, login_id, name FROM agents_master")
-                for row in cur:
-                    if row['citrix_uid']:
-                        agent_map[row['citrix_uid'].strip()] = row['citrix_uid']
-                    if row['name']:
-                        agent_map[row['name'].strip()] = row['citrix_uid']
-                    if row['acd_id']:
-                        agent_map[str(row['acd_id']).strip()] = row['citrix_uid']
-                    if row['login_id']:
-                        agent_map[str(row['login_id']).strip()] = row['citrix_uid']
-
-                for _, row in melted.iterrows():
-                    citrix = None
-                    if citrix_col and citrix_col != 'None' and pd.notna(row.get(citrix_col)):
-                        citrix = agent_map.get(str(row[citrix_col]).strip())
-                    if not citrix and acd_col and acd_col != 'None' and pd.notna(row.get(acd_col)):
-                        citrix = agent_map.get(str(row[acd_col]).strip())
-                    if not citrix and login_col and login_col != 'None' and pd.notna(row.get(login_col)):
-                        citrix = agent_map.get(str(row[login_col]).strip())
-                    if not citrix and pd.notna(row[name_col]):
-                        citrix = agent_map.get(str(row[name_col]).strip())
+    @track_upload('roster')
+    def write_roster(self, parsed, file_name, year_month, progress=None):
+        """Resolve agents, normalize shifts and insert roster_original/roster_live rows."""
+        self.db.ensure_monthly_tables(year_month)
+        melted = parsed['df']
+        mapping = parsed['mapping']
+        name_col = mapping['name_col']
+        citrix_col = mapping.get('citrix_col')
+        acd_col = mapping.get('acd_col')
+        login_col = mapping.get('login_col')
+
+        timer = StageTimer('upload.roster', file=file_name)
+        # Each distinct raw shift is normalized once
+        shift_map = {raw: self.normalizer.normalize(raw) for raw in melted['raw_shift'].unique()}
+        melted = melted.assign(normalized_shift=melted['raw_shift'].map(shift_map))
+        # Distinct unreadable values with their row counts, for the Shift Dictionary page
+        unknown_shifts = collect_unknown(melted['raw_shift'], shift_map)
+        timer.lap('normalize', rows=len(shift_map))
+
+        unknown_agents = []
+        records = []
 
+        with self.db.connect() as conn:
+            sink = ErrorSink(self.db, file_name, 'Roster', conn=conn)
+            agent_map = {}
+            cur = conn.execute("SELECT citrix_uid, acd_id, login_id, name FROM agents_master")
+            for row in cur:
+                if row['citrix_uid']:
+                    agent_map[row['citrix_uid'].strip()] = row['citrix_uid']
+                if row['name']:
+                    agent_map[row['name'].strip()] = row['citrix_uid']
+                if row['acd_id']:
+                    agent_map[str(row['acd_id']).strip()] = row['citrix_uid']
+                if row['login_id']:
+                    agent_map[str(row['login_id']).strip()] = row['citrix_uid']
+            # Spelling variants and confirmed aliases, one lookup per distinct name
+            names = IdentityResolver(self.db).index(conn)
+            by_name = {}
+
+            for pos, (_, row) in enumerate(melted.iterrows()):
+                if progress and pos % PROGRESS_EVERY == 0:
+                    progress(pos, len(melted))
+                citrix = None
+                if citrix_col and citrix_col != 'None' and pd.notna(row.get(citrix_col)):
+                    citrix = agent_map.get(str(row[citrix_col]).strip())
+                if not citrix and acd_col and acd_col != 'None' and pd.notna(row.get(acd_col)):
+                    citrix = agent_map.get(str(row[acd_col]).strip())
+                if not citrix and login_col and login_col != 'None' and pd.notna(row.get(login_col)):
+                    citrix = agent_map.get(str(row[login_col]).strip())
+                if not citrix and pd.notna(row[name_col]):
+                    name = str(row[name_col]).strip()
+                    citrix = agent_map.get(name)
                     if not citrix:
-                        unknown_agents.append(str(row[name_col]))
-                        continue
-
-                    records.append((
-                        citrix,
-                        row.get(acd_col) if acd_col and acd_col != 'None' else None,
-                        row['shift_date'].date(),
-                        row['raw_shift'],
-                        row['normalized_shift'],
-                        file.name
-                    ))
-
-                if records:
-                    conn.executemany(f"""
-                        INSERT INTO roster_original_{year_month}
-                        (citrix_uid, acd_id, shift_date, scheduled_shift, normalized_shift, source_file)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    """, records)
-
-                    conn.executemany(f"""
-                        INSERT INTO roster_live_{year_month}
-                        (citrix_uid, acd_id, shift_date, scheduled_shift, normalized_shift, shift_source, source_file)
-                        VALUES (?, ?, ?, ?, ?, 'Planner', ?)
-                    """, records)
-
-                    conn.commit()
-
-            return {
-                "success": True,
-                "rows_processed": len(records),
-                "unknown_agents": unknown_agents
-            }
-
-        except Exception as e:
-            return {"success": False, "error": str(e)}
+                        if name not in by_name:
+                            agent = names.lookup(name)
+                            by_name[name] = agent['citrix_uid'] if agent else None
+                        citrix = by_name[name]
+
+                if not citrix:
+                    unknown_agents.append(str(row[name_col]))
+                    # roster_original row without the agent, loaded if an alias is confirmed
+                    sink.add('UNKNOWN_AGENT', raw_data=row['raw_shift'], agent_name=str(row[name_col]),
+                             shift_date=row['shift_date'].date(),
+                             payload={"family": "roster", "year_month": year_month, "row": [
+                                 None,
+                                 row.get(acd_col) if acd_col and acd_col != 'None' else None,
+                                 row['shift_date'].date(), row['raw_shift'], row['normalized_shift'],
+                                 file_name]})
+                    continue
+
+                records.append((
+                    citrix,
+                    row.get(acd_col) if acd_col and acd_col != 'None' else None,
+                    row['shift_date'].date(),
+                    row['raw_shift'],
+                    row['normalized_shift'],
+                    file_name
+                ))
+            name_candidates = names.resolve_many(unknown_agents)
+            timer.lap('resolve', rows=len(melted))
+
+            if records:
+                conn.executemany(sql('roster_original.insert', year_month), records)
+                # roster_live has no source_file column
+                conn.executemany(sql('roster_live.insert', year_month), [r[:5] for r in records])
+
+            sink.flush()
+            conn.commit()
+            timer.lap('insert', rows=len(records))
+            note_bulk_load(self.db, f"roster_live_{year_month}", len(records))
+            note_bulk_load(self.db, f"roster_original_{year_month}", len(records))
+            if progress:
+                progress(len(melted), len(melted))
+
+        self.audit.log_action(action='UPLOAD_ROSTER', entity_name=f"roster_live_{year_month}",
+                              entity_key=file_name,
+                              new_value={"rows": len(records), "unknown_agents": len(unknown_agents),
+                                         "unknown_shifts": len(unknown_shifts)})
+
+        return {
+            "success": True,
+            "rows_processed": len(records),
+            "unknown_agents": unknown_agents,
+            "name_candidates": name_candidates,
+            "unknown_shifts": unknown_shifts,
+            "error_summary": sink.summary()
+        }
 
     # ---------- CMS Productivity ----------
-    def process_cms_productivity(self, file, year_month):
+    def process_cms_productivity(self, file, year_month, progress=None):
         """
         معالجة ملف Agents Productivity Report.
         يتوقع ملف نصي مفصول بعلامة تبويب ويبدأ بسطر عنوان ثم سطر رأس.
         """
         try:
-            if file.name.endswith('.csv') or file.name.endswith('.txt'):
-                df = pd.read_csv(file, sep='\t', skiprows=1, encoding='utf-8')
-            else:
-                df = pd.read_excel(file, skiprows=1)
-
-            df.columns = [str(c).strip().lower().replace(' ', '_') for c in df.columns]
-
-            required = ['date', 'login_id', 'ans_calls', 'handle_time', 'talk_time', 'hold_time', 'acw_time']
-            missing = [c for c in required if c not in df.columns]
-            if missing:
-                return {"success": False, "error": f"Missing columns: {missing}"}
+            content_hash, rejected = self._check_duplicate(file, 'CMS')
+            if rejected:
+                return rejected
+            timer = StageTimer('upload.cms', file=file.name)
+            parsed = parse_cms(file.name, read_upload(file))
+            if not parsed['success']:
+                return parsed
+            timer.lap('parse', rows=len(parsed['df']))
+            return self.write_cms(parsed, file, year_month, content_hash, progress=progress)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
 
-            batch_id = hashlib.md5(f"{datetime.now()}{file.name}".encode()).hexdigest()[:10]
-            inserted = 0
+    @track_upload('cms')
+    def write_cms(self, parsed, file, year_month, content_hash, progress=None):
+        """Resolve logins and insert parsed CMS rows as one ledger batch."""
+        df = parsed['df']
+        timer = StageTimer('upload.cms', file=file.name)
+        batch_id = hashlib.md5(f"{datetime.now()}{file.name}".encode()).hexdigest()[:10]
+        try:
+            self.db.ensure_monthly_tables(year_month)
+            self.ledger.start(batch_id, content_hash, 'cms_raw', year_month, file)
             unknown_logins = set()
+            unknown_names = set()
             errors = []
+            records = []
 
             with self.db.connect() as conn:
-                for idx, row in df.iterrows():
-                    login_id = str(row['login_id']).strip()
-                    if not login_id or login_id in ['0', 'Totals']:
-                        continue
-
-                    agent = self._get_agent_by_login(login_id)
+                sink = ErrorSink(self.db, file.name, 'CMS', batch_id, conn=conn)
+                lookup = self._load_login_lookup(conn)
+                # Unknown login: fall back to the name (exact spelling variant or confirmed alias)
+                names = IdentityResolver(self.db).index(conn)
+                for pos, row in enumerate(df.itertuples(index=False)):
+                    if progress and pos % PROGRESS_EVERY == 0:
+                        progress(pos, len(df))
+                    agent = lookup.get(row.login_id) or names.lookup(row.name)
                     if not agent:
-                        unknown_logins.add(login_id)
+                        unknown_logins.add(row.login_id)
+                        unknown_names.add(row.name)
+                        payload = None if row.parse_error else {
+                            "family": "cms_raw", "year_month": year_month, "row": [
+                                row.report_date, row.name, row.login_id, None, None,
+                                row.ans_calls, row.handle_time, row.avail_time, row.staffed_time,
+                                row.talk_time, row.hold_time, row.acw_time, batch_id]}
+                        sink.add('UNKNOWN_LOGIN', raw_data=row.login_id, agent_name=row.name,
+                                 login_id=row.login_id, shift_date=row.report_date, payload=payload)
                         continue
-
-                    citrix_uid = agent['citrix_uid']
-                    acd_id = agent.get('acd_id')
-
-                    # تحويل التاريخ
-                    try:
-                        date_val = row['date']
-                        if isinstance(date_val, str):
-                            for fmt in ('%d/%m/%Y', '%Y-%m-%d', '%d-%b-%y'):
-                                try:
-                                    report_date = datetime.strptime(date_val, fmt).date()
-                                    break
-                                except:
-                                    continue
-                            else:
-                                report_date = pd.to_datetime(date_val).date()
-                        else:
-                            report_date = pd.to_datetime(date_val).date()
-                    except Exception as e:
-                        errors.append(f"Row {idx}: invalid date {row['date']}")
+                    if row.parse_error:
+                        errors.append(row.parse_error)
+                        sink.add('INVALID_DATE', raw_data=row.parse_error, agent_name=row.name,
+                                 login_id=row.login_id, acd_id=agent['acd_id'])
                         continue
 
-                    def to_int(val):
-                        if pd.isna(val):
-                            return 0
-                        try:
-                            return int(float(str(val).replace(',', '')))
-                        except:
-                            return 0
-
-                    ans_calls = to_int(row.get('ans_calls', 0))
-                    handle_time = to_int(row.get('handle_time', 0))
-                    talk_time = to_int(row.get('talk_time', 0))
-                    hold_time = to_int(row.get('hold_time', 0))
-                    acw_time = to_int(row.get('acw_time', 0))
-                    avail_time = to_int(row.get('avail_time', 0))
-                    staffed_time = to_int(row.get('staffed_time', 0))
-
-                    conn.execute(f"""
-                        INSERT INTO cms_raw_{year_month}
-                        (report_date, agent_name, login_id, citrix_uid, acd_id,
-                         ans_calls, handle_time_sec, avail_time_sec, staffed_time_sec,
-                         talk_time_sec, hold_time_sec, acw_time_sec, upload_batch)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        report_date,
-                        row.get('name', ''),
-                        login_id,
-                        citrix_uid,
-                        acd_id,
-                        ans_calls,
-                        handle_time,
-                        avail_time,
-                        staffed_time,
-                        talk_time,
-                        hold_time,
-                        acw_time,
+                    records.append((
+                        row.report_date,
+                        row.name,
+                        row.login_id,
+                        agent['citrix_uid'],
+                        agent['acd_id'],
+                        row.ans_calls,
+                        row.handle_time,
+                        row.avail_time,
+                        row.staffed_time,
+                        row.talk_time,
+                        row.hold_time,
+                        row.acw_time,
                         batch_id
                     ))
-                    inserted += 1
+                name_candidates = names.resolve_many(unknown_names)
+                timer.lap('resolve', rows=len(df))
+
+                conn.executemany(sql('cms_raw.insert', year_month), records)
 
+                sink.flush()
+                overlap_warnings, overlaps = self._finish_batch(conn, batch_id)
                 conn.commit()
+                timer.lap('insert', rows=len(records))
+                note_bulk_load(self.db, f"cms_raw_{year_month}", len(records))
+                if progress:
+                    progress(len(df), len(df))
+
+            self.audit.log_action(action='UPLOAD_CMS', entity_name=f"cms_raw_{year_month}",
+                                  entity_key=batch_id,
+                                  new_value={"file": file.name, "rows": len(records),
+                                             "errors": sum(sink.counts.values())})
 
+            errors.extend(overlap_warnings)
             return {
                 "success": True,
-                "rows_processed": inserted,
+                "rows_processed": len(records),
                 "unknown_agents": list(unknown_logins)[:10],
-                "warnings": errors if errors else None
+                "name_candidates": name_candidates,
+                "warnings": errors if errors else None,
+                "upload_batch": batch_id,
+                "overlapping_batches": overlaps,
+                "error_summary": sink.summary()
             }
 
         except Exception as e:
+            self.ledger.fail(batch_id, e)
             return {"success": False, "error": str(e)}
 
     # ---------- Aspect / EIM ----------
-    def process_aspect(self, file, year_month):
-        return self._process_login_logout(file, year_month, table_prefix='aspect_raw')
+    def process_aspect(self, file, year_month, progress=None):
+        return self._process_login_logout(file, year_month, table_prefix='aspect_raw', progress=progress)
 
-    def process_eim(self, file, year_month):
-        return self._process_login_logout(file, year_month, table_prefix='eim_raw')
+    def process_eim(self, file, year_month, progress=None):
+        return self._process_login_logout(file, year_month, table_prefix='eim_raw', progress=progress)
 
-    def _process_login_logout(self, file, year_month, table_prefix):
+    def _process_login_logout(self, file, year_month, table_prefix, progress=None):
         """
         معالجة ملفات تسجيل الدخول/الخروج (Aspect/EIM).
         تتعامل مع ملفات EIM و Login-Logout بشكل موحد.
         """
         try:
-            # قراءة الملف كله للبحث عن الرأس
-            content = file.read().decode('utf-8', errors='ignore')
-            file.seek(0)
-            lines = content.splitlines()
-
-            # البحث عن سطر الرأس الذي يحتوي على Agent Name و Date
-            header_idx = None
-            for i, line in enumerate(lines[:20]):  # نبحث في أول 20 سطر فقط
-                if 'Agent Name' in line and 'Date' in line:
-                    header_idx = i
-                    break
-                if 'Agent name' in line.lower() and 'date' in line.lower():
-                    header_idx = i
-                    break
+            source_type = 'EIM' if table_prefix == 'eim_raw' else 'Aspect'
+            content_hash, rejected = self._check_duplicate(file, source_type)
+            if rejected:
+                return rejected
+            timer = StageTimer(f"upload.{source_type.lower()}", file=file.name)
+            parsed = parse_login_logout(file.name, read_upload(file))
+            if not parsed['success']:
+                return parsed
+            timer.lap('parse', rows=len(parsed['df']))
+            return self.write_login_logout(parsed, file, year_month, table_prefix, content_hash,
+                                           progress=progress)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
 
-            # إذا لم نجد، نبحث عن أي سطر يحتوي على Login ID أو Agent
-            if header_idx is None:
-                for i, line in enumerate(lines[:10]):
-                    if 'Login ID' in line or 'Agent' in line:
-                        header_idx = i
-                        break
-
-            # إذا لم نجد، نفترض أن الرأس في السطر الأول
-            if header_idx is None:
-                header_idx = 0
-
-            # إعادة قراءة الملف باستخدام pandas مع التخطي حتى الرأس
-            # نستخدم sep=None للكشف التلقائي عن الفاصل، و on_bad_lines='skip' لتجاهل الصفوف التالفة
-            df = pd.read_csv(
-                file,
-                sep=None,
-                engine='python',
-                skiprows=header_idx,
-                encoding='utf-8',
-                on_bad_lines='skip'
-            )
-
-            # تنظيف أسماء الأعمدة: إلى lower case وإزالة المسافات
-            df.columns = [str(c).strip().lower().replace(' ', '_') for c in df.columns]
-
-            # التعامل مع الأعمدة المكررة (مثل login_time.1, login_time.2)
-            cols = df.columns.tolist()
-            seen = {}
-            unique_cols = []
-            for col in cols:
-                base = col.split('.')[0]
-                if base not in seen:
-                    seen[base] = True
-                    unique_cols.append(col)
-                else:
-                    # نتجاهل الأعمدة المكررة
-                    pass
-            df = df[unique_cols]
-
-            # تعيين event_date من العمود date إذا وجد
-            if 'date' in df.columns:
-                df.rename(columns={'date': 'event_date'}, inplace=True)
-
-            # تعيين login_id
-            if 'login_id' not in df.columns:
-                # البحث عن عمود يشبه login
-                for col in df.columns:
-                    if 'login' in col:
-                        df.rename(columns={col: 'login_id'}, inplace=True)
-                        break
-                else:
-                    # إذا لم نجد، نبحث عن أي عمود id
-                    for col in df.columns:
-                        if 'id' in col:
-                            df.rename(columns={col: 'login_id'}, inplace=True)
-                            break
-
-            # التحقق من وجود الأعمدة الأساسية
-            required = ['login_id', 'event_date']
-            missing = [r for r in required if r not in df.columns]
-            if missing:
-                return {"success": False, "error": f"Missing columns: {missing}"}
-
-            # إزالة الصفوف ذات login_id فارغ
-            df = df.dropna(subset=['login_id'])
-            df['login_id'] = df['login_id'].astype(str).str.strip()
-
-            batch_id = hashlib.md5(f"{datetime.now()}{file.name}".encode()).hexdigest()[:10]
-            inserted = 0
+    @track_upload(lambda self, parsed, file, year_month, table_prefix, *args, **kwargs:
+                  'eim' if table_prefix == 'eim_raw' else 'aspect')
+    def write_login_logout(self, parsed, file, year_month, table_prefix, content_hash, progress=None):
+        """Resolve logins and insert parsed Aspect/EIM sessions as one ledger batch."""
+        df = parsed['df']
+        source_type = 'EIM' if table_prefix == 'eim_raw' else 'Aspect'
+        timer = StageTimer(f"upload.{source_type.lower()}", file=file.name)
+        batch_id = hashlib.md5(f"{datetime.now()}{file.name}".encode()).hexdigest()[:10]
+        try:
+            self.db.ensure_monthly_tables(year_month)
+            self.ledger.start(batch_id, content_hash, table_prefix, year_month, file)
             unknown_logins = set()
+            unknown_names = set()
             errors = []
+            records = []
 
             with self.db.connect() as conn:
-                for idx, row in df.iterrows():
-                    login_id = row['login_id']
-                    if not login_id or login_id in ['0', 'Totals']:
-                        continue
-
-                    agent = self._get_agent_by_login(login_id)
+                sink = ErrorSink(self.db, file.name, source_type, batch_id, conn=conn)
+                lookup = self._load_login_lookup(conn)
+                # Unknown login: fall back to the name (exact spelling variant or confirmed alias)
+                names = IdentityResolver(self.db).index(conn)
+                for pos, row in enumerate(df.itertuples(index=False)):
+                    if progress and pos % PROGRESS_EVERY == 0:
+                        progress(pos, len(df))
+                    agent = lookup.get(row.login_id) or names.lookup(row.agent_name)
                     if not agent:
-                        unknown_logins.add(login_id)
+                        unknown_logins.add(row.login_id)
+                        unknown_names.add(row.agent_name)
+                        payload = None if row.parse_error else {
+                            "family": table_prefix, "year_month": year_month, "row": [
+                                row.agent_name, row.login_id, None, None, row.event_date,
+                                row.login_dt, row.logout_dt, row.logout_reason,
+                                row.session_duration_sec, batch_id]}
+                        sink.add('UNKNOWN_LOGIN', raw_data=row.login_id, agent_name=row.agent_name,
+                                 login_id=row.login_id, shift_date=row.event_date, payload=payload)
                         continue
-
-                    citrix_uid = agent['citrix_uid']
-                    acd_id = agent.get('acd_id')
-
-                    # تاريخ الحدث
-                    try:
-                        date_val = row['event_date']
-                        if isinstance(date_val, str):
-                            for fmt in ('%d/%m/%Y', '%Y-%m-%d', '%d-%b-%y'):
-                                try:
-                                    event_date = datetime.strptime(date_val, fmt).date()
-                                    break
-                                except:
-                                    continue
-                            else:
-                                event_date = pd.to_datetime(date_val).date()
-                        else:
-                            event_date = pd.to_datetime(date_val).date()
-                    except Exception as e:
-                        errors.append(f"Row {idx}: invalid event_date {row.get('event_date')}")
+                    if row.parse_error:
+                        errors.append(row.parse_error)
+                        sink.add('INVALID_DATE', raw_data=row.parse_error, agent_name=row.agent_name,
+                                 login_id=row.login_id, acd_id=agent['acd_id'])
                         continue
 
-                    # أوقات الدخول والخروج
-                    login_time = row.get('login_time')
-                    logout_time = row.get('logout_time')
-                    logout_date_str = row.get('logout_date')
-
-                    login_dt = None
-                    logout_dt = None
-                    duration = 0
-
-                    if login_time and login_time != '0' and pd.notna(login_time):
-                        try:
-                            if isinstance(login_time, str):
-                                login_dt = datetime.strptime(login_time.strip(), '%I:%M%p')
-                                login_dt = login_dt.replace(year=event_date.year, month=event_date.month, day=event_date.day)
-                            else:
-                                login_dt = pd.to_datetime(login_time).to_pydatetime()
-                        except:
-                            pass
-
-                    if logout_time and logout_time != '0' and pd.notna(logout_time):
-                        try:
-                            logout_date = event_date
-                            if logout_date_str and pd.notna(logout_date_str):
-                                try:
-                                    logout_date = datetime.strptime(str(logout_date_str).strip(), '%d/%m/%Y').date()
-                                except:
-                                    pass
-                            if isinstance(logout_time, str):
-                                logout_dt = datetime.strptime(logout_time.strip(), '%I:%M%p')
-                                logout_dt = logout_dt.replace(year=logout_date.year, month=logout_date.month, day=logout_date.day)
-                            else:
-                                logout_dt = pd.to_datetime(logout_time).to_pydatetime()
-                        except:
-                            pass
-
-                    if login_dt and logout_dt:
-                        duration = int((logout_dt - login_dt).total_seconds())
-                        if duration < 0:
-                            duration = 0
-
-                    logout_reason = row.get('logout_reason', '')
-
-                    conn.execute(f"""
-                        INSERT INTO {table_prefix}_{year_month}
-                        (agent_name, login_id, citrix_uid, acd_id, event_date,
-                         login_time, logout_time, logout_reason, session_duration_sec,
-                         upload_batch)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        row.get('agent_name', ''),
-                        login_id,
-                        citrix_uid,
-                        acd_id,
-                        event_date,
-                        login_dt,
-                        logout_dt,
-                        logout_reason,
-                        duration,
+                    records.append((
+                        row.agent_name,
+                        row.login_id,
+                        agent['citrix_uid'],
+                        agent['acd_id'],
+                        row.event_date,
+                        row.login_dt,
+                        row.logout_dt,
+                        row.logout_reason,
+                        row.session_duration_sec,
                         batch_id
                     ))
-                    inserted += 1
+                name_candidates = names.resolve_many(unknown_names)
+                timer.lap('resolve', rows=len(df))
+
+                conn.executemany(sql(f'{table_prefix}.insert', year_month), records)
 
+                sink.flush()
+                overlap_warnings, overlaps = self._finish_batch(conn, batch_id)
                 conn.commit()
+                timer.lap('insert', rows=len(records))
+                note_bulk_load(self.db, f"{table_prefix}_{year_month}", len(records))
+                if progress:
+                    progress(len(df), len(df))
+
+            self.audit.log_action(action=f"UPLOAD_{source_type.upper()}",
+                                  entity_name=f"{table_prefix}_{year_month}", entity_key=batch_id,
+                                  new_value={"file": file.name, "rows": len(records),
+                                             "errors": sum(sink.counts.values())})
 
+            errors.extend(overlap_warnings)
             return {
                 "success": True,
-                "rows_processed": inserted,
+                "rows_processed": len(records),
                 "unknown_agents": list(unknown_logins)[:10],
-                "warnings": errors if errors else None
+                "name_candidates": name_candidates,
+                "warnings": errors if errors else None,
+                "upload_batch": batch_id,
+                "overlapping_batches": overlaps,
+                "error_summary": sink.summary()
             }
 
         except Exception as e:
-            return {"success": False, "error": str(e)}
\ No newline at end of file
+            self.ledger.fail(batch_id, e)
+            return {"success": False, "error": str(e)}
@@ -0,0 +1,201 @@
+# modules/upload_ledger.py
+import hashlib
+from datetime import datetime
+
+import pandas as pd
+
+from modules.intraday import IntradayTracker
+
+# Activity tables tracked by the ledger and the date column of each.
+LEDGER_TABLES = {
+    'cms_raw': ('CMS', 'report_date'),
+    'aspect_raw': ('Aspect', 'event_date'),
+    'eim_raw': ('EIM', 'event_date'),
+}
+
+
+class UploadLedger:
+    """
+    One row per uploaded activity file (CMS / Aspect / EIM).
+
+    The content hash lets handlers reject an identical file before parsing,
+    the stored (min_date, max_date) range narrows overlap checks to batches
+    that can actually collide, and every batch can be rolled back with a
+    single DELETE on the indexed upload_batch column.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    @staticmethod
+    def hash_file(file):
+        """sha256 of the uploaded file content; leaves the file rewound."""
+        file.seek(0)
+        digest = hashlib.sha256()
+        # Ends on any empty chunk: b'' from binary uploads, '' from text-mode files
+        while chunk := file.read(1 << 20):
+            digest.update(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8'))
+        file.seek(0)
+        return digest.hexdigest()
+
+    def find_duplicate(self, content_hash, source_type):
+        """Completed batch with the same content and source, if any."""
+        with self.db.connect() as conn:
+            row = conn.execute("""
+                SELECT batch_id, file_name, started_at, row_count
+                FROM upload_ledger
+                WHERE content_hash = ? AND source_type = ? AND status = 'Completed'
+                ORDER BY started_at DESC LIMIT 1
+            """, (content_hash, source_type)).fetchone()
+        return dict(row) if row else None
+
+    def start(self, batch_id, content_hash, table_prefix, year_month, file, uploaded_by=None):
+        source_type = LEDGER_TABLES[table_prefix][0]
+        size = getattr(file, 'size', None)
+        with self.db.connect() as conn:
+            conn.execute("""
+                INSERT INTO upload_ledger
+                (batch_id, content_hash, source_type, target_table, year_month,
+                 file_name, file_size, status, started_at, uploaded_by)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 'Processing', ?, ?)
+            """, (batch_id, content_hash, source_type, f"{table_prefix}_{year_month}",
+                  year_month, file.name, size, datetime.now(), uploaded_by))
+            conn.commit()
+
+    def finish(self, conn, batch_id, status='Completed', notes=None):
+        """
+        Record row count, agent count and date range of a batch from its
+        inserted rows. Runs on the caller's connection so it commits together
+        with the data.
+        """
+        ledger = conn.execute(
+            "SELECT target_table, started_at FROM upload_ledger WHERE batch_id = ?", (batch_id,)
+        ).fetchone()
+        if not ledger:
+            return None
+        table = ledger['target_table']
+        date_col = LEDGER_TABLES[table.rsplit('_', 2)[0]][1]
+        stats = conn.execute(f"""
+            SELECT COUNT(*) AS row_count, COUNT(DISTINCT citrix_uid) AS agent_count,
+                   MIN({date_col}) AS min_date, MAX({date_col}) AS max_date
+            FROM {table} WHERE upload_batch = ?
+        """, (batch_id,)).fetchone()
+        finished = datetime.now()
+        started = pd.to_datetime(ledger['started_at']).to_pydatetime()
+        conn.execute("""
+            UPDATE upload_ledger
+            SET row_count = ?, agent_count = ?, min_date = ?, max_date = ?, status = ?,
+                finished_at = ?, duration_sec = ?, notes = ?
+            WHERE batch_id = ?
+        """, (stats['row_count'], stats['agent_count'], stats['min_date'], stats['max_date'],
+              status, finished, round((finished - started).total_seconds(), 3), notes, batch_id))
+        return dict(stats)
+
+    def refresh_counts(self, conn, batch_id):
+        """Re-count a finished batch after rows were added to it (alias confirmations)."""
+        ledger = conn.execute(
+            "SELECT target_table FROM upload_ledger WHERE batch_id = ?", (batch_id,)
+        ).fetchone()
+        if not ledger:
+            return None
+        date_col = LEDGER_TABLES[ledger['target_table'].rsplit('_', 2)[0]][1]
+        conn.execute(f"""
+            UPDATE upload_ledger SET
+                (row_count, agent_count, min_date, max_date) = (
+                    SELECT COUNT(*), COUNT(DISTINCT citrix_uid), MIN({date_col}), MAX({date_col})
+                    FROM {ledger['target_table']} WHERE upload_batch = ?)
+            WHERE batch_id = ?
+        """, (batch_id, batch_id))
+
+    def fail(self, batch_id, error):
+        with self.db.connect() as conn:
+            conn.execute("""
+                UPDATE upload_ledger SET status = 'Failed', finished_at = ?, notes = ?
+                WHERE batch_id = ?
+            """, (datetime.now(), str(error)[:500], batch_id))
+            conn.commit()
+
+    def find_overlaps(self, conn, batch_id):
+        """
+        Earlier completed batches sharing at least one (agent, date) with batch_id,
+        as {batch_id: overlapping_rows}. Only batches whose ledger date range
+        intersects this one are joined.
+        """
+        ledger = conn.execute(
+            "SELECT target_table, min_date, max_date FROM upload_ledger WHERE batch_id = ?",
+            (batch_id,)
+        ).fetchone()
+        if not ledger or ledger['min_date'] is None:
+            return {}
+        candidates = [r['batch_id'] for r in conn.execute("""
+            SELECT batch_id FROM upload_ledger
+            WHERE target_table = ? AND status = 'Completed' AND batch_id != ?
+              AND min_date <= ? AND max_date >= ?
+        """, (ledger['target_table'], batch_id, ledger['max_date'], ledger['min_date']))]
+        if not candidates:
+            return {}
+
+        table = ledger['target_table']
+        date_col = LEDGER_TABLES[table.rsplit('_', 2)[0]][1]
+        placeholders = ','.join('?' for _ in candidates)
+        cur = conn.execute(f"""
+            SELECT o.upload_batch, COUNT(*) AS n
+            FROM {table} o
+            JOIN (SELECT DISTINCT citrix_uid, {date_col} AS d FROM {table}
+                  WHERE upload_batch = ?) b
+              ON o.citrix_uid = b.citrix_uid AND o.{date_col} = b.d
+            WHERE o.upload_batch IN ({placeholders})
+            GROUP BY o.upload_batch
+        """, (batch_id, *candidates))
+        return {row['upload_batch']: row['n'] for row in cur}
+
+    def rollback(self, batch_id, user=None):
+        """
+        Delete every row of a batch and mark it RolledBack. An Aspect/EIM batch
+        already folded into the intraday snapshot has its agents re-folded
+        without it, in the same transaction.
+        """
+        with self.db.connect() as conn:
+            ledger = conn.execute(
+                "SELECT target_table, year_month, status FROM upload_ledger WHERE batch_id = ?", (batch_id,)
+            ).fetchone()
+            if not ledger:
+                return {"success": False, "error": "Batch not found"}
+            if ledger['status'] == 'RolledBack':
+                return {"success": False, "error": "Batch already rolled back"}
+            table = ledger['target_table']
+            # snapshot_date -> agents of this batch on that date
+            folded = {}
+            for (snapshot_date,) in conn.execute(
+                    "SELECT snapshot_date FROM intraday_batches WHERE upload_batch = ?", (batch_id,)).fetchall():
+                folded[snapshot_date] = [r[0] for r in conn.execute(f"""
+                    SELECT DISTINCT citrix_uid FROM {table}
+                    WHERE upload_batch = ? AND event_date = ? AND citrix_uid IS NOT NULL
+                """, (batch_id, snapshot_date))]
+            cur = conn.execute(
+                f"DELETE FROM {table} WHERE upload_batch = ?", (batch_id,)
+            )
+            if folded:
+                tracker = IntradayTracker(self.db)
+                for snapshot_date, agents in folded.items():
+                    tracker.refold_agents(conn, ledger['year_month'], snapshot_date, agents)
+                conn.execute("DELETE FROM intraday_batches WHERE upload_batch = ?", (batch_id,))
+            conn.execute("""
+                UPDATE upload_ledger SET status = 'RolledBack', notes = ?
+                WHERE batch_id = ?
+            """, (f"Rolled back by {user or 'system'} at {datetime.now():%Y-%m-%d %H:%M}", batch_id))
+            conn.commit()
+        return {"success": True, "rows_deleted": cur.rowcount}
+
+    def get_history(self, limit=100):
+        with self.db.connect() as conn:
+            return pd.read_sql_query("""
+                SELECT l.batch_id, l.source_type, l.file_name, l.year_month, l.row_count,
+                       l.agent_count,
+                       (SELECT COUNT(*) FROM error_log e WHERE e.upload_batch = l.batch_id) AS errors,
+                       l.min_date, l.max_date, l.status, l.started_at, l.duration_sec,
+                       l.uploaded_by, l.notes
+                FROM upload_ledger l
+                ORDER BY l.started_at DESC
+                LIMIT ?
+            """, conn, params=(limit,))
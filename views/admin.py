@@ -0,0 +1,93 @@
+# views/admin.py
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+from modules.normalization import ShiftNormalizer
+from modules.shift_learning import ShiftLearner
+
+
+def main(db, audit, load_user):
+    """Admin Panel page: users, shift dictionary and LOB groups."""
+    st.subheader("⚙️ System Settings")
+    tab1, tab2, tab3 = st.tabs(["Users", "Shift Dictionary", "LOB Groups"])
+
+    with tab1:
+        st.write("##### User Management")
+        with db.connect() as conn:
+            users_df = pd.read_sql_query("SELECT citrix_uid, role, full_name, email, is_active FROM user_access", conn)
+        st.dataframe(users_df, use_container_width=True)
+
+        with st.expander("Add New User"):
+            new_citrix = st.text_input("Citrix UID")
+            new_name = st.text_input("Full Name")
+            new_role = st.selectbox("Role", ["OPS", "RTM", "ADMIN", "LEAVES"])
+            new_email = st.text_input("Email")
+            if st.button("Add"):
+                with db.connect() as conn:
+                    old_user = conn.execute(
+                        "SELECT role, full_name, email, is_active FROM user_access WHERE citrix_uid = ?",
+                        (new_citrix,)
+                    ).fetchone()
+                    conn.execute("""
+                        INSERT OR REPLACE INTO user_access (citrix_uid, role, full_name, email, created_at)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, (new_citrix, new_role, new_name, new_email, datetime.now()))
+                    conn.commit()
+                load_user.clear()
+                audit.log_action(action='UPDATE_USER' if old_user else 'CREATE_USER',
+                                 entity_name='user_access', entity_key=new_citrix,
+                                 old_value=dict(old_user) if old_user else None,
+                                 new_value={"role": new_role, "full_name": new_name, "email": new_email})
+                st.success("User added successfully")
+                st.rerun()
+
+    with tab2:
+        st.write("##### Shift Dictionary")
+        learner = ShiftLearner(db, ShiftNormalizer(db))
+        with db.connect() as conn:
+            dictionary_df = pd.read_sql_query("""
+                SELECT raw_pattern, normalized_shift, shift_type, is_active, created_by, created_at
+                FROM shift_dictionary ORDER BY raw_pattern
+            """, conn)
+        st.dataframe(dictionary_df, use_container_width=True, hide_index=True)
+
+        st.write("##### Learn from Unknown Shifts")
+        months = learner.roster_months()
+        if not months:
+            st.caption("No roster months stored yet.")
+        else:
+            year_month = st.selectbox("Roster month", months, index=len(months) - 1)
+            suggestions = learner.suggestions(year_month)
+            if suggestions.empty:
+                st.caption("Every roster value of this month is recognised.")
+            else:
+                st.caption("Proposals read ranges as their start time (9-6 → 09:00). "
+                           "Edit a proposal or untick it before approving.")
+                view = suggestions[['raw_shift', 'rows', 'agents', 'proposed', 'rule', 'reading']].copy()
+                view.insert(0, 'approve', view['proposed'].notna())
+                edited = st.data_editor(view, hide_index=True, use_container_width=True, key=f"learn_{year_month}",
+                                        disabled=['raw_shift', 'rows', 'agents', 'rule', 'reading'])
+                proposed = edited['proposed'].fillna('').astype(str).str.strip()
+                chosen = edited[edited['approve'] & (proposed != '')]
+                if st.button(f"Approve selected ({len(chosen)})", disabled=chosen.empty, key="approve_shifts"):
+                    mappings = dict(zip(chosen['raw_shift'], proposed[chosen.index]))
+                    result = learner.approve(mappings, created_by=st.session_state.user['citrix_uid'],
+                                             year_months=[year_month])
+                    if result['success']:
+                        audit.log_action(action='LEARN_SHIFTS', entity_name='shift_dictionary',
+                                         entity_key=year_month, new_value={"mappings": mappings,
+                                                                           "rows_updated": result['rows_updated']})
+                        st.success(f"Added {result['added']} patterns; "
+                                   f"{result['rows_updated']} roster rows re-normalized.")
+                        if not result['rejected']:
+                            st.rerun()
+                    else:
+                        st.error(result['error'])
+                    if result.get('rejected'):
+                        st.warning("Not saved, use HH:MM (00:00-23:59) or OFF: "
+                                   + ", ".join(f"{raw} → {value}" for raw, value in result['rejected'].items()))
+    with tab3:
+        st.write("##### LOB Groups")
+        st.info("Here you will manage LOB groups.")
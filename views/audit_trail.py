@@ -0,0 +1,58 @@
+# views/audit_trail.py
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+from modules.audit_trail import AuditTrail, LOG_TABLES
+
+
+def main(db, audit):
+    """Audit Trail page: paginated audit/error log viewer and retention."""
+    st.subheader("📋 Audit Log")
+    trail = AuditTrail(db)
+    log_table = st.radio("Log", list(LOG_TABLES), horizontal=True,
+                         format_func=lambda t: "Audit log" if t == 'audit_log' else "Error log")
+    col1, col2 = st.columns(2)
+    with col1:
+        date_range = st.date_input("Date range", value=(datetime.now().date().replace(day=1),
+                                                        datetime.now().date()))
+    filters = {}
+    with col2:
+        filter_cols = st.columns(2)
+        for i, column in enumerate(LOG_TABLES[log_table]['filters'][:2]):
+            options = [''] + trail.distinct_values(log_table, column)
+            filters[column] = filter_cols[i].selectbox(column.replace('_', ' ').title(), options)
+    page_size = st.selectbox("Rows per page", [25, 50, 100, 200], index=1)
+
+    # Cursor stack per filter set: [None, cursor of page 1, cursor of page 2, ...]
+    start = date_range[0] if date_range else None
+    end = (pd.Timestamp(date_range[-1]) + pd.Timedelta(days=1)).date() if date_range else None
+    filter_key = (log_table, start, end, tuple(filters.items()), page_size)
+    if st.session_state.get('audit_filter_key') != filter_key:
+        st.session_state.audit_filter_key = filter_key
+        st.session_state.audit_cursors = [None]
+    cursors = st.session_state.audit_cursors
+
+    page_df, next_cursor = trail.page(log_table, start=start, end=end, cursor=cursors[-1],
+                                      limit=page_size, **filters)
+    st.dataframe(page_df, use_container_width=True, hide_index=True)
+    st.caption("Times and the date range are UTC.")
+    nav1, nav2, nav3 = st.columns([1, 1, 4])
+    if nav1.button("◀ Newer", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    if nav2.button("Older ▶", disabled=next_cursor is None):
+        cursors.append(next_cursor)
+        st.rerun()
+    nav3.caption(f"Page {len(cursors)}")
+
+    with st.expander("Retention"):
+        counts = trail.archive_counts()
+        st.dataframe(pd.DataFrame(counts).T, use_container_width=True)
+        keep_months = st.number_input("Keep months in the live tables", min_value=1, max_value=36, value=6)
+        if st.button("Archive older rows"):
+            moved = trail.archive(months=int(keep_months))
+            audit.log_action(action='ARCHIVE_LOGS', entity_name='audit_log', new_value=moved)
+            st.success(f"Moved to {trail.archive_file}: " +
+                       ", ".join(f"{t} {n}" for t, n in moved.items()))
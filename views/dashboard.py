@@ -0,0 +1,58 @@
+# views/dashboard.py
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+from modules.dashboard import DashboardMetrics
+from modules.interval_engine import IntervalEngine
+from modules.intraday import IntradayTracker
+from modules.session_merge import DEFAULT_GAP_THRESHOLD_SEC, SessionMerger
+
+
+def main(db, audit):
+    """Dashboard page: KPI cards, live adherence, interval staffing and session gaps."""
+    st.subheader("📈 Dashboard")
+    cards = DashboardMetrics(db).get_cards()
+    for col, card in zip(st.columns(4), cards):
+        with col:
+            st.metric(card['label'], card['value'], card['delta'],
+                      delta_color=card['delta_color'], help=card['help'])
+
+    if cards[0]['value'] == "—":
+        st.info("No attendance has been calculated for today yet.")
+
+    st.write("##### Live Adherence")
+    live_df = IntradayTracker(db).get_snapshot()
+    if live_df.empty:
+        st.caption("No roster loaded for today.")
+    else:
+        counts = live_df['adherence_status'].value_counts()
+        for col, (status, n) in zip(st.columns(max(len(counts), 1)), counts.items()):
+            col.metric(status, int(n))
+        st.dataframe(live_df, use_container_width=True, hide_index=True)
+
+    st.write("##### Interval Staffing")
+    curve_date = st.date_input("Date", value=datetime.now().date(), key="curve_date")
+    curve = IntervalEngine(db).get_curve(curve_date.isoformat())
+    if curve.empty:
+        st.caption("No interval curve for this date. Curves are computed after Aspect/EIM uploads.")
+    else:
+        lob = st.selectbox("LOB", sorted(curve['lob_name'].unique()), key="curve_lob")
+        st.line_chart(curve[curve['lob_name'] == lob].set_index('interval_start')[['scheduled', 'logged_in']])
+
+    st.write("##### Session Gaps")
+    try:
+        gaps = SessionMerger(db).gaps_for_date(curve_date)
+    except pd.errors.DatabaseError:
+        gaps = None
+    if gaps is None:
+        st.caption("No session data for this month.")
+    elif gaps.empty:
+        st.caption(f"No logged-out gaps over {DEFAULT_GAP_THRESHOLD_SEC // 60} minutes on {curve_date}.")
+    else:
+        col1, col2 = st.columns(2)
+        col1.metric("Agents with gaps", gaps['citrix_uid'].nunique())
+        col2.metric("Gaps", len(gaps))
+        st.dataframe(gaps.assign(gap_min=(gaps['gap_sec'] / 60).round(1)).drop(columns='gap_sec'),
+                     use_container_width=True, hide_index=True)
@@ -0,0 +1,74 @@
+# views/diagnostics.py
+import streamlit as st
+
+from database import instrumentation
+from modules.maintenance import get_maintenance, size_report
+
+
+def main(db, audit):
+    """Diagnostics page: stage timings, per-statement timings, slow query plans and storage."""
+    st.subheader("🩺 Diagnostics")
+    stats = instrumentation.STATS
+
+    col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
+    enabled = col1.toggle("Statement timing", value=instrumentation.ENABLED,
+                          help="Time every SQL statement on connections opened from now on.")
+    slow_ms = col2.number_input("Slow statement (ms)", min_value=1, value=int(instrumentation.SLOW_MS))
+    explain = col3.toggle("Explain slow statements", value=instrumentation.EXPLAIN_SLOW)
+    if (enabled, slow_ms, explain) != (instrumentation.ENABLED, instrumentation.SLOW_MS,
+                                       instrumentation.EXPLAIN_SLOW):
+        instrumentation.set_enabled(enabled, slow_ms, explain)
+        audit.log_action(action='SET_INSTRUMENTATION', entity_name='diagnostics',
+                         new_value={"enabled": enabled, "slow_ms": slow_ms, "explain": explain})
+    if col4.button("Reset counters"):
+        stats.reset()
+        st.rerun()
+    st.caption(f"Counting since {stats.since:%Y-%m-%d %H:%M:%S}")
+
+    tab1, tab2, tab3, tab4 = st.tabs(["Stages", "Statements", "Slow statements", "Storage"])
+    with tab1:
+        st.write("##### Upload and engine stages")
+        st.dataframe(stats.stage_rows(), use_container_width=True, hide_index=True)
+        with st.expander("Recent stage runs"):
+            st.dataframe(list(stats.recent_stages)[::-1], use_container_width=True, hide_index=True)
+    with tab2:
+        if not instrumentation.ENABLED and not stats.statements:
+            st.info("Statement timing is off.")
+        st.dataframe(stats.statement_rows(), use_container_width=True, hide_index=True,
+                     column_config={"sql": st.column_config.TextColumn("SQL", width="large")})
+    with tab3:
+        slow = stats.slow_statements()
+        if not slow:
+            st.caption("No slow statements recorded.")
+        for item in slow:
+            with st.expander(f"{item['ms']:.0f} ms · {item['at']:%H:%M:%S} · {item['sql'][:80]}"):
+                st.code(item['sql'], language='sql')
+                if item['plan']:
+                    st.code("\n".join(item['plan']))
+    with tab4:
+        maintenance = get_maintenance(db)
+        report = size_report(db)
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Database", f"{report['file_bytes'] / 1e6:,.1f} MB")
+        col2.metric("WAL", f"{report['wal_bytes'] / 1e6:,.1f} MB")
+        col3.metric("Free pages", f"{report['free_pages']:,}", help=f"{report['free_bytes'] / 1e6:,.1f} MB reusable")
+        col4.metric("auto_vacuum", report['auto_vacuum'])
+        st.dataframe(report['tables'], use_container_width=True, hide_index=True)
+
+        st.write("##### Run now")
+        cols = st.columns(4)
+        for col, (label, task, kwargs) in zip(cols, [("ANALYZE", 'analyze', {}),
+                                                      ("Optimize", 'optimize', {}),
+                                                      ("Checkpoint", 'checkpoint', {'mode': 'TRUNCATE'}),
+                                                      ("Vacuum", 'vacuum', {})]):
+            if col.button(label, key=f"maint_{task}"):
+                with st.spinner(f"{label}..."):
+                    result = maintenance.run(task, **kwargs)
+                audit.log_action(action='RUN_MAINTENANCE', entity_name='maintenance_log', entity_key=task,
+                                 new_value=result)
+                if result['success']:
+                    st.success(f"{label} finished in {result['seconds']:.2f}s")
+                else:
+                    st.error(result['error'])
+        with st.expander("Maintenance history"):
+            st.dataframe(maintenance.history(), use_container_width=True, hide_index=True)
@@ -0,0 +1,46 @@
+# views/export.py
+import streamlit as st
+
+from modules.export_utils import EXPORTS, export_frame, to_excel_bytes
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def _export_frame(_db, db_path, export_type, start_date, end_date):
+    """export_frame once per (type, start, end); new uploads show after the TTL."""
+    return export_frame(_db, export_type, start_date, end_date)
+
+
+def main(db, audit):
+    """Export Data page."""
+    st.subheader("📥 Export Data")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.write("##### Export Options")
+        export_type = st.radio("Export Type", list(EXPORTS))
+        start_date = st.date_input("Start Date")
+        end_date = st.date_input("End Date")
+    if start_date > end_date:
+        st.error("Start Date must be on or before End Date.")
+        return
+
+    df = _export_frame(db, db.db_path, export_type, start_date, end_date)
+    with col2:
+        st.write("##### Preview")
+        if df.empty:
+            st.info("No rows in this range.")
+        else:
+            st.caption(f"{len(df):,} rows")
+            st.dataframe(df.head(200), use_container_width=True, hide_index=True)
+    if not df.empty:
+        # The workbook is only built on request, not on every rerun of the page
+        key = (export_type, str(start_date), str(end_date))
+        if st.button("Prepare Excel"):
+            with st.spinner("Building workbook..."):
+                st.session_state.export_xlsx = (key, to_excel_bytes(df, sheet_name=export_type))
+        prepared = st.session_state.get('export_xlsx')
+        if prepared and prepared[0] == key:
+            if st.download_button("Export", data=prepared[1],
+                                  file_name=f"{export_type.lower()}_{start_date}_{end_date}.xlsx",
+                                  mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"):
+                audit.log_action(action='EXPORT', entity_name=export_type,
+                                 new_value={"start": str(start_date), "end": str(end_date), "rows": len(df)})
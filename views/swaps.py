@@ -0,0 +1,84 @@
+# views/swaps.py
+import pandas as pd
+import streamlit as st
+
+from modules.normalization import ShiftNormalizer
+from modules.swap_workflow import SwapManager
+
+
+def main(db, audit):
+    """Swap Manager page: single, bulk and pending requests."""
+    st.subheader("🔄 Swap Requests")
+    swaps = SwapManager(db, ShiftNormalizer(db), audit)
+    current_uid = st.session_state.user['citrix_uid']
+    with st.form("swap_request"):
+        st.write("##### New Swap Request")
+        col1, col2 = st.columns(2)
+        with col1:
+            agent_acd = st.text_input("Agent ACD ID")
+            agent_b_acd = st.text_input("Swap with ACD ID (optional)")
+            swap_date = st.date_input("Swap Date")
+        with col2:
+            new_shift = st.text_input("New Shift (or leave type)")
+            new_shift_b = st.text_input("New Shift for second agent (optional)")
+            leave_type = st.selectbox("Leave Type", ["None", "Sick", "Annual", "Half Day Annual", "Casual", "Ops Update"])
+        submitted = st.form_submit_button("Submit Request")
+        if submitted:
+            result = swaps.create_request(current_uid, agent_acd, agent_b_acd or None, swap_date,
+                                          new_shift, new_shift_b or None, leave_type)
+            if result['success']:
+                st.success(f"Request #{result['swap_id']} submitted.")
+                if result.get('policy_violation'):
+                    st.warning(f"Policy check: {result['policy_violation']}")
+            else:
+                st.error(result['error'])
+
+    with st.expander("Bulk submit (CSV)"):
+        st.caption("Columns: agent_a_acd, agent_b_acd, shift_date, new_shift_a, new_shift_b, leave_type")
+        bulk_file = st.file_uploader("Choose requests file", type=['csv'], key="swap_bulk")
+        if bulk_file and st.button("Submit All", key="swap_bulk_submit"):
+            requests_df = pd.read_csv(bulk_file, dtype=str)
+            result = swaps.submit_many(requests_df.to_dict('records'), current_uid)
+            st.success(f"Submitted {result['submitted']} of {len(requests_df)} requests.")
+            outcome = pd.DataFrame(result['requests'])
+            st.dataframe(pd.concat([requests_df, outcome], axis=1), use_container_width=True, hide_index=True)
+
+    st.write("##### My Pending Requests")
+    st.dataframe(swaps.get_pending_swaps(requester=current_uid), use_container_width=True, hide_index=True)
+
+
+def approvals(db, audit):
+    """Approvals page: review and apply pending swaps in bulk."""
+    st.subheader("✅ Pending Approvals")
+    swaps = SwapManager(db, ShiftNormalizer(db), audit)
+    reviewer = st.session_state.user['citrix_uid']
+    pending_df = swaps.get_pending_swaps()
+    if pending_df.empty:
+        st.info("No pending requests at the moment.")
+    else:
+        view = pending_df[['swap_id', 'shift_date', 'agent_a_name', 'original_shift_a', 'requested_shift_a',
+                           'agent_b_name', 'original_shift_b', 'requested_shift_b', 'leave_type',
+                           'policy_violation', 'requester_citrix']].copy()
+        view.insert(0, 'select', False)
+        edited = st.data_editor(view, hide_index=True, use_container_width=True,
+                                disabled=[c for c in view.columns if c != 'select'])
+        selected_ids = edited.loc[edited['select'], 'swap_id'].tolist()
+        clean_ids = pending_df.loc[pending_df['policy_violation'].isna(), 'swap_id'].tolist()
+        notes = st.text_input("Review notes")
+        col1, col2, col3 = st.columns(3)
+        approve_ids = None
+        if col1.button(f"Approve selected ({len(selected_ids)})", disabled=not selected_ids):
+            approve_ids = selected_ids
+        if col2.button(f"Approve all without violations ({len(clean_ids)})", disabled=not clean_ids):
+            approve_ids = clean_ids
+        if col3.button(f"Reject selected ({len(selected_ids)})", disabled=not selected_ids):
+            result = swaps.reject_swaps(selected_ids, reviewer, notes or None)
+            st.success(f"Rejected {len(result['rejected'])} requests.")
+            st.rerun()
+        if approve_ids:
+            result = swaps.approve_and_apply(approve_ids, reviewer, notes or None)
+            recalculated = (result.get('attendance') or {}).get('processed', 0)
+            st.success(f"Approved {len(result['approved'])} requests; "
+                       f"attendance refreshed for {recalculated} agent-days.")
+            for swap_id, reason in result['conflicts'].items():
+                st.warning(f"#{swap_id} held back: {reason}")
@@ -0,0 +1,285 @@
+# views/uploads.py
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+from modules.batch_ingest import BatchIngestor
+from modules.error_sink import ErrorSink
+from modules.identity import IdentityResolver
+from modules.interval_engine import IntervalEngine
+from modules.intraday import IntradayTracker
+from modules.job_queue import get_job_queue
+from modules.normalization import ShiftNormalizer
+from modules.upload_handlers import UploadHandler
+
+
+def _name_suggestions_note(result):
+    """Point at the Names tab when unknown names of an upload have candidates."""
+    suggested = sum(1 for r in (result.get('name_candidates') or {}).values() if r['candidates'])
+    if suggested:
+        st.info(f"{suggested} unknown name(s) look like existing agents. Confirming them in the Names tab "
+                "loads their rows from this upload; no re-upload needed.")
+
+
+def _unknown_shifts_note(result):
+    """Point at the Shift Dictionary page when roster values were not recognised."""
+    unknown = result.get('unknown_shifts') or {}
+    if unknown:
+        sample = ', '.join(str(raw) for raw in list(unknown)[:5])
+        st.warning(f"{len(unknown)} shift value(s) not recognised in {sum(unknown.values())} rows ({sample}). "
+                   "Review them in System Settings → Shift Dictionary.")
+
+
+def _names_tab(db, audit, current_uid):
+    """Unknown-agent names from error_log with ranked candidates; confirming stores an alias."""
+    resolver = IdentityResolver(db)
+    unresolved = resolver.unresolved_names()
+    if unresolved.empty:
+        st.caption("No unresolved unknown-agent names.")
+    else:
+        resolved = resolver.resolve_many(unresolved['agent_name'])
+        best = {}
+        for name, r in resolved.items():
+            if r['match']:
+                best[name] = (r['match']['name'], 1.0)
+            elif r['candidates']:
+                best[name] = (r['candidates'][0]['name'], r['candidates'][0]['score'])
+        unresolved['best_match'] = unresolved['agent_name'].map(lambda n: best.get(n, (None, None))[0])
+        unresolved['score'] = unresolved['agent_name'].map(lambda n: best.get(n, (None, None))[1])
+        st.dataframe(unresolved, use_container_width=True, hide_index=True)
+
+        with_candidates = [n for n, r in resolved.items() if r['match'] or r['candidates']]
+        if with_candidates:
+            name = st.selectbox("Unknown name", with_candidates, key="alias_name")
+            options = [resolved[name]['match']] if resolved[name]['match'] else resolved[name]['candidates']
+            choice = st.radio("Same agent as", options, key="alias_choice",
+                              format_func=lambda a: f"{a['name']} ({a['citrix_uid']})"
+                                                    + (f" · {a['score']:.2f}" if 'score' in a else ""))
+            if st.button("Confirm alias", key="confirm_alias"):
+                result = resolver.confirm(name, choice['citrix_uid'], confirmed_by=current_uid)
+                if result['success']:
+                    audit.log_action(action='CONFIRM_ALIAS', entity_name='agent_aliases',
+                                     entity_key=result['alias_key'], new_value=result)
+                    st.success(f"'{name}' now resolves to {choice['citrix_uid']} "
+                               f"({result['errors_resolved']} logged rows loaded).")
+                    if result['errors_left']:
+                        # Logged before rows were stored, or their batch was rolled back
+                        st.warning(f"{result['errors_left']} logged rows have no stored data. Roll back "
+                                   "their batch in the History tab and upload the file again to load them.")
+                    else:
+                        st.rerun()
+                else:
+                    st.error(result['error'])
+
+    with st.expander("Confirmed aliases"):
+        aliases = resolver.get_aliases()
+        st.dataframe(aliases, use_container_width=True, hide_index=True)
+        if not aliases.empty and st.session_state.role == 'ADMIN':
+            alias_key = st.selectbox("Alias to remove", aliases['alias_key'], key="alias_remove")
+            if st.button("Remove alias", key="remove_alias"):
+                resolver.remove_alias(alias_key)
+                audit.log_action(action='REMOVE_ALIAS', entity_name='agent_aliases', entity_key=alias_key)
+                st.rerun()
+
+
+def main(db, audit):
+    """Upload Files page: single-file uploads, batch ingest, history and jobs."""
+    st.subheader("📤 Upload Files")
+    background = st.checkbox("Run uploads in background", value=True,
+                             help="Queue files and keep using the app; track them in the Jobs tab.")
+    tab1, tab2, tab3, tab4, tab7, tab5, tab6, tab8 = st.tabs(
+        ["Headcount", "Roster", "CMS", "Aspect/EIM", "Batch", "History", "Jobs", "Names"])
+
+    normalizer = ShiftNormalizer(db)
+    handler = UploadHandler(db, normalizer, audit)
+    jobs = get_job_queue(db)
+    current_uid = st.session_state.user['citrix_uid']
+
+    with tab1:
+        st.write("##### Upload Headcount File")
+        uploaded_file = st.file_uploader("Choose HC file", type=['csv', 'xlsx'], key="hc")
+        if uploaded_file is not None:
+            if st.button("Process HC"):
+                if background:
+                    job_id = jobs.submit('headcount', uploaded_file, submitted_by=current_uid)
+                    st.info(f"Queued as job #{job_id}. Track it in the Jobs tab.")
+                else:
+                    with st.spinner("Processing..."):
+                        result = handler.process_headcount(uploaded_file)
+                        if result['success']:
+                            st.success(f"Processed {result['agents_updated']} agents, added {result['new_agents']} new.")
+                            for warning in (result.get('warnings') or [])[:5]:
+                                st.warning(warning)
+                        else:
+                            st.error(f"Processing failed: {result['error']}")
+
+    with tab2:
+        st.write("##### Upload Roster File")
+        roster_file = st.file_uploader("Choose Roster file", type=['csv', 'xlsx'], key="roster")
+        if roster_file is not None:
+            try:
+                if roster_file.name.endswith('.csv'):
+                    df = pd.read_csv(roster_file)
+                else:
+                    df = pd.read_excel(roster_file)
+                st.write("Preview:")
+                st.dataframe(df.head())
+
+                fixed_cols = ['Name', 'Citrix UID']
+                date_cols = [col for col in df.columns if col not in fixed_cols]
+                st.info(f"Detected {len(date_cols)} date columns automatically.")
+
+                if st.button("Process Roster", key="process_roster"):
+                    if not date_cols:
+                        st.error("No date columns found!")
+                    else:
+                        mapping = {
+                            'name_col': 'Name',
+                            'citrix_col': 'Citrix UID',
+                            'acd_col': None,
+                            'login_col': None,
+                            'date_cols': date_cols
+                        }
+                        year_month = f"{datetime.now().year}_{datetime.now().month:02d}"
+                        roster_file.seek(0)
+
+                        if background:
+                            job_id = jobs.submit('roster', roster_file,
+                                                 {'mapping': mapping, 'year_month': year_month},
+                                                 submitted_by=current_uid)
+                            st.info(f"Queued as job #{job_id}. Track it in the Jobs tab.")
+                        else:
+                            with st.spinner("Processing..."):
+                                result = handler.process_roster(roster_file, mapping, year_month)
+                            if result['success']:
+                                st.success(f"Processed {result['rows_processed']} shifts.")
+                                if result['unknown_agents']:
+                                    st.warning(f"Unknown agents: {', '.join(result['unknown_agents'][:5])}")
+                                _name_suggestions_note(result)
+                                _unknown_shifts_note(result)
+                            else:
+                                st.error(f"Processing failed: {result['error']}")
+            except Exception as e:
+                st.error(f"Error reading file: {e}")
+
+    with tab3:
+        st.write("##### Upload CMS Report")
+        cms_file = st.file_uploader("Choose CMS file", type=['txt', 'csv'], key="cms")
+        if cms_file and st.button("Process CMS", key="process_cms"):
+            if background:
+                job_id = jobs.submit('cms', cms_file, {'year_month': datetime.now().strftime('%Y_%m')},
+                                     submitted_by=current_uid)
+                st.info(f"Queued as job #{job_id}. Track it in the Jobs tab.")
+            else:
+                with st.spinner("Processing..."):
+                    year_month = datetime.now().strftime('%Y_%m')
+                    result = handler.process_cms_productivity(cms_file, year_month)
+                    if result['success']:
+                        st.success(f"✅ Processed {result['rows_processed']} rows.")
+                        if result['unknown_agents']:
+                            st.warning(f"Unknown agents: {', '.join(result['unknown_agents'][:5])}")
+                        _name_suggestions_note(result)
+                        for warning in (result.get('warnings') or [])[:5]:
+                            st.warning(warning)
+                    else:
+                        st.error(f"❌ Failed: {result['error']}")
+
+    with tab4:
+        st.write("##### Upload Aspect/EIM Report")
+        aspect_file = st.file_uploader("Choose Aspect/EIM file", type=['txt', 'csv'], key="aspect")
+        if aspect_file and st.button("Process Aspect/EIM", key="process_aspect"):
+            if background:
+                job_type = 'eim' if 'eim' in aspect_file.name.lower() else 'aspect'
+                job_id = jobs.submit(job_type, aspect_file, {'year_month': datetime.now().strftime('%Y_%m')},
+                                     submitted_by=current_uid)
+                st.info(f"Queued as job #{job_id}. Track it in the Jobs tab.")
+            else:
+                with st.spinner("Processing..."):
+                    year_month = datetime.now().strftime('%Y_%m')
+                    if 'eim' in aspect_file.name.lower():
+                        table_prefix = 'eim_raw'
+                        result = handler.process_eim(aspect_file, year_month)
+                    else:
+                        table_prefix = 'aspect_raw'
+                        result = handler.process_aspect(aspect_file, year_month)
+                    if result['success']:
+                        IntradayTracker(db).fold_batch(year_month, table_prefix, result['upload_batch'])
+                        IntervalEngine(db).compute_month(year_month)
+                        st.success(f"✅ Processed {result['rows_processed']} events.")
+                        if result['unknown_agents']:
+                            st.warning(f"Unknown agents: {', '.join(result['unknown_agents'][:5])}")
+                        _name_suggestions_note(result)
+                        for warning in (result.get('warnings') or [])[:5]:
+                            st.warning(warning)
+                    else:
+                        st.error(f"❌ Failed: {result['error']}")
+
+    with tab7:
+        st.write("##### Upload Many Files")
+        st.caption("HC, roster, CMS and Aspect/EIM files are detected automatically, "
+                   "parsed in parallel and written in order (HC → Roster → activity).")
+        batch_files = st.file_uploader("Choose files", type=['csv', 'xlsx', 'txt'],
+                                       accept_multiple_files=True, key="batch")
+        if batch_files and st.button("Process All", key="process_batch"):
+            ingestor = BatchIngestor(db, normalizer, audit)
+            bar = st.progress(0.0, text="Parsing...")
+            result = ingestor.ingest(
+                batch_files,
+                progress=lambda done, total: bar.progress(done / total, text=f"{done}/{total} files")
+            )
+            for item in result['files']:
+                label = f"{item['file_name']} ({item.get('source_type') or 'unknown'})"
+                if item['success']:
+                    rows = item.get('rows_processed', item.get('new_agents', 0))
+                    st.success(f"✅ {label}: {rows} rows.")
+                    for warning in (item.get('warnings') or [])[:5]:
+                        st.warning(warning)
+                    _name_suggestions_note(item)
+                    _unknown_shifts_note(item)
+                else:
+                    st.error(f"❌ {label}: {item['error']}")
+
+    with tab5:
+        st.write("##### Upload History")
+        history_df = handler.ledger.get_history()
+        st.dataframe(history_df, use_container_width=True, hide_index=True)
+        batches_with_errors = history_df[history_df['errors'] > 0]['batch_id'].tolist()
+        if batches_with_errors:
+            error_batch = st.selectbox("Row errors of batch", batches_with_errors)
+            st.dataframe(ErrorSink.batch_summary(db, error_batch), hide_index=True)
+        completed = history_df[history_df['status'] == 'Completed']['batch_id'].tolist()
+        if completed and st.session_state.role == 'ADMIN':
+            rollback_batch = st.selectbox("Batch to roll back", completed)
+            if st.button("Roll back batch", key="rollback_batch"):
+                result = handler.ledger.rollback(rollback_batch, st.session_state.user['citrix_uid'])
+                if result['success']:
+                    audit.log_action(action='ROLLBACK_BATCH', entity_name='upload_ledger',
+                                     entity_key=rollback_batch,
+                                     new_value={"rows_deleted": result['rows_deleted']})
+                    st.success(f"Deleted {result['rows_deleted']} rows from batch {rollback_batch}.")
+                    st.rerun()
+                else:
+                    st.error(result['error'])
+
+    with tab6:
+        st.write("##### Upload Jobs")
+        if st.button("Refresh", key="refresh_jobs"):
+            st.rerun()
+        jobs_df = jobs.get_jobs(submitted_by=None if st.session_state.role == 'ADMIN' else current_uid)
+        if jobs_df.empty:
+            st.caption("No upload jobs yet.")
+        for _, job in jobs_df.iterrows():
+            label = f"#{job['job_id']} {job['job_type']} · {job['file_name']} · {job['status']}"
+            if job['status'] == 'Running' and job['rows_total']:
+                st.progress(min(job['rows_done'] / job['rows_total'], 1.0), text=label)
+            elif job['status'] == 'Failed':
+                st.error(f"{label}: {job['error']}")
+            else:
+                st.write(label)
+
+    with tab8:
+        st.write("##### Unknown Agent Names")
+        st.caption("Names from uploads that matched no agent, with the closest existing agents. "
+                   "A confirmed name is stored as an alias and resolves automatically next time.")
+        _names_tab(db, audit, current_uid)